@@ -0,0 +1,36 @@
+"""Saving the data of the GUI's plots (`rfi.export`), per format."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rfi.export import FORMATS
+
+NUM_ROWS = 500_000
+
+
+@pytest.fixture(scope="module")
+def plot_data():
+    """Data like what the GUI fetches for its plots."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "frequency": np.tile(np.linspace(1100, 1900, NUM_ROWS // 20), 20),
+            "intensity": rng.lognormal(mean=-2.3, sigma=0.4, size=NUM_ROWS),
+            "scan__datetime": pd.to_datetime(
+                np.repeat(np.arange(20) * 3600, NUM_ROWS // 20) + 1_664_625_600, unit="s", utc=True
+            ),
+            "scan__session__name": pd.Categorical(["AGBT22A_999_01"] * NUM_ROWS),
+        }
+    )
+
+
+@pytest.mark.parametrize("format_name", list(FORMATS))
+def bench_export(measure, plot_data, tmp_path, benchmark, format_name):
+    suffix, writer = FORMATS[format_name]
+    path = tmp_path / f"rfi{suffix}"
+    benchmark.extra_info["data_mb"] = round(
+        plot_data.memory_usage(index=True, deep=True).sum() / 2**20, 1
+    )
+    measure(lambda: writer(plot_data, path), rounds=3)
+    benchmark.extra_info["file_mb"] = round(path.stat().st_size / 2**20, 1)
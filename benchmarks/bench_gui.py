@@ -0,0 +1,100 @@
+"""The data path of the GUI's plots (`gbt_rfi_gui.query_plot_data`), without drawing them."""
+
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from django.utils.timezone import make_aware
+
+from rfi.cache import DiskSpectrumCache
+
+from .synthetic import FIRST_SESSION, SESSION_SPACING
+
+pytest.importorskip("PyQt5")
+
+
+@pytest.mark.parametrize("disk_cache", ["cold", "warm"])
+@pytest.mark.parametrize("data_source", ["frequency", "spectrum"])
+def bench_query_plot_data(
+    measure, synthetic_data, db, settings, monkeypatch, tmp_path, data_source, disk_cache
+):
+    from gbt_rfi_gui import gbt_rfi_gui
+
+    settings.RFI_DATA_SOURCE = data_source
+    cache = DiskSpectrumCache(tmp_path, 10**10)
+    monkeypatch.setattr(gbt_rfi_gui, "DISK_CACHE", cache)
+    start = make_aware(FIRST_SESSION - timedelta(days=1))
+    end = make_aware(FIRST_SESSION + synthetic_data.num_sessions * SESSION_SPACING)
+    # a warm cache is filled by the first (untimed) run, and the rest are replots
+    plot_data = measure(
+        lambda: gbt_rfi_gui.query_plot_data(["Rcvr1_2"], start, end, 1100, 1900),
+        setup=cache.clear if disk_cache == "cold" else None,
+    )
+    assert plot_data.mean_data is not None
+
+
+@pytest.fixture(scope="module")
+def qt_app():
+    from PyQt5 import QtWidgets
+
+    # (nothing is shown, so no display is needed)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def line_plot_of(num_points):
+    """A LinePlot of a synthetic spectrum over 1100-1900 MHz, with two bands of known RFI."""
+    from gbt_rfi_gui.plots import LinePlot
+
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        {
+            "frequency": np.linspace(1100, 1900, num_points),
+            "intensity_mean": rng.lognormal(mean=-2.3, sigma=0.4, size=num_points),
+        }
+    )
+    known_rfi = pd.DataFrame(
+        {
+            "start": [1200.0, 1500.0],
+            "end": [1300.0, 1600.0],
+            "comments": ["Aircraft navigation and radar", "Satellite downlinks"],
+        }
+    )
+    line_plot = LinePlot()
+    line_plot.plot(data, "", 1100, 1900, known_rfi)
+    line_plot.draw()
+    return line_plot
+
+
+@pytest.mark.parametrize("num_points", [10_000, 1_000_000])
+def bench_line_plot_click(measure, qt_app, num_points):
+    """Clicking on the known RFI of the line plot, which is blitted."""
+    from matplotlib.backend_bases import MouseEvent
+
+    line_plot = line_plot_of(num_points)
+    x, y = line_plot.ax.transData.transform((1550, 100))
+    click = MouseEvent("button_press_event", line_plot, x, y, button=1)
+    measure(lambda: line_plot.callbacks.process("button_press_event", click), rounds=20)
+    assert len(line_plot.annotations) == 1
+
+
+@pytest.mark.parametrize("num_points", [10_000, 1_000_000])
+@pytest.mark.parametrize("zoom", ["full", "narrow"])
+def bench_line_plot_zoom(measure, qt_app, num_points, zoom):
+    """Zooming the line plot (to the whole band or to 1 MHz), and drawing it."""
+    line_plot = line_plot_of(num_points)
+    xlim = (1100, 1900) if zoom == "full" else (1500, 1501)
+
+    def zoom_to():
+        line_plot.ax.set_xlim(*xlim)
+        line_plot.draw()
+
+    measure(zoom_to, rounds=20)
+    if zoom == "narrow":
+        # every point in (and next to) the range
+        frequencies = line_plot.frequencies
+        in_range = ((frequencies >= 1500) & (frequencies <= 1501)).sum()
+        assert len(line_plot.line.get_xdata()) == in_range + 2
@@ -0,0 +1,66 @@
+"""The ingest commands: ingest_legacy_rfi_db and backfill_spectra."""
+
+import pytest
+
+from django.core.management import call_command
+
+from rfi.management.commands import ingest_legacy_rfi_db
+from rfi.models import Session
+from rfi_query.utils import ModelCache
+
+from .synthetic import create_legacy_table, make_legacy_rows
+
+
+@pytest.fixture
+def legacy_rows(synthetic_data, tmp_path, django_db_blocker):
+    """Synthetic rows in MasterRfiCatalog, and a directory with the files they refer to."""
+    options = dict(
+        num_sessions=2,
+        receivers=synthetic_data.receivers,
+        scans_per_session=synthetic_data.scans_per_session,
+        channels_per_scan=synthetic_data.channels_per_scan,
+        persistent_spikes=40,
+        transient_spikes=5,
+        seed=1,
+    )
+    with django_db_blocker.unblock():
+        create_legacy_table()
+        for filename in make_legacy_rows(session_prefix="AGBT99B", **options):
+            (tmp_path / filename).touch()
+    return tmp_path
+
+
+@pytest.mark.django_db(databases=["default", "legacy_rfi"])
+def bench_ingest_legacy_rfi_db(measure, legacy_rows):
+    def setup():
+        # ingest the same rows again: forget the sessions (and the models cached by the command)
+        Session.objects.filter(name__startswith="AGBT99B").delete()
+        for cache in vars(ingest_legacy_rfi_db).values():
+            if isinstance(cache, ModelCache):
+                cache._cache.clear()
+
+    measure(
+        lambda: call_command(
+            "ingest_legacy_rfi_db",
+            rfi_data_path=str(legacy_rows),
+            no_parquet=True,
+            no_progress=True,
+        ),
+        setup=setup,
+        rounds=3,
+    )
+    assert Session.objects.filter(name__startswith="AGBT99B").count() == 2
+
+
+def bench_backfill_spectra(measure, synthetic_data, db):
+    measure(
+        lambda: call_command(
+            "backfill_spectra",
+            all=True,
+            summaries=True,
+            rollups=True,
+            peaks=True,
+            no_progress=True,
+        ),
+        rounds=3,
+    )
@@ -0,0 +1,86 @@
+"""The query pipeline of the website (`rfi.views.DoGraph`)."""
+
+from datetime import timedelta
+
+import pytest
+
+from django.test import RequestFactory
+
+from rfi.cache import SPECTRUM_CACHE
+
+from .synthetic import FIRST_SESSION, SESSION_SPACING
+
+SCENARIOS = {
+    # name: (RFI_DATA_SOURCE, receivers, frequency range (MHz))
+    # a whole band, answered from the rollups
+    "rollups": ("frequency", ["Rcvr1_2"], (1100, 1900)),
+    # a narrow range, answered from the peaks found at ingest
+    "peaks": ("frequency", ["Rcvr1_2"], (1300, 1310)),
+    # a whole band without any precomputed data (see RAW_RECEIVERS), from the channel rows...
+    "raw": ("frequency", ["Rcvr4_6"], (3950, 8000)),
+    # ...and from the packed spectra
+    "raw_spectrum": ("spectrum", ["Rcvr4_6"], (3950, 8000)),
+    # two of those bands, which are read concurrently
+    "raw_two_bands": ("spectrum", ["Rcvr4_6", "Rcvr8_10"], (3950, 10100)),
+}
+
+
+@pytest.fixture(params=SCENARIOS)
+def query(request, synthetic_data, db, settings):
+    """The parameters of the query form for a scenario, over all synthetic sessions."""
+    data_source, receivers, (freq_low, freq_high) = SCENARIOS[request.param]
+    settings.RFI_DATA_SOURCE = data_source
+    end = FIRST_SESSION + synthetic_data.num_sessions * SESSION_SPACING
+    return {
+        "receivers": receivers,
+        "start": f"{FIRST_SESSION - timedelta(days=1):%Y-%m-%d}",
+        "end": f"{end:%Y-%m-%d}",
+        "freq_low": freq_low,
+        "freq_high": freq_high,
+        "submit": "Submit",
+    }
+
+
+def make_graph(query):
+    # (rfi.views can't be imported before there is a database: QueryForm queries it)
+    from rfi.views import DoGraph
+
+    graph = DoGraph(request=RequestFactory().get("/", query))
+    graph.get_data()
+    return graph
+
+
+def bench_filter_data(measure, query):
+    graph = make_graph(query)
+    measure(graph.filter_data)
+
+
+def bench_create_avg_line(measure, query):
+    state = {}
+
+    def setup():
+        # every run reads the sessions again
+        SPECTRUM_CACHE.clear()
+        state["graph"] = make_graph(query)
+        state["channels"] = state["graph"].filter_data()
+
+    div, refined_data = measure(
+        lambda: state["graph"].create_avg_line(state["channels"]), setup=setup
+    )
+    assert div and not refined_data.empty
+
+
+def bench_create_color_plot(measure, query):
+    state = {}
+
+    def setup():
+        graph = make_graph(query)
+        channels = graph.filter_data()
+        div, refined_data = graph.create_avg_line(channels)
+        state.update(graph=graph, div=div, refined_data=refined_data)
+
+    div = measure(
+        lambda: state["graph"].create_color_plot(list(state["div"]), state["refined_data"]),
+        setup=setup,
+    )
+    assert len(div) == 2
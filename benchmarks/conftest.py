@@ -0,0 +1,107 @@
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+
+# NOTE: Django is only set up once pytest-django is configured (by benchmarks/pytest.ini),
+#       so nothing that needs the settings is imported up here
+
+# what each benchmark measured besides its time, for the summary at the end
+MEASUREMENTS = {}
+# Receivers of sessions without rollups or peaks, whose queries read every channel
+RAW_RECEIVERS = ["Rcvr4_6", "Rcvr8_10"]
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("synthetic data")
+    group.addoption("--sessions", type=int, default=10, help="Number of sessions")
+    group.addoption(
+        "--receivers",
+        default="Rcvr1_2,Rcvr2_3",
+        help="Comma-separated receivers that every session observes with (besides "
+        f"{' and '.join(RAW_RECEIVERS)}, which have no rollups or peaks)",
+    )
+    group.addoption(
+        "--scans-per-session", type=int, default=2, help="Scans per session and receiver"
+    )
+    group.addoption(
+        "--channels", type=int, default=10_000, help="Channels per scan"
+    )
+
+
+def synthetic_options(config):
+    return dict(
+        num_sessions=config.getoption("sessions"),
+        receivers=config.getoption("receivers").split(","),
+        scans_per_session=config.getoption("scans_per_session"),
+        channels_per_scan=config.getoption("channels"),
+    )
+
+
+@pytest.fixture(scope="session")
+def synthetic_data(request, django_db_setup, django_db_blocker):
+    """The synthetic sessions (see `synthetic.make_sessions`), shared by all benchmarks.
+
+    The sessions of RAW_RECEIVERS have neither rollups nor peaks
+    """
+    from .synthetic import derive, make_sessions
+
+    options = synthetic_options(request.config)
+    with django_db_blocker.unblock():
+        scan_ids = make_sessions(**options)
+        derive(scan_ids)
+        raw_scan_ids = make_sessions(
+            **{**options, "receivers": RAW_RECEIVERS}, seed=1, session_prefix="AGBT22B"
+        )
+        derive(raw_scan_ids, rollups=False, peaks=False)
+    return SimpleNamespace(scan_ids=scan_ids + raw_scan_ids, **options)
+
+
+@pytest.fixture
+def measure(benchmark, request):
+    """Benchmark `function`, and record its peak memory and queries.
+
+    The memory and the queries are measured in an extra run before the timed ones,
+    since tracing the allocations slows everything down. `setup` runs before each
+    run (untimed)
+    """
+    from rfi_query.utils import QueryAccounting
+
+    def measure(function, setup=None, rounds=5):
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            with QueryAccounting() as queries:
+                result = function()
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info.update(
+            peak_memory_mb=round(peak_memory / 2**20, 1),
+            queries=queries.queries(),
+            queries_by_statement={
+                statement: totals["queries"]
+                for statement, totals in queries.by_statement.items()
+            },
+        )
+        MEASUREMENTS[request.node.nodeid] = benchmark.extra_info
+        benchmark.pedantic(function, setup=setup, rounds=rounds, iterations=1)
+        return result
+
+    return measure
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not MEASUREMENTS:
+        return
+    terminalreporter.section("peak memory and queries")
+    width = max(len(nodeid) for nodeid in MEASUREMENTS)
+    terminalreporter.write_line(f"{'benchmark':<{width}}  {'peak MB':>8}  queries")
+    for nodeid, info in MEASUREMENTS.items():
+        by_statement = ", ".join(
+            f"{count} {statement}" for statement, count in sorted(info["queries_by_statement"].items())
+        )
+        terminalreporter.write_line(
+            f"{nodeid:<{width}}  {info['peak_memory_mb']:>8}  {info['queries']} ({by_statement})"
+        )
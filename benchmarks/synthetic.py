@@ -0,0 +1,265 @@
+"""Realistic synthetic RFI data for the benchmarks.
+
+Every session observes with each of the given receivers, `scans_per_session` scans
+each. A scan has `channels_per_scan` channels evenly spread over the band of its
+receiver. Their intensities are log-normal noise (around 0.1 Jy), plus
+
+* persistent RFI: spikes at fixed frequencies of each receiver, a few channels
+  wide, which show up in most sessions (like the real transmitters do), and
+* transient RFI: spikes at random frequencies of single scans.
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from django.db import connections
+from django.utils.timezone import make_aware
+
+from legacy_rfi.models import MasterRfiCatalog
+from rfi.models import (
+    Backend,
+    Coordinates,
+    Feed,
+    File,
+    Frequency,
+    FrequencyType,
+    Frontend,
+    Polarization,
+    Project,
+    Scan,
+    Session,
+    Source,
+)
+from rfi.peaks import build_scan_peaks
+from rfi.rollups import build_rollups
+from rfi.spectrum import build_scan_spectra
+from rfi.summaries import build_scan_summaries
+
+# MHz
+RECEIVER_BANDS = {
+    "Rcvr_800": (680, 920),
+    "Rcvr1_2": (1100, 1900),
+    "Rcvr2_3": (1680, 2650),
+    "Rcvr4_6": (3950, 8000),
+    "Rcvr8_10": (8000, 10100),
+    "Rcvr12_18": (12000, 15400),
+}
+# the first session starts here, and the next ones follow every SESSION_SPACING
+FIRST_SESSION = datetime(2022, 1, 3, 12)
+# (so that their MJDs are new to ingestion)
+FIRST_LEGACY_SESSION = datetime(2023, 1, 2, 12)
+SESSION_SPACING = timedelta(days=1)
+BATCH_SIZE = 10_000
+
+
+def band_channels(receiver, num_channels):
+    low, high = RECEIVER_BANDS[receiver]
+    return np.linspace(low, high, num_channels)
+
+
+def scan_intensities(rng, num_channels, persistent, transient_spikes):
+    """The intensities of one scan; `persistent` are the channels and heights of the persistent RFI."""
+    intensities = rng.lognormal(mean=-2.3, sigma=0.4, size=num_channels)
+    channels, heights = persistent
+    seen = rng.random(len(channels)) < 0.8
+    for width in range(-1, 2):
+        np.add.at(
+            intensities,
+            np.clip(channels[seen] + width, 0, num_channels - 1),
+            heights[seen] / (1 + 2 * abs(width)),
+        )
+    transient = rng.integers(0, num_channels, transient_spikes)
+    intensities[transient] += rng.lognormal(mean=1.0, sigma=1.0, size=transient_spikes)
+    return intensities
+
+
+def persistent_rfi(receiver, num_channels, num_spikes, seed):
+    """The channels and heights (Jy) of the persistent RFI of a receiver."""
+    rng = np.random.default_rng([seed, sorted(RECEIVER_BANDS).index(receiver)])
+    return (
+        rng.integers(0, num_channels, num_spikes),
+        rng.lognormal(mean=2.0, sigma=1.0, size=num_spikes),
+    )
+
+
+def observations(
+    num_sessions,
+    receivers,
+    scans_per_session,
+    channels_per_scan,
+    persistent_spikes,
+    transient_spikes,
+    seed,
+    session_prefix,
+    first_session,
+):
+    """Yield (session name, receiver, scan number, datetime, frequencies, intensities) of each scan."""
+    rng = np.random.default_rng(seed)
+    persistent = {
+        receiver: persistent_rfi(receiver, channels_per_scan, persistent_spikes, seed)
+        for receiver in receivers
+    }
+    for session_number in range(num_sessions):
+        session_name = f"{session_prefix}_{session_number + 1:03d}_01"
+        session_start = first_session + session_number * SESSION_SPACING
+        for receiver_number, receiver in enumerate(receivers):
+            frequencies = band_channels(receiver, channels_per_scan)
+            for scan_number in range(scans_per_session):
+                number = receiver_number * scans_per_session + scan_number + 1
+                yield (
+                    session_name,
+                    receiver,
+                    number,
+                    session_start + timedelta(minutes=10 * number),
+                    frequencies,
+                    scan_intensities(
+                        rng, channels_per_scan, persistent[receiver], transient_spikes
+                    ),
+                )
+
+
+def mjd(when):
+    return Decimal(f"{(when - datetime(1858, 11, 17)).total_seconds() / 86400:.3f}")
+
+
+def make_sessions(
+    num_sessions=10,
+    receivers=("Rcvr1_2", "Rcvr2_3"),
+    scans_per_session=2,
+    channels_per_scan=10_000,
+    persistent_spikes=40,
+    transient_spikes=5,
+    seed=0,
+    session_prefix="AGBT22A",
+    first_session=FIRST_SESSION,
+):
+    """Write synthetic Scans and their Frequency rows. Returns the IDs of the scans."""
+    shared = dict(
+        backend=Backend.objects.get_or_create(name="VEGAS")[0],
+        coordinates=Coordinates.objects.get_or_create(azimuth=0, elevation=45)[0],
+        source=Source.objects.get_or_create(name="RFI")[0],
+        frequency_type=FrequencyType.objects.get_or_create(name="TOPO")[0],
+        polarization=Polarization.objects.get_or_create(name="L")[0],
+    )
+    scan_ids = []
+    frequency_rows = []
+    for session_name, receiver, number, when, frequencies, intensities in observations(
+        num_sessions,
+        receivers,
+        scans_per_session,
+        channels_per_scan,
+        persistent_spikes,
+        transient_spikes,
+        seed,
+        session_prefix,
+        first_session,
+    ):
+        project, _ = Project.objects.get_or_create(name=session_name[:11])
+        file, _ = File.objects.get_or_create(
+            name=session_name, defaults=dict(path=f"/synthetic/{session_name}")
+        )
+        session, _ = Session.objects.get_or_create(
+            name=session_name, defaults=dict(project=project, file=file)
+        )
+        frontend, _ = Frontend.objects.get_or_create(name=receiver)
+        scan = Scan.objects.create(
+            session=session,
+            feed=Feed.objects.get_or_create(number=0, frontend=frontend)[0],
+            frontend=frontend,
+            number=number,
+            mjd=mjd(when),
+            datetime=make_aware(when),
+            lst=0,
+            resolution=Decimal("0.0292968750"),
+            exposure=1,
+            tsys=20,
+            unit="Jy",
+            **shared,
+        )
+        scan_ids.append(scan.id)
+        frequency_rows.extend(
+            Frequency(
+                scan_id=scan.id,
+                scan_datetime=scan.datetime,
+                frontend_id=frontend.id,
+                window=0,
+                channel=channel,
+                frequency=frequency,
+                intensity=intensity,
+            )
+            for channel, (frequency, intensity) in enumerate(
+                zip(frequencies.tolist(), intensities.tolist())
+            )
+        )
+        if len(frequency_rows) >= BATCH_SIZE:
+            Frequency.objects.bulk_create(frequency_rows, batch_size=BATCH_SIZE)
+            frequency_rows = []
+    Frequency.objects.bulk_create(frequency_rows, batch_size=BATCH_SIZE)
+    return scan_ids
+
+
+def derive(scan_ids, rollups=True, peaks=True):
+    """Build what ingestion builds for the given scans (summaries, spectra, rollups and peaks)."""
+    build_scan_summaries(scan_ids)
+    build_scan_spectra(scan_ids)
+    if rollups:
+        build_rollups(scan_ids)
+    if peaks:
+        build_scan_peaks(scan_ids)
+
+
+def create_legacy_table():
+    """Create the (unmanaged) MasterRfiCatalog table in the legacy database, if it's missing."""
+    connection = connections["legacy_rfi"]
+    if MasterRfiCatalog._meta.db_table not in connection.introspection.table_names():
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(MasterRfiCatalog)
+
+
+def make_legacy_rows(session_prefix="AGBT99B", first_session=FIRST_LEGACY_SESSION, **options):
+    """Write synthetic MasterRfiCatalog rows (see `make_sessions` for the options).
+
+    Returns the file names the rows refer to, which ingestion expects to exist
+    """
+    rows = []
+    filenames = set()
+    for session_name, receiver, number, when, frequencies, intensities in observations(
+        session_prefix=session_prefix, first_session=first_session, **options
+    ):
+        filename = f"{session_name}.fits"
+        filenames.add(filename)
+        scan = dict(
+            feed=0,
+            frontend=receiver,
+            azimuth_deg=0,
+            elevation_deg=45,
+            projid=session_name,
+            resolution_mhz=Decimal("0.0292968750"),
+            window=0,
+            exposure=1,
+            backend="VEGAS",
+            mjd=mjd(when),
+            lst=0,
+            filename=filename,
+            polarization="L",
+            source="RFI",
+            tsys=20,
+            frequency_type="TOPO",
+            units="Jy",
+            scan_number=number,
+        )
+        rows.extend(
+            MasterRfiCatalog(
+                channel=channel,
+                frequency_mhz=round(frequency, 4),
+                intensity_jy=round(intensity, 6),
+                **scan,
+            )
+            for channel, (frequency, intensity) in enumerate(
+                zip(frequencies.tolist(), intensities.tolist())
+            )
+        )
+    MasterRfiCatalog.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return sorted(filenames)
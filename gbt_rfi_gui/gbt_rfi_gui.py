@@ -1,7 +1,12 @@
 import datetime
+import hashlib
 import os
 import signal
 import sys
+import traceback
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rfi_query.settings")
 
@@ -10,24 +15,226 @@ import django
 django.setup()
 
 
-import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
 import pytz
-from matplotlib.artist import Artist
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT
 from PyQt5 import QtGui, QtWidgets
 from PyQt5.Qt import QMainWindow
+from PyQt5.QtCore import QObject, Qt, QThread, pyqtSignal
 from PyQt5.QtWidgets import QFileDialog, QMessageBox
 from PyQt5.uic import loadUiType
 
-from rfi.models import Frequency, Scan
+from django.conf import settings
+from django.db import connections
+
+from gbt_rfi_gui.plots import ColorPlot, LinePlot
+from rfi import archive
+from rfi.cache import DiskSpectrumCache, cached_spectra
+from rfi.export import FORMATS, export
+from rfi.heatmap import binned_max_frame
+from rfi.loaders import load_scan_channels
+from rfi.models import Scan
+from rfi.spectrum import load_spectra
+from rfi_query.utils import QueryCancelled, QueryCanceller
 
 # add .Ui file path here
 qtCreatorFile = os.path.dirname(__file__) + "/RFI_GUI.ui"
 Ui_MainWindow, QtBaseClass = loadUiType(qtCreatorFile)
 
 
+def cache_dir():
+    """The directory of the on-disk cache of the configured database.
+
+    Session IDs are only unique within a database, so each database gets its own
+    """
+    database = settings.DATABASES["default"]
+    label = f"{database.get('HOST')}:{database.get('PORT')}/{database['NAME']}"
+    return Path(settings.RFI_GUI_CACHE_DIR) / hashlib.sha1(label.encode()).hexdigest()[:12]
+
+
+# sessions that were fetched before (by any run of the GUI) are read from the local disk
+DISK_CACHE = DiskSpectrumCache(
+    cache_dir(), settings.RFI_GUI_CACHE_BYTES, settings.RFI_GUI_CACHE_MAX_AGE
+)
+
+
+def average_intensities(data):
+    """The mean intensity of each frequency of each scan, sorted by frequency."""
+    # (session names are dictionary-encoded, so only group on the observed ones)
+    mean_data_intens = data.groupby(
+        ["scan__datetime", "frequency", "scan__session__name"], observed=True
+    ).agg({"intensity": ["mean"]})
+    mean_data_intens.columns = ["intensity_mean"]
+    mean_data = mean_data_intens.reset_index()
+    # sort values so the plot looks better, this has nothing to do with the actual data
+    return mean_data.sort_values(by=["frequency", "intensity_mean"])
+
+
+def query_plot_data(
+    receivers,
+    start_date,
+    end_date,
+    start_frequency,
+    end_frequency,
+    save_data=False,
+    progress=None,
+):
+    """Fetch and reduce everything that the plots of a query need.
+
+    This runs on the worker thread (see `QueryWorker`), so it must not touch any
+    widgets. `progress(num_rows)` is called as the channels are fetched. Returns a
+    SimpleNamespace with the (possibly moved) date range, the averaged line plot
+    data (None if there is no data), the heatmap of the color plot and the data to
+    save (if `save_data`)
+    """
+    # don't want to look at dates with no data, find the most recent session date
+    if settings.RFI_DATA_SOURCE == "parquet":
+        # the archive is read directly, so this works without a database
+        most_recent_session_prior_to_target_datetime = archive.latest_datetime(
+            settings.RFI_PARQUET_ROOT, receivers, before=end_date
+        )
+    else:
+        most_recent_scan = (
+            Scan.objects.filter(datetime__lte=end_date, frontend__name__in=receivers)
+            .order_by("-datetime")
+            .first()
+        )
+        most_recent_session_prior_to_target_datetime = (
+            most_recent_scan.datetime if most_recent_scan else None
+        )
+    if most_recent_session_prior_to_target_datetime is None:
+        # no data at all before the end date (do_plot says so)
+        return SimpleNamespace(
+            receivers=receivers,
+            start_date=start_date,
+            end_date=end_date,
+            moved=False,
+            start_frequency=start_frequency,
+            end_frequency=end_frequency,
+            mean_data=None,
+            heatmap=None,
+            save_data=None,
+        )
+
+    moved = False
+    if end_date:
+        if start_date > most_recent_session_prior_to_target_datetime:
+            difference = end_date - start_date
+            end_date = most_recent_session_prior_to_target_datetime
+            start_date = end_date - difference
+            moved = True
+
+    # make a 4 column dataFrame for the data needed to plot
+    if settings.RFI_DATA_SOURCE == "parquet":
+        data = archive.query(
+            settings.RFI_PARQUET_ROOT,
+            receivers=receivers,
+            start=start_date,
+            end=end_date,
+            freq_low=start_frequency,
+            freq_high=end_frequency,
+        )
+        if progress:
+            progress(len(data))
+    else:
+        scans = Scan.objects.filter(
+            frontend__name__in=receivers,
+            datetime__lte=end_date,
+            datetime__gte=start_date,
+        )
+        # reuse the sessions that were already loaded by previous plots (even those of
+        # earlier runs); the missing ones are either decoded from the packed per-scan
+        # spectra or streamed from the channel rows
+        data = cached_spectra(
+            scans,
+            receivers,
+            start_frequency,
+            end_frequency,
+            partial(
+                load_spectra
+                if settings.RFI_DATA_SOURCE == "spectrum"
+                else load_scan_channels,
+                progress=progress,
+            ),
+            cache=DISK_CACHE,
+        )
+
+    if not start_frequency:
+        start_frequency = data["frequency"].min()
+    if not end_frequency:
+        end_frequency = data["frequency"].max()
+
+    plot_data = SimpleNamespace(
+        receivers=receivers,
+        start_date=start_date,
+        end_date=end_date,
+        moved=moved,
+        start_frequency=start_frequency,
+        end_frequency=end_frequency,
+        mean_data=None,
+        heatmap=None,
+        save_data=None,
+    )
+    if data.empty:
+        return plot_data
+
+    plot_data.mean_data = average_intensities(data)
+    # color map graph, but only if there is more than one day with data
+    # (binned from the data at hand, which may not have come from the database at all)
+    plot_data.heatmap = binned_max_frame(data)
+
+    # option to save the data from the plot (as it was fetched for the plots;
+    # rfi.export only picks the columns it needs, a chunk at a time)
+    if save_data:
+        plot_data.save_data = data
+    return plot_data
+
+
+class QueryWorker(QObject):
+    """Runs `query_plot_data` on a QThread, so that the window stays responsive.
+
+    `cancel` (called from the main thread) cancels the statement that is running
+    on the database, and any that would follow
+    """
+
+    # number of rows fetched so far
+    progress = pyqtSignal(int)
+    # the result of query_plot_data
+    finished = pyqtSignal(object)
+    # the error message
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, **query):
+        super().__init__()
+        self.query = query
+        self.canceller = QueryCanceller()
+
+    def run(self):
+        try:
+            with self.canceller.watch():
+                plot_data = query_plot_data(progress=self.report_progress, **self.query)
+            # (the last steps of the query don't run any statements)
+            self.canceller.check()
+        except QueryCancelled:
+            self.cancelled.emit()
+        except Exception as error:
+            traceback.print_exc()
+            self.failed.emit(str(error))
+        else:
+            self.finished.emit(plot_data)
+        finally:
+            # this thread has its own connections
+            connections.close_all()
+
+    def report_progress(self, num_rows):
+        self.canceller.check()
+        self.progress.emit(num_rows)
+
+    def cancel(self):
+        self.canceller.cancel()
+
+
 class Window(QMainWindow, Ui_MainWindow):
     def __init__(self):
         QtWidgets.QWidget.__init__(self)
@@ -63,12 +270,41 @@ class Window(QMainWindow, Ui_MainWindow):
         self.start_frequency.setValidator(QtGui.QDoubleValidator())
         self.end_frequency.setValidator(QtGui.QDoubleValidator())
 
-        # Push Button to get data
+        # Push Button to get data (or to cancel the running query)
         self.plot_button.clicked.connect(self.clicked)
+        self.query_thread = None
+        self.query_worker = None
 
         # connect menus
         self.actionQuit.triggered.connect(self.menuQuit)
         self.actionAbout.triggered.connect(self.menuAbout)
+        self.actionClearCache.triggered.connect(self.menuClearCache)
+
+        self.add_plots()
+
+    def add_plots(self):
+        """Put the plots (each with a toolbar, for zooming and panning) to the right of the controls."""
+        self.line_plot = LinePlot()
+        self.color_plot = ColorPlot()
+        plots = QtWidgets.QSplitter(Qt.Vertical)
+        for canvas in (self.line_plot, self.color_plot):
+            pane = QtWidgets.QWidget()
+            pane_layout = QtWidgets.QVBoxLayout(pane)
+            pane_layout.setContentsMargins(0, 0, 0, 0)
+            pane_layout.addWidget(NavigationToolbar2QT(canvas, pane))
+            pane_layout.addWidget(canvas)
+            plots.addWidget(pane)
+
+        # (the controls are laid out by position, so they need a fixed size)
+        controls = self.takeCentralWidget()
+        controls_size = controls.childrenRect()
+        controls.setFixedSize(controls_size.right() + 1, controls_size.bottom() + 1)
+        window = QtWidgets.QWidget()
+        window_layout = QtWidgets.QHBoxLayout(window)
+        window_layout.addWidget(controls, alignment=Qt.AlignTop)
+        window_layout.addWidget(plots, stretch=1)
+        self.setCentralWidget(window)
+        self.resize(1600, 1000)
 
     def get_scans(self, receivers, target_date, start_frequency, end_frequency):
         # don't want to look at dates with no data, find the most recent session date
@@ -100,69 +336,34 @@ class Window(QMainWindow, Ui_MainWindow):
 
         return qs
 
-    def do_plot(self, receivers, start_date, end_date, start_frequency, end_frequency):
-        # don't want to look at dates with no data, find the most recent session date
-        most_recent_session_prior_to_target_datetime = (
-            Scan.objects.filter(datetime__lte=end_date, frontend__name__in=receivers)
-            .order_by("-datetime")
-            .first()
-            .datetime
-        )
-
-        qs = Frequency.objects.all()
-
-        if receivers:
-            qs = qs.filter(scan__frontend__name__in=receivers)
-
-        if end_date:
-            if start_date > most_recent_session_prior_to_target_datetime:
-                difference = end_date - start_date
-                end_date = most_recent_session_prior_to_target_datetime
-                start_date = end_date - difference
-                QtWidgets.QMessageBox.information(
-                    self,
-                    "No Data Found",
-                    f"""Your target date range holds no data \n  Displaying a new range with the most recent session data \n New range is {start_date.date()} to {end_date.date()}""",
-                    QtWidgets.QMessageBox.Ok,
-                )
-
-            qs = qs.filter(scan__datetime__lte=end_date)
-            qs = qs.filter(scan__datetime__gte=start_date)
-
-        if start_frequency:
-            qs = qs.filter(frequency__gte=start_frequency)
-
-        if end_frequency:
-            qs = qs.filter(frequency__lte=end_frequency)
-
-        # make a 4 column dataFrame for the data needed to plot
-        data = pd.DataFrame(
-            qs.values("frequency", "intensity", "scan__datetime", "scan__session__name")
-        )
+    def do_plot(self, plot_data):
+        """Draw the plots of a finished query (see `query_plot_data`)."""
+        start_date = plot_data.start_date
+        end_date = plot_data.end_date
+        if plot_data.moved:
+            QtWidgets.QMessageBox.information(
+                self,
+                "No Data Found",
+                f"""Your target date range holds no data \n  Displaying a new range with the most recent session data \n New range is {start_date.date()} to {end_date.date()}""",
+                QtWidgets.QMessageBox.Ok,
+            )
 
-        if not start_frequency:
-            start_frequency = data["frequency"].min()
-        if not end_frequency:
-            end_frequency = data["frequency"].max()
-        if not data.empty:
+        if plot_data.mean_data is not None:
             # line plot
             self.make_plot(
-                receivers,
-                data,
+                plot_data.receivers,
+                plot_data.mean_data,
                 end_date,
                 start_date,
-                start_frequency,
-                end_frequency,
+                plot_data.start_frequency,
+                plot_data.end_frequency,
+            )
+            self.make_color_plot(
+                *plot_data.heatmap, plot_data.receivers, end_date, start_date
             )
-            # color map graph, but only if there is more than one day with data
-            unique_days = data.scan__datetime.unique()
-            self.make_color_plot(data, unique_days, receivers, end_date, start_date)
 
-            # option to save the data from the plot
-            if self.saveData.isChecked():
-                self.save_file(
-                    pd.DataFrame(qs.values("scan__datetime", "frequency", "intensity"))
-                )
+            if plot_data.save_data is not None:
+                self.save_file(plot_data.save_data)
 
         else:
             QtWidgets.QMessageBox.information(
@@ -173,29 +374,29 @@ class Window(QMainWindow, Ui_MainWindow):
             )
 
     def make_plot(
-        self, receivers, data, end_date, start_date, start_frequency, end_frequency
+        self,
+        receivers,
+        sorted_mean_data,
+        end_date,
+        start_date,
+        start_frequency,
+        end_frequency,
     ):
-        # make a new object with the average intensity for the 2D plot
-        mean_data_intens = data.groupby(
-            ["scan__datetime", "frequency", "scan__session__name"]
-        ).agg({"intensity": ["mean"]})
-        mean_data_intens.columns = ["intensity_mean"]
-        mean_data = mean_data_intens.reset_index()
-        # sort values so the plot looks better, this has nothing to do with the actual data
-        sorted_mean_data = mean_data.sort_values(by=["frequency", "intensity_mean"])
-
         # generate the description fro the plot
         txt = f" \
             Your data summary for this plot: \n \
             Receiver : {receivers} \n \
             Date range : From {start_date.date()} to {end_date.date()} \n \
-            Frequency Range : {mean_data['frequency'].min()}MHz to {mean_data['frequency'].max()}MHz "
+            Frequency Range : {sorted_mean_data['frequency'].min()}MHz to {sorted_mean_data['frequency'].max()}MHz "
 
         # print out info for investagative GBO scientists
         print("Your requested projects are below:")
         print("Session Date \t\t Project_ID")
         print("-------------------------------------")
-        sort_by_date = sorted_mean_data.sort_values(by=["scan__session__name"])
+        # (by name, rather than by the order of the categories of the session names)
+        sort_by_date = sorted_mean_data.sort_values(
+            by=["scan__session__name"], key=lambda names: names.astype(str)
+        )
         project_ids = sort_by_date["scan__session__name"].unique()
         for i in project_ids:
             proj_date = sort_by_date[
@@ -204,190 +405,47 @@ class Window(QMainWindow, Ui_MainWindow):
             proj_date = proj_date.strftime("%Y-%m-%d")
             print(f"", proj_date[0], "\t\t", str(i))
 
-        # Create the 2D line plot
-        fig, ax = plt.subplots(1, figsize=(9, 4))
-        plt.title(txt, fontsize=8)
-        plt.suptitle("Averaged RFI Environment at Green Bank Observatory")
-        plt.xlabel("Frequency (MHz)")
-        plt.ylabel("Average Intensity (Jy)")
-        plt.ylim(-10, 500)
-        plt.xlim(start_frequency, end_frequency)
-
+        known_rfi = None
         # Create the annotations for RFI, only plot if user selects
         if self.yes_annotate.isChecked():
-            self.getrfi = self.getrfi_func(start_frequency, end_frequency)
-
-            def onclick(event):
-                click_rfi = self.getrfi.copy()
-                click_rfi.drop(
-                    click_rfi[click_rfi["start"] > event.xdata].index, inplace=True
-                )
-                click_rfi.drop(
-                    click_rfi[click_rfi["end"] < event.xdata].index, inplace=True
-                )
-                click_rfi = click_rfi.reset_index()
-
-                # if you click outside the plot you return all values - we want to return none
-                if len(click_rfi) == len(self.getrfi.copy()):
-                    click_rfi = pd.DataFrame(columns=click_rfi.columns)
-
-                for row in range(click_rfi.shape[0]):
-                    print(
-                        f"{click_rfi['comments'][row]} : {click_rfi['start'][row]} - {click_rfi['end'][row]} MHz"
-                    )
-                    mid = (click_rfi["end"][row] - click_rfi["start"][row]) / 2
-                    annot = ax.annotate(
-                        text=click_rfi["comments"][row],
-                        xy=(click_rfi["start"][row] + mid, 0),
-                        xytext=(click_rfi["start"][row] + mid, 300),
-                        ha="center",
-                        textcoords="data",
-                        bbox=dict(boxstyle="round", fc="w"),
-                        arrowprops=dict(arrowstyle="->", color="green"),
-                        wrap=True,
-                    )
-                    fig.canvas.draw()
-                    Artist.remove(annot)
-
-            if len(self.getrfi) > 0:
-                for row in range(self.getrfi.shape[0]):
-                    krfi = ax.axvspan(
-                        self.getrfi["start"][row],
-                        self.getrfi["end"][row],
-                        color="purple",
-                        alpha=0.4,
-                    )
-
-                fig.canvas.mpl_connect("button_press_event", onclick)
-
-        # Plot one or both the line plot and the annotations
-        plt.plot(
-            sorted_mean_data["frequency"],
-            sorted_mean_data["intensity_mean"],
-            color="black",
-            linewidth=0.5,
+            known_rfi = self.getrfi_func(start_frequency, end_frequency)
+        self.line_plot.plot(
+            sorted_mean_data, txt, start_frequency, end_frequency, known_rfi
         )
-        # make sure the titles align correctly
-        plt.tight_layout()
-        # setting the location of the window
-        mngr = plt.get_current_fig_manager()
-        geom = mngr.window.geometry()
-        x, y, dx, dy = geom.getRect()
-        # display the plot to the right of the ui
-        mngr.window.setGeometry(459, 0, dx, dy)
-        plt.show()
-
-    def make_color_plot(self, data, unique_days, receivers, end_date, start_date):
-        # set up the subplots
-        number_of_subplots = len(unique_days)
-        fig, axes = plt.subplots(number_of_subplots, 1, figsize=(10.5, 7), sharex=True)
-        # account for the single day plots
-        if number_of_subplots == 1:
-            axes = [axes]
 
+    def make_color_plot(
+        self, row_datetimes, freq_bins, max_intensities, receivers, end_date, start_date
+    ):
         # generate the description fro the plot
         txt = f" \
             Your data summary for this plot: \n \
             Receiver : {receivers} \n \
             Date range : From {start_date.date()} to {end_date.date()} \n \
-            Frequency Range : {data['frequency'].min()}MHz to {data['frequency'].max()}MHz "
-
-        session = 0
-        for ax in axes:
-            # make a new range of dates based on the session of interest
-            date_of_interest = data.scan__datetime  # get the dates
-            date_of_interest_sorted = (
-                date_of_interest.sort_values()
-            )  # sort for the plot
-            date_of_interest_datetime = date_of_interest_sorted.unique()[
-                session
-            ].to_pydatetime()
-
-            unique_date_range = data[
-                data["scan__datetime"] == date_of_interest_datetime
-            ]  # get the data but only for one session of interest at a time
-            date_of_interest_datetime = date_of_interest_datetime.replace(tzinfo=None)
-            # make the date bins for plotting
-            widen = datetime.timedelta(hours=1)
-            date_bins = np.arange(
-                date_of_interest_datetime - widen,
-                date_of_interest_datetime + widen,
-                datetime.timedelta(hours=1),
-            ).astype(datetime.datetime)
-            # Get the center of the date bins (for plotting)
-            dates = date_bins[:-1] + 0.5 * np.diff(date_bins)
-            # Convert from datetime so imshow recignizes the extent format
-            date_extents = mdates.date2num(dates)
-
-            # make the freq bins for plotting
-            freq_bins = np.arange(
-                unique_date_range["frequency"].min(),
-                unique_date_range["frequency"].max(),
-                1.0,
-            )
-            # Get the center of the frequency bins (for plotting)
-            freqs = freq_bins[:-1] + 0.5 * np.diff(freq_bins)
-
-            df_rfi_grouped2 = unique_date_range.groupby(
-                [
-                    pd.cut(unique_date_range.scan__datetime, date_bins),
-                    pd.cut(unique_date_range.frequency, freq_bins),
-                ]
-            )
-
-            timeseries_rfi = df_rfi_grouped2.max().intensity
+            Frequency Range : {freq_bins[0]}MHz to {freq_bins[-1]}MHz "
 
-            im = ax.imshow(
-                np.log10(timeseries_rfi.unstack()),
-                origin="lower",
-                aspect="auto",
-                # there is only one date of interest per subplot so date extents are to artifically expanded
-                extent=(freqs[0], freqs[-1], date_extents[0] - 1, date_extents[-1] + 1),
-                interpolation="none",
-                cmap="viridis",
-            )
-
-            # only want the session for the ylabel
-            ax.set_yticklabels([])
-            ax.set_ylabel(str(date_of_interest_datetime.date()), rotation="horizontal")
-            ax.yaxis.set_label_coords(-0.08, 0.5)
-
-            if session == 0:
-                ax.set_title(txt, fontsize=8)
-
-            # increase the session index
-            session = session + 1
-
-        # set the xlim to cover the whole range of frequency for all sessions
-        plt.xlim(data.frequency.min(), data.frequency.max())
-
-        # move the color bar to account for all subplots
-        fig.subplots_adjust(right=0.8)
-        cbar = fig.colorbar(im, cax=fig.add_axes([0.85, 0.15, 0.05, 0.7]))
-
-        # set labels
-        fig.text(0.5, 0.04, "Frequency (MHz)", ha="center")
-        fig.text(0.01, 0.5, "Session Dates (UTC)", va="center", rotation="vertical")
-        cbar.set_label("log(flux) [Jy]")
-        plt.suptitle("RFI Environment at Green Bank Observatory per Session")
-
-        # settign the location of the window
-        mngr = plt.get_current_fig_manager()
-        geom = mngr.window.geometry()
-        x, y, dx, dy = geom.getRect()
-        # display the plot under the ui
-        mngr.window.setGeometry(0, 456, dx, dy)
-
-        plt.show()
+        if self.waterfall.isChecked():
+            self.color_plot.plot_waterfall(row_datetimes, freq_bins, max_intensities, txt)
+        else:
+            self.color_plot.plot_sessions(row_datetimes, freq_bins, max_intensities, txt)
 
     def save_file(self, data):
-        name, filetype = QFileDialog.getSaveFileName(
-            self, "Save File"
+        suffixes = {
+            f"{format_name} (*{suffix})": suffix
+            for format_name, (suffix, _) in FORMATS.items()
+        }
+        name, name_filter = QFileDialog.getSaveFileName(
+            self, "Save File", filter=";;".join(suffixes)
         )  # get the name from fancy QFileDialog
         if name:
             # don't abort if user cancels save
-            data.to_csv(f"{name}.csv")
-            print(f"{name}.csv file was saved")
+            if not name.endswith(suffixes[name_filter]):
+                name += suffixes[name_filter]
+            QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                export(data, name)
+            finally:
+                QtWidgets.QApplication.restoreOverrideCursor()
+            print(f"{name} file was saved")
 
     def menuAbout(self):
         """Shows about message box."""
@@ -405,6 +463,12 @@ class Window(QMainWindow, Ui_MainWindow):
             "range of the receiver.",
         )
 
+    def menuClearCache(self):
+        """Drop every cached session, so that they're all fetched again."""
+        if settings.RFI_GUI_CACHE_BYTES:
+            DISK_CACHE.clear()
+        self.statusbar.showMessage("Cleared the cache")
+
     def menuQuit(self):
         """Method to handle the quit menu."""
         print("Thanks for using the gbt_rfi_gui!")
@@ -417,11 +481,11 @@ class Window(QMainWindow, Ui_MainWindow):
         self.end_date.setMinimumDate(max_date)
 
     def clicked(self):
-        # change the color so the user knows that it is plotting
-        self.plot_button.setStyleSheet("background-color : green")
-        self.plot_button.setText("Currently Plotting")
-        self.plot_button.setEnabled(False)
-        self.plot_button.repaint()
+        if self.query_worker is not None:
+            self.query_worker.cancel()
+            self.plot_button.setText("Cancelling")
+            self.plot_button.setEnabled(False)
+            return
 
         rcvrs_dict = {
             "Prime Focus 1": "Prime Focus 1",
@@ -459,19 +523,74 @@ class Window(QMainWindow, Ui_MainWindow):
             end_frequency = None
             self.end_frequency.setText("")
 
-        self.do_plot(
+        self.start_query(
             receivers=receivers,
             end_date=end_date,
             start_date=start_date,
             start_frequency=start_frequency,
             end_frequency=end_frequency,
+            save_data=self.saveData.isChecked(),
         )
 
+    def start_query(self, **query):
+        """Run `query_plot_data` on a worker thread; the plots are drawn once it's done."""
+        # change the color so the user knows that it is plotting (and can cancel)
+        self.plot_button.setStyleSheet("background-color : green")
+        self.plot_button.setText("Cancel Plotting")
+        self.statusbar.showMessage("Querying the database")
+
+        self.query_thread = QThread(self)
+        self.query_worker = QueryWorker(**query)
+        self.query_worker.moveToThread(self.query_thread)
+        self.query_thread.started.connect(self.query_worker.run)
+        self.query_worker.progress.connect(self.query_progress)
+        # (the thread is done before anything is drawn)
+        for done in (
+            self.query_worker.finished,
+            self.query_worker.failed,
+            self.query_worker.cancelled,
+        ):
+            done.connect(self.query_done)
+        self.query_worker.finished.connect(self.do_plot)
+        self.query_worker.failed.connect(self.query_failed)
+        self.query_worker.cancelled.connect(self.query_cancelled)
+        self.query_thread.start()
+
+    def stop_query(self):
+        """Wait for the worker thread to finish, cancelling its query if it's still running."""
+        if self.query_worker is None:
+            return
+        self.query_worker.cancel()
+        self.query_thread.quit()
+        self.query_thread.wait()
+        self.query_thread.deleteLater()
+        self.query_thread = None
+        self.query_worker = None
+
+    def query_progress(self, num_rows):
+        self.statusbar.showMessage(f"Fetched {num_rows:,} rows")
+
+    def query_done(self):
+        self.stop_query()
+        self.statusbar.clearMessage()
         # change the color so the user knows that it is done plotting
         self.plot_button.setStyleSheet("background-color : rgb(229, 229, 229)")
         self.plot_button.setText("Plot for these Args")
         self.plot_button.setEnabled(True)
 
+    def query_failed(self, message):
+        QtWidgets.QMessageBox.critical(
+            self, "Query Failed", message, QtWidgets.QMessageBox.Ok
+        )
+
+    def query_cancelled(self):
+        self.statusbar.showMessage("The query was cancelled", 5000)
+
+    def closeEvent(self, event):
+        # don't leave a query running on the database
+        self.stop_query()
+        super().closeEvent(event)
+
     # get known rfi data
     def getrfi_func(self, start_frequency, end_frequency):
         getrfi = pd.read_csv(
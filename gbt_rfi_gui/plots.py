@@ -0,0 +1,274 @@
+"""The plots of the GUI, embedded in its window.
+
+Each plot is a FigureCanvasQTAgg that is created once and reused: a new query
+only swaps the data of its Line2D or images, instead of building a new figure.
+The annotations of the known RFI are drawn with blitting (on top of a copy of
+the rest of the plot, saved whenever the canvas is fully drawn), so a click
+costs the same however many points are plotted.
+
+The line plot keeps every point of its data, but only draws those that M4 keeps
+for the visible frequency range and the width of the plot (see rfi.decimate).
+They are picked again whenever the range changes (by zooming or panning) or the
+plot is resized, so zooming into a narrow feature shows every channel of it.
+"""
+
+import textwrap
+
+import matplotlib.dates as mdates
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+
+from rfi.decimate import m4_indices
+from rfi.heatmap import waterfall
+
+# characters per line of the annotations
+ANNOTATION_WIDTH = 40
+
+
+def log_intensities(rows):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.log10(rows)
+
+
+class LinePlot(FigureCanvasQTAgg):
+    """The averaged intensity over frequency, with the known RFI (if given)."""
+
+    def __init__(self, parent=None):
+        super().__init__(Figure(figsize=(9, 4)))
+        self.setParent(parent)
+        self.ax = self.figure.subplots()
+        (self.line,) = self.ax.plot([], [], color="black", linewidth=0.5)
+        self.ax.set_xlabel("Frequency (MHz)")
+        self.ax.set_ylabel("Average Intensity (Jy)")
+        self.figure.suptitle("Averaged RFI Environment at Green Bank Observatory")
+        # the spans of the known RFI, and the annotations of the ones clicked on
+        self.rfi_spans = []
+        self.annotations = []
+        self.known_rfi = None
+        # the plot without the annotations, to blit them onto
+        self.background = None
+        # every point of the data, sorted by frequency
+        self.frequencies = np.array([])
+        self.intensities = np.array([])
+        self.mpl_connect("draw_event", self.on_draw)
+        self.mpl_connect("button_press_event", self.on_click)
+        self.mpl_connect("resize_event", self.resample)
+        self.ax.callbacks.connect("xlim_changed", self.resample)
+
+    def plot(self, data, title, start_frequency, end_frequency, known_rfi=None):
+        """Show `data` (sorted by frequency, see `average_intensities`)."""
+        self.ax.set_title(title, fontsize=8)
+        self.ax.set_ylim(-10, 500)
+
+        for span in self.rfi_spans:
+            span.remove()
+        self.rfi_spans = []
+        self.clear_annotations()
+        self.known_rfi = known_rfi
+        if known_rfi is not None:
+            for row in range(known_rfi.shape[0]):
+                self.rfi_spans.append(
+                    self.ax.axvspan(
+                        known_rfi["start"][row],
+                        known_rfi["end"][row],
+                        color="purple",
+                        alpha=0.4,
+                    )
+                )
+
+        # make sure the titles align correctly
+        self.figure.tight_layout()
+        self.frequencies = data["frequency"].to_numpy(dtype=np.float64)
+        self.intensities = data["intensity_mean"].to_numpy(dtype=np.float64)
+        # (which resamples the line)
+        self.ax.set_xlim(start_frequency, end_frequency)
+        self.draw_idle()
+
+    def resample(self, *args):
+        """Draw the points of the visible range that M4 keeps for the width of the plot."""
+        freq_low, freq_high = sorted(self.ax.get_xlim())
+        # only the first/last/min/max point of each pixel column can be seen anyway
+        plotted = m4_indices(
+            self.frequencies,
+            self.intensities,
+            columns=max(1, int(self.ax.get_window_extent().width)),
+            freq_low=freq_low,
+            freq_high=freq_high,
+        )
+        # also draw the points just outside of the range, so the line reaches its edges
+        before = np.searchsorted(self.frequencies, freq_low) - 1
+        after = np.searchsorted(self.frequencies, freq_high, side="right")
+        plotted = np.r_[
+            [before] if before >= 0 else [],
+            plotted,
+            [after] if after < len(self.frequencies) else [],
+        ].astype(np.int64)
+        self.line.set_data(self.frequencies[plotted], self.intensities[plotted])
+
+    def clear_annotations(self):
+        for annotation in self.annotations:
+            annotation.remove()
+        self.annotations = []
+
+    def on_draw(self, event):
+        self.background = self.copy_from_bbox(self.figure.bbox)
+        # (animated artists are left out of full draws)
+        for annotation in self.annotations:
+            self.ax.draw_artist(annotation)
+
+    def on_click(self, event):
+        if self.known_rfi is None or event.inaxes is not self.ax or self.background is None:
+            return
+        click_rfi = self.known_rfi[
+            (self.known_rfi["start"] <= event.xdata) & (self.known_rfi["end"] >= event.xdata)
+        ].reset_index(drop=True)
+
+        self.clear_annotations()
+        for row in range(click_rfi.shape[0]):
+            print(
+                f"{click_rfi['comments'][row]} : {click_rfi['start'][row]} - {click_rfi['end'][row]} MHz"
+            )
+            mid = (click_rfi["end"][row] - click_rfi["start"][row]) / 2
+            self.annotations.append(
+                self.ax.annotate(
+                    # (wrapped here, since matplotlib's wrapping measures each word as it draws)
+                    text=textwrap.fill(click_rfi["comments"][row], ANNOTATION_WIDTH),
+                    xy=(click_rfi["start"][row] + mid, 0),
+                    xytext=(click_rfi["start"][row] + mid, 300),
+                    ha="center",
+                    textcoords="data",
+                    bbox=dict(boxstyle="round", fc="w"),
+                    arrowprops=dict(arrowstyle="->", color="green"),
+                    animated=True,
+                )
+            )
+
+        # only draw the annotations, over the rest of the plot as it was last drawn
+        self.restore_region(self.background)
+        for annotation in self.annotations:
+            self.ax.draw_artist(annotation)
+        self.blit(self.figure.bbox)
+
+
+class ColorPlot(FigureCanvasQTAgg):
+    """The binned max intensities, as one row per session or as a waterfall."""
+
+    def __init__(self, parent=None):
+        super().__init__(Figure(figsize=(10.5, 7)))
+        self.setParent(parent)
+        self.arrangement = None
+        self.axes = []
+        self.images = []
+        self.colorbar = None
+        # all images share one color scale
+        self.norm = Normalize()
+
+    def arrange(self, arrangement, num_axes):
+        """Build the axes for "sessions" or a "waterfall", unless they are already there."""
+        if (arrangement, num_axes) == (self.arrangement, len(self.axes)):
+            return
+        self.figure.clear()
+        self.arrangement = arrangement
+        if arrangement == "sessions":
+            self.axes = list(np.atleast_1d(self.figure.subplots(num_axes, 1, sharex=True)))
+            # move the color bar to account for all subplots (and leave room for the titles)
+            self.figure.subplots_adjust(right=0.8, top=0.85)
+            colorbar_axes = self.figure.add_axes([0.85, 0.15, 0.05, 0.7])
+            self.figure.text(0.5, 0.04, "Frequency (MHz)", ha="center")
+            self.figure.text(
+                0.01, 0.5, "Session Dates (UTC)", va="center", rotation="vertical"
+            )
+            self.figure.suptitle("RFI Environment at Green Bank Observatory per Session")
+        else:
+            self.axes = [self.figure.subplots()]
+            colorbar_axes = None
+            self.axes[0].set_xlabel("Frequency (MHz)")
+            self.axes[0].set_ylabel("Session Dates (UTC)")
+            self.axes[0].yaxis_date()
+            self.figure.suptitle("RFI Environment at Green Bank Observatory")
+
+        self.images = [
+            ax.imshow(
+                np.full((1, 1), np.nan),
+                origin="lower",
+                aspect="auto",
+                interpolation="none",
+                cmap="viridis",
+                norm=self.norm,
+            )
+            for ax in self.axes
+        ]
+        self.colorbar = self.figure.colorbar(
+            self.images[0],
+            **({"cax": colorbar_axes} if colorbar_axes else {"ax": self.axes[0]}),
+        )
+        self.colorbar.set_label("log(flux) [Jy]")
+
+    def set_scale(self, rows):
+        """Fit the color scale to the (log) intensities that are shown."""
+        finite = rows[np.isfinite(rows)]
+        if len(finite):
+            self.norm.vmin, self.norm.vmax = finite.min(), finite.max()
+
+    def plot_sessions(self, row_datetimes, freq_bins, max_intensities, title):
+        """One row of max intensities per session, sorted by date."""
+        self.arrange("sessions", len(row_datetimes))
+        rows = log_intensities(max_intensities)
+        self.set_scale(rows)
+
+        for session, (ax, image, date_of_interest, row) in enumerate(
+            zip(self.axes, self.images, row_datetimes, rows)
+        ):
+            date_of_interest_datetime = date_of_interest.to_pydatetime().replace(
+                tzinfo=None
+            )
+            # Convert from datetime so imshow recignizes the extent format
+            date_extent = mdates.date2num(date_of_interest_datetime)
+            image.set_data(row[np.newaxis, :])
+            # there is only one date of interest per subplot so date extents are to artifically expanded
+            image.set_extent(
+                (freq_bins[0], freq_bins[-1], date_extent - 1, date_extent + 1)
+            )
+
+            # only want the session for the ylabel
+            ax.set_yticklabels([])
+            ax.set_ylabel(str(date_of_interest_datetime.date()), rotation="horizontal")
+            ax.yaxis.set_label_coords(-0.08, 0.5)
+            ax.set_title(title if session == 0 else "", fontsize=8)
+
+        # set the xlim to cover the whole range of frequency for all sessions
+        self.axes[0].set_xlim(freq_bins[0], freq_bins[-1])
+        self.draw_idle()
+
+    def plot_waterfall(self, row_datetimes, freq_bins, max_intensities, title):
+        """A single color map with time on the y-axis."""
+        self.arrange("waterfall", 1)
+        ax, image = self.axes[0], self.images[0]
+
+        # no more rows than the plot has pixels; blank rows where there are no sessions
+        row_datetimes, rows = waterfall(
+            row_datetimes, max_intensities, int(ax.get_window_extent().height)
+        )
+        if len(row_datetimes) > 1:
+            half_step = (row_datetimes[1] - row_datetimes[0]) / 2
+        else:
+            half_step = pd.Timedelta(days=1)
+        # Convert from datetime so imshow recignizes the extent format
+        date_extent = mdates.date2num(
+            [
+                (row_datetimes[0] - half_step).to_pydatetime().replace(tzinfo=None),
+                (row_datetimes[-1] + half_step).to_pydatetime().replace(tzinfo=None),
+            ]
+        )
+        rows = log_intensities(rows)
+        self.set_scale(rows)
+        image.set_data(rows)
+        image.set_extent((freq_bins[0], freq_bins[-1], *date_extent))
+        ax.set_xlim(freq_bins[0], freq_bins[-1])
+        ax.set_ylim(*date_extent)
+        ax.set_title(title, fontsize=8)
+        self.figure.tight_layout()
+        self.draw_idle()
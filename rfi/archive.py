@@ -0,0 +1,219 @@
+"""Columnar Parquet mirror of the RFI archive.
+
+Every scan is written to its own Parquet file in a hive-partitioned dataset:
+
+    <root>/receiver=<frontend name>/month=<YYYY-MM>/scan-<scan id>.parquet
+
+Each file holds one row per channel, sorted by frequency, so the frequency
+statistics of its row groups let range queries skip most of the file. Receiver
+and month filters prune whole directories before any file is opened. Since a
+scan always maps to the same file, (re-)exporting a scan simply replaces it,
+which makes incremental syncs idempotent.
+
+`query` returns the same columns as the per-channel ORM query, so it can be
+used in place of it, and it doesn't need a database connection at all.
+"""
+
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .models import Scan
+from .spectrum import scan_arrays
+
+SCAN_FILE_PREFIX = "scan-"
+# Channels per row group; small enough that narrow frequency ranges skip most of a scan
+ROW_GROUP_SIZE = 16_384
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("receiver", pa.string()), ("month", pa.string())]), flavor="hive"
+)
+SCHEMA = pa.schema(
+    [
+        ("scan_id", pa.int64()),
+        ("frequency", pa.float64()),
+        ("intensity", pa.float32()),
+        ("scan_datetime", pa.timestamp("us", tz="UTC")),
+        ("session", pa.dictionary(pa.int32(), pa.string())),
+        ("receiver", pa.string()),
+        ("month", pa.string()),
+    ]
+)
+# Column names of the per-channel ORM query, as used by DoGraph and the GUI
+COLUMN_NAMES = {
+    "frequency": "frequency",
+    "intensity": "intensity",
+    "scan_datetime": "scan__datetime",
+    "session": "scan__session__name",
+}
+
+
+def month_of(value):
+    """The YYYY-MM (UTC) month partition of the given datetime."""
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert("UTC")
+    return f"{value.year:04d}-{value.month:02d}"
+
+
+def scan_path(root, receiver, scan_datetime, scan_id):
+    return Path(
+        root,
+        f"receiver={quote(receiver, safe='')}",
+        f"month={month_of(scan_datetime)}",
+        f"{SCAN_FILE_PREFIX}{scan_id}.parquet",
+    )
+
+
+def exported_scan_ids(root):
+    """The IDs of every scan that has a file in the archive."""
+    return {
+        int(path.stem[len(SCAN_FILE_PREFIX) :])
+        for path in Path(root).glob(f"receiver=*/month=*/{SCAN_FILE_PREFIX}*.parquet")
+    }
+
+
+def export_scan(root, scan_id, receiver, scan_datetime, session_name):
+    """Write (or replace) the file of a single scan. Returns the number of channels written."""
+    frequencies, intensities = scan_arrays(scan_id)
+    path = scan_path(root, receiver, scan_datetime, scan_id)
+    if not len(frequencies):
+        # the scan may have lost its channels since it was last exported
+        path.unlink(missing_ok=True)
+        return 0
+
+    table = pa.table(
+        {
+            "scan_id": pa.array([scan_id] * len(frequencies), pa.int64()),
+            "frequency": pa.array(frequencies, pa.float64()),
+            "intensity": pa.array(intensities, pa.float32()),
+            "scan_datetime": pa.array(
+                [pd.Timestamp(scan_datetime)] * len(frequencies),
+                pa.timestamp("us", tz="UTC"),
+            ),
+            "session": pa.DictionaryArray.from_arrays(
+                pa.array([0] * len(frequencies), pa.int32()), pa.array([session_name])
+            ),
+        }
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a (hidden) file next to the final one and then move it into place, so
+    # that readers never see a partially written scan
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    os.replace(tmp_path, path)
+    return len(frequencies)
+
+
+def export_scans(root, scan_ids):
+    """(Re)write the files of the given scans. Returns the number of channels written."""
+    num_channels = 0
+    for scan_id, receiver, scan_datetime, session_name in Scan.objects.filter(
+        id__in=list(scan_ids)
+    ).values_list("id", "frontend__name", "datetime", "session__name"):
+        num_channels += export_scan(root, scan_id, receiver, scan_datetime, session_name)
+    return num_channels
+
+
+def dataset(root):
+    return ds.dataset(
+        root,
+        schema=SCHEMA,
+        format="parquet",
+        partitioning=PARTITIONING,
+    )
+
+
+def make_filter(receivers=None, start=None, end=None, freq_low=None, freq_high=None):
+    """Build the dataset filter for the given selection.
+
+    The receiver and month conditions are on the partition columns, so whole
+    directories are skipped; the rest are pushed down to the row group statistics
+    """
+    conditions = []
+    if receivers:
+        conditions.append(ds.field("receiver").isin(list(receivers)))
+    if start is not None:
+        conditions.append(ds.field("month") >= month_of(start))
+        conditions.append(ds.field("scan_datetime") >= pd.Timestamp(start))
+    if end is not None:
+        conditions.append(ds.field("month") <= month_of(end))
+        conditions.append(ds.field("scan_datetime") <= pd.Timestamp(end))
+    if freq_low is not None:
+        conditions.append(ds.field("frequency") >= freq_low)
+    if freq_high is not None:
+        conditions.append(ds.field("frequency") <= freq_high)
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def has_files(root):
+    return root is not None and any(Path(root).glob("receiver=*"))
+
+
+def count_rows(root, **selection):
+    """Count the channels in the given selection (see `make_filter`)."""
+    if not has_files(root):
+        return 0
+    return dataset(root).count_rows(filter=make_filter(**selection))
+
+
+def query(root, **selection):
+    """Read the channels in the given selection (see `make_filter`) into a DataFrame.
+
+    The columns match those of
+    `Frequency.objects.values("frequency", "intensity", "scan__datetime", "scan__session__name")`
+    """
+    if not has_files(root):
+        return pd.DataFrame(columns=list(COLUMN_NAMES.values()))
+    table = dataset(root).to_table(
+        columns=list(COLUMN_NAMES), filter=make_filter(**selection)
+    )
+    data = table.to_pandas().rename(columns=COLUMN_NAMES)
+    data["intensity"] = data.intensity.astype("float64")
+    data["scan__session__name"] = data.scan__session__name.astype(str)
+    return data
+
+
+def latest_datetime(root, receivers=None, before=None, freq_low=None, freq_high=None):
+    """The datetime of the most recent scan of the given receivers at (or before) `before`.
+
+    Only scans with channels in the given frequency range count. Months are searched
+    newest first, so only the most recent month with data is read. Returns None if
+    there is no such scan
+    """
+    if not has_files(root):
+        return None
+    archive = dataset(root)
+    months = sorted(
+        {
+            path.name[len("month=") :]
+            for receiver_dir in Path(root).glob("receiver=*")
+            for path in receiver_dir.glob("month=*")
+        },
+        reverse=True,
+    )
+    for month in months:
+        if before is not None and month > month_of(before):
+            continue
+        condition = ds.field("month") == month
+        selection = make_filter(
+            receivers=receivers, end=before, freq_low=freq_low, freq_high=freq_high
+        )
+        if selection is not None:
+            condition &= selection
+        scan_datetimes = archive.to_table(
+            columns=["scan_datetime"], filter=condition
+        ).column("scan_datetime")
+        if len(scan_datetimes):
+            return pc.max(scan_datetimes).as_py()
+    return None
@@ -0,0 +1,351 @@
+"""In-memory cache of decoded spectra, one entry per session.
+
+Most queries overlap: the same recent sessions are requested over and over
+with slightly different date windows and frequency ranges. Entries are keyed
+by (session, receivers, frequency bucket), where the bucket is the requested
+range rounded outward to a multiple of FREQ_BUCKET_MHZ, so nearby ranges
+share entries. A query is then assembled from the cached sessions, and only
+the missing sessions are fetched (with a single query). Fetching whole sessions
+may read many more channels than were asked for, so callers with a point budget
+pass it along; past it, only what was asked for is read (and not cached).
+
+Every key also holds the number and the highest ID of the scans of the
+session, and when their channels were last summarized (`Scan.channels_updated`,
+which ingestion and the backfills set once they have written the channels). So
+when scans are ingested, re-ingested or backfilled for a session, its old
+entries are simply never hit again (and get evicted). This works across
+processes, e.g. when `ingest_legacy_rfi_db` runs while the web server is up;
+within a process `invalidate_sessions` drops the entries right away.
+
+`DiskSpectrumCache` keeps the same entries as Parquet files instead, so that they
+survive restarts; the desktop GUI uses it to spare the database its replots.
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Scan
+from .summaries import estimate_points
+
+FREQ_BUCKET_MHZ = 50.0
+COLUMNS = ["frequency", "intensity", "scan__datetime", "scan__session__name"]
+
+
+def frame_size(data):
+    """The (approximate) number of bytes held by a DataFrame."""
+    return int(data.memory_usage(index=True, deep=True).sum())
+
+
+def freq_bucket(freq_low=None, freq_high=None):
+    """Round the given range outward to multiples of FREQ_BUCKET_MHZ (None means unbounded)."""
+    return (
+        None
+        if freq_low is None
+        else math.floor(freq_low / FREQ_BUCKET_MHZ) * FREQ_BUCKET_MHZ,
+        None
+        if freq_high is None
+        else math.ceil(freq_high / FREQ_BUCKET_MHZ) * FREQ_BUCKET_MHZ,
+    )
+
+
+class SpectrumCache:
+    """LRU cache of per-session DataFrames, limited to `max_bytes` in total."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        size = frame_size(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.num_bytes -= frame_size(self._entries.pop(key))
+            self._entries[key] = data
+            self.num_bytes += size
+            while self.num_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.num_bytes -= frame_size(evicted)
+
+    def pop(self, key):
+        """Remove the entry of `key` and return it (None if there is none)."""
+        with self._lock:
+            data = self._entries.pop(key, None)
+            if data is None:
+                self.misses += 1
+                return None
+            self.num_bytes -= frame_size(data)
+            self.hits += 1
+            return data
+
+    def invalidate_sessions(self, session_ids):
+        """Drop every entry of the given sessions."""
+        session_ids = set(session_ids)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in session_ids]:
+                self.num_bytes -= frame_size(self._entries.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.num_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return (
+            f"SpectrumCache ({len(self)} items; {self.num_bytes} of {self.max_bytes} bytes; "
+            f"{self.hits} hits; {self.misses} misses)"
+        )
+
+
+class DiskSpectrumCache:
+    """Like SpectrumCache, but the entries are Parquet files in the `root` directory.
+
+    An SQLite index next to the files has the size and the last use of every
+    entry, so that the least recently used entries are deleted once the files take
+    up more than `max_bytes`. Entries that were stored more than `max_age` seconds
+    ago (if given) are dropped when they're read, in case the versions of their
+    keys missed a change of the database. Several processes can share the directory
+    """
+
+    INDEX_NAME = "index.sqlite3"
+
+    def __init__(self, root, max_bytes, max_age=None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.max_bytes:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with self._index() as index:
+                index.execute(
+                    "CREATE TABLE IF NOT EXISTS entries "
+                    "(key TEXT PRIMARY KEY, session_id, file TEXT, size INTEGER, used REAL, stored REAL)"
+                )
+                index.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+                columns = [row[1] for row in index.execute("PRAGMA table_info(entries)")]
+                if "stored" not in columns:
+                    # (an index of an older version; its entries count as expired)
+                    index.execute("ALTER TABLE entries ADD COLUMN stored REAL")
+
+    @contextmanager
+    def _index(self):
+        index = sqlite3.connect(self.root / self.INDEX_NAME, timeout=30)
+        try:
+            # (commits, or rolls back on errors)
+            with index:
+                yield index
+        finally:
+            index.close()
+
+    def _remove(self, index, key, file):
+        index.execute("DELETE FROM entries WHERE key = ?", (key,))
+        (self.root / file).unlink(missing_ok=True)
+
+    def get(self, key):
+        key = repr(key)
+        now = time.time()
+        with self._lock, self._index() as index:
+            row = index.execute("SELECT file, stored FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age and (row[1] or 0) < now - self.max_age:
+                self._remove(index, key, row[0])
+                row = None
+            if row is not None:
+                index.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+        data = None
+        if row is not None:
+            try:
+                data = pd.read_parquet(self.root / row[0])
+            except FileNotFoundError:
+                # evicted by another process meanwhile
+                pass
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        session_id = key[0]
+        key = repr(key)
+        file = f"{hashlib.sha1(key.encode()).hexdigest()}.parquet"
+        # write to a temporary file first, so that no other process reads half a file
+        temporary = self.root / f"{file}.{os.getpid()}.{threading.get_ident()}"
+        data.to_parquet(temporary, index=False)
+        size = temporary.stat().st_size
+        if size > self.max_bytes:
+            temporary.unlink()
+            return
+        os.replace(temporary, self.root / file)
+        now = time.time()
+        with self._lock, self._index() as index:
+            index.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, session_id, file, size, now, now),
+            )
+            num_bytes = self._num_bytes(index)
+            for old_key, old_file, old_size in index.execute(
+                "SELECT key, file, size FROM entries ORDER BY used"
+            ).fetchall():
+                if num_bytes <= self.max_bytes:
+                    break
+                self._remove(index, old_key, old_file)
+                num_bytes -= old_size
+
+    def invalidate_sessions(self, session_ids):
+        """Drop every entry of the given sessions."""
+        session_ids = set(session_ids)
+        with self._lock, self._index() as index:
+            for key, session_id, file in index.execute(
+                "SELECT key, session_id, file FROM entries"
+            ).fetchall():
+                if session_id in session_ids:
+                    self._remove(index, key, file)
+
+    def clear(self):
+        with self._lock, self._index() as index:
+            for key, file in index.execute("SELECT key, file FROM entries").fetchall():
+                self._remove(index, key, file)
+
+    @staticmethod
+    def _num_bytes(index):
+        return index.execute("SELECT coalesce(sum(size), 0) FROM entries").fetchone()[0]
+
+    @property
+    def num_bytes(self):
+        with self._index() as index:
+            return self._num_bytes(index)
+
+    def __len__(self):
+        with self._index() as index:
+            return index.execute("SELECT count(*) FROM entries").fetchone()[0]
+
+    def __str__(self):
+        return (
+            f"DiskSpectrumCache at {self.root} ({len(self)} items; {self.num_bytes} of "
+            f"{self.max_bytes} bytes; {self.hits} hits; {self.misses} misses)"
+        )
+
+
+SPECTRUM_CACHE = SpectrumCache(settings.RFI_SPECTRUM_CACHE_BYTES)
+
+
+def session_versions(scans, receivers):
+    """Map the ID of every session of `scans` to its (name, version) for the given receivers."""
+    return {
+        session_id: (session_name, (num_scans, max_scan_id, channels_updated))
+        for session_id, session_name, num_scans, max_scan_id, channels_updated in Scan.objects.filter(
+            session__in=scans.values("session"), frontend__name__in=receivers
+        )
+        .order_by()
+        .values_list("session_id", "session__name")
+        .annotate(Count("id"), Max("id"), Max("channels_updated"))
+    }
+
+
+def cached_spectra(
+    scans, receivers, freq_low, freq_high, loader, cache=SPECTRUM_CACHE, max_points=None
+):
+    """Load the channels of `scans` in the given range, using cached sessions where possible.
+
+    `loader(scans, freq_low, freq_high)` must return a DataFrame with the columns
+    of `Frequency.objects.values("frequency", "intensity", "scan__datetime", "scan__session__name")`;
+    it is called (at most once) for every scan of the sessions that aren't cached.
+    If reading them would take more than `max_points` channels (going by the scan
+    summaries), only the requested scans and range of those sessions are read, and
+    they aren't cached
+    """
+    if not cache.max_bytes:
+        return loader(scans, freq_low, freq_high)
+
+    bucket = freq_bucket(freq_low, freq_high)
+    receivers_key = tuple(sorted(set(receivers)))
+    keys = {
+        session_id: (session_id, receivers_key, bucket, version)
+        for session_id, (_, version) in session_versions(scans, receivers).items()
+    }
+
+    frames = []
+    missing = []
+    for session_id, key in keys.items():
+        data = cache.get(key)
+        if data is None:
+            missing.append(session_id)
+        else:
+            frames.append(data)
+
+    if missing and max_points is not None:
+        num_points = estimate_points(
+            Scan.objects.filter(session_id__in=missing, frontend__name__in=receivers), *bucket
+        )
+        if num_points is None or num_points > max_points:
+            frames.append(loader(scans.filter(session_id__in=missing), freq_low, freq_high))
+            missing = []
+
+    if missing:
+        names = dict(
+            Scan.objects.filter(session_id__in=missing)
+            .values_list("session__name", "session_id")
+            .distinct()
+        )
+        fetched = loader(
+            Scan.objects.filter(session_id__in=missing, frontend__name__in=receivers),
+            *bucket,
+        )
+        fetched_sessions = fetched.groupby(
+            fetched.scan__session__name.astype(object), sort=False
+        )
+        for session_name, data in fetched_sessions:
+            data = data.reset_index(drop=True)
+            cache.put(keys[names[session_name]], data)
+            frames.append(data)
+        # remember the sessions that have nothing in this range, too
+        found = set(fetched_sessions.groups)
+        for session_name, session_id in names.items():
+            if session_name not in found:
+                cache.put(keys[session_id], fetched.iloc[:0])
+
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    data = pd.concat(frames, ignore_index=True)
+
+    # the cached sessions hold all of their scans and the whole bucket; cut them down
+    selected = data.scan__datetime.isin(
+        pd.to_datetime(list(scans.values_list("datetime", flat=True)), utc=True)
+    )
+    if freq_low is not None:
+        selected &= data.frequency >= freq_low
+    if freq_high is not None:
+        selected &= data.frequency <= freq_high
+    return data[selected].reset_index(drop=True)
@@ -0,0 +1,89 @@
+"""Peak-preserving decimation of spectra for plotting (M4).
+
+A line plot can't show more than a few points per pixel column anyway: within
+each column only the first, last, lowest and highest points determine what is
+drawn. M4 keeps exactly those four points per column, so the decimated line
+looks the same as the full one (every spike survives), while the number of
+points is bounded by 4 * the number of columns, regardless of how much data
+there was.
+"""
+
+import numpy as np
+
+# Columns per session; wider than a screen so that zooming in still shows some detail
+PLOT_COLUMNS = 4_000
+
+
+def m4_indices(frequencies, intensities, columns, freq_low=None, freq_high=None):
+    """The (sorted) indices of the points that M4 keeps.
+
+    `frequencies` must be sorted. The range [freq_low, freq_high] (by default that of
+    the data) is split into `columns` equally wide columns; points outside of it are
+    dropped. At most 4 * `columns` indices are returned
+    """
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    intensities = np.asarray(intensities, dtype=np.float64)
+    if not len(frequencies):
+        return np.array([], dtype=np.int64)
+    freq_low = frequencies[0] if freq_low is None else freq_low
+    freq_high = frequencies[-1] if freq_high is None else freq_high
+
+    # frequencies are sorted, so the range is a contiguous slice
+    first = np.searchsorted(frequencies, freq_low, side="left")
+    last = np.searchsorted(frequencies, freq_high, side="right")
+    if last - first <= 4 * columns:
+        return np.arange(first, last)
+
+    frequencies = frequencies[first:last]
+    intensities = intensities[first:last]
+    span = freq_high - freq_low
+    if span > 0:
+        column = np.minimum(
+            ((frequencies - freq_low) / span * columns).astype(np.int64),
+            columns - 1,
+        )
+    else:
+        column = np.zeros(len(frequencies), dtype=np.int64)
+    # points are sorted by frequency, so each column is a contiguous run
+    starts = np.flatnonzero(np.r_[True, np.diff(column) != 0])
+    ends = np.r_[starts[1:], len(column)] - 1
+    run = np.repeat(np.arange(len(starts)), ends - starts + 1)
+    # the first lowest and the last highest point of each run (ignoring NaNs)
+    at_min = np.flatnonzero(intensities == np.fmin.reduceat(intensities, starts)[run])
+    at_max = np.flatnonzero(intensities == np.fmax.reduceat(intensities, starts)[run])
+    first_min = at_min[np.r_[True, np.diff(run[at_min]) != 0]]
+    last_max = at_max[np.r_[np.diff(run[at_max]) != 0, True]]
+    keep = np.unique(np.concatenate([starts, ends, first_min, last_max]))
+    return first + keep
+
+
+def decimate(data, max_points, columns=PLOT_COLUMNS, freq_low=None, freq_high=None):
+    """M4-decimate every session of `data` so that there are at most `max_points` in total.
+
+    `data` must have the frequency, intensity and scan__session__name columns. All
+    sessions share the same columns (spanning [freq_low, freq_high], by default the
+    range of the data), and each gets at most 4 * `columns` points
+    """
+    if data.empty:
+        return data
+    data = data.reset_index(drop=True)
+    freq_low = data.frequency.min() if freq_low is None else freq_low
+    freq_high = data.frequency.max() if freq_high is None else freq_high
+    sessions = data.groupby(data.scan__session__name.astype(object), sort=False)
+    columns = max(1, min(columns, max_points // (4 * sessions.ngroups)))
+
+    kept = []
+    for _, session_data in sessions:
+        session_data = session_data.sort_values("frequency", kind="stable")
+        kept.append(
+            session_data.index[
+                m4_indices(
+                    session_data.frequency,
+                    session_data.intensity,
+                    columns,
+                    freq_low,
+                    freq_high,
+                )
+            ]
+        )
+    return data.loc[np.concatenate(kept)]
@@ -0,0 +1,83 @@
+"""Write the channels of a query to a file, a chunk of rows at a time.
+
+The writers take the DataFrame that was already fetched for the plots, so saving
+it doesn't query the database again, and they only ever convert CHUNK_ROWS rows
+at a time, so a large export costs little memory on top of the data itself.
+"""
+
+import gzip
+from importlib.util import find_spec
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# the columns that are exported, in this order
+COLUMNS = ["scan__datetime", "frequency", "intensity"]
+SCHEMA = pa.schema(
+    [
+        ("scan__datetime", pa.timestamp("us", tz="UTC")),
+        ("frequency", pa.float64()),
+        ("intensity", pa.float64()),
+    ]
+)
+CHUNK_ROWS = 500_000
+
+
+def chunks(data, chunk_rows=CHUNK_ROWS):
+    for start in range(0, len(data), chunk_rows):
+        yield data.iloc[start : start + chunk_rows][COLUMNS]
+
+
+def write_csv(data, path, chunk_rows=CHUNK_ROWS):
+    """Write CSV, compressed with gzip if `path` ends with .gz.
+
+    The first column is the row number, like `DataFrame.to_csv` writes it
+    """
+    if str(path).endswith(".gz"):
+        file = gzip.open(path, "wt", compresslevel=6, newline="")
+    else:
+        file = open(path, "w", newline="")
+    with file:
+        data.iloc[:0][COLUMNS].to_csv(file)
+        for chunk in chunks(data, chunk_rows):
+            chunk.to_csv(file, header=False)
+
+
+def write_parquet(data, path, chunk_rows=CHUNK_ROWS):
+    """Write Parquet, one row group per chunk."""
+    with pq.ParquetWriter(path, SCHEMA, compression="zstd") as writer:
+        for chunk in chunks(data, chunk_rows):
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=SCHEMA, preserve_index=False)
+            )
+
+
+def write_hdf5(data, path, chunk_rows=CHUNK_ROWS):
+    """Write HDF5 (a PyTables table named "rfi"), appending one chunk at a time."""
+    with pd.HDFStore(path, mode="w", complevel=5, complib="blosc") as store:
+        if data.empty:
+            # (pandas doesn't write empty tables)
+            store.put("rfi", data[COLUMNS])
+        for chunk in chunks(data, chunk_rows):
+            store.append("rfi", chunk, index=False)
+
+
+# name: (file suffix, writer)
+FORMATS = {
+    "CSV": (".csv", write_csv),
+    "Compressed CSV": (".csv.gz", write_csv),
+    "Parquet": (".parquet", write_parquet),
+}
+# pandas needs PyTables to write HDF5, which is optional
+if find_spec("tables"):
+    FORMATS["HDF5"] = (".h5", write_hdf5)
+
+
+def export(data, path):
+    """Write the COLUMNS of `data` to `path`, in the format of its suffix (see FORMATS)."""
+    for suffix, writer in FORMATS.values():
+        if str(path).endswith(suffix):
+            return writer(data, path)
+    suffixes = [suffix for suffix, _ in FORMATS.values()]
+    raise ValueError(f"Can't export to {path}: its suffix isn't one of {suffixes}")
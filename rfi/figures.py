@@ -0,0 +1,109 @@
+"""Embed Plotly figures in pages as compact JSON.
+
+`opy.plot(figure, output_type="div")` inlines the whole plotly.js bundle (about
+3.5 MB) into every div and writes every number out as text. Instead, the page
+loads plotly.js once as a (cacheable) static file, and `figure_div` embeds each
+figure as JSON in which the numeric arrays of the traces are base64-encoded
+typed arrays:
+
+    {"dtype": "f4", "bdata": "<base64 of the little-endian values>", "shape": [rows, columns]}
+
+`rfi/static/rfi/js/figures.js` decodes them back into typed arrays and draws the
+figures with Plotly.newPlot. A figure can also get its line traces from the data
+API (`rfi.views.SpectraView`), in which case the page only holds its layout.
+"""
+
+import base64
+import json
+import uuid
+
+import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+# Trace attributes that are sent as 32-bit floats; they are only drawn, so single
+# precision is plenty and halves their size. Frequencies (x) keep double precision
+FLOAT32_ATTRIBUTES = {"y", "z"}
+# JavaScript has no 64-bit typed arrays that Plotly understands
+DTYPES = {
+    "b1": np.uint8,
+    "i1": np.int8,
+    "u1": np.uint8,
+    "i2": np.int16,
+    "u2": np.uint16,
+    "i4": np.int32,
+    "u4": np.uint32,
+    "i8": np.float64,
+    "u8": np.float64,
+    "f2": np.float32,
+    "f4": np.float32,
+    "f8": np.float64,
+}
+JSON_SCRIPT_ESCAPES = {ord(">"): "\\u003E", ord("<"): "\\u003C", ord("&"): "\\u0026"}
+
+
+def encode_array(values, float32=False):
+    """The typed array spec of a numeric array (see the module docstring)."""
+    dtype = np.dtype(DTYPES[values.dtype.str[1:]])
+    if float32 and dtype.kind == "f":
+        dtype = np.dtype(np.float32)
+    values = np.ascontiguousarray(values, dtype=dtype.newbyteorder("<"))
+    spec = {
+        "dtype": dtype.str[1:],
+        "bdata": base64.b64encode(values.tobytes()).decode("ascii"),
+    }
+    if values.ndim > 1:
+        spec["shape"] = list(values.shape)
+    return spec
+
+
+def encode_arrays(value, float32=False):
+    """Replace the numeric arrays in (the nested dicts of) a trace with typed array specs."""
+    if isinstance(value, dict):
+        return {
+            key: encode_arrays(item, float32=key in FLOAT32_ATTRIBUTES)
+            for key, item in value.items()
+        }
+    if (
+        isinstance(value, np.ndarray)
+        and value.ndim in (1, 2)
+        and value.dtype.kind in "biuf"
+    ):
+        return encode_array(value, float32)
+    return value
+
+
+def figure_json(figure, config=None):
+    """The JSON of `figure` (with typed arrays) and its plotly.js `config`."""
+    figure = figure.to_plotly_json()
+    return json.dumps(
+        {
+            "data": [encode_arrays(trace) for trace in figure["data"]],
+            "layout": figure["layout"],
+            "config": {"responsive": True} if config is None else config,
+        },
+        cls=PlotlyJSONEncoder,
+    )
+
+
+def figure_div(figure, config=None, spectra_url="", tiles=None):
+    """HTML that draws `figure` on a page that loads plotly.js and figures.js.
+
+    If `spectra_url` is given, the spectra it returns (in the f32 format of
+    `rfi.renderers`) are fetched by the browser and added as one line per
+    session, plus their average. If `tiles` (see `rfi.views.tile_config`) is
+    given too, zooming in replaces those lines with the max of each column of
+    the zoom tiles
+    """
+    div_id = f"figure-{uuid.uuid4().hex}"
+    return format_html(
+        '<div id="{}"></div>'
+        '<script type="application/json" class="rfi-figure" data-target="{}" data-spectra="{}" data-tiles="{}">{}</script>',
+        div_id,
+        div_id,
+        spectra_url,
+        json.dumps(tiles) if tiles else "",
+        mark_safe(figure_json(figure, config).translate(JSON_SCRIPT_ESCAPES)),
+    )
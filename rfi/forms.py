@@ -40,6 +40,10 @@ class QueryFormHelper(FormHelper):
             Div("end", css_class="col"),
             css_class="row",
         ),
+        Div(
+            Div("waterfall", css_class="col"),
+            css_class="row",
+        ),
         FormActions(
             Submit("submit", "Submit"),
             css_class="",
@@ -72,6 +76,7 @@ class QueryForm(forms.Form):
         required=False, widget=forms.TextInput(attrs={"type":"date"}))
     start = forms.DateField(label="<hr> Start Date", required=False, widget=forms.TextInput(attrs={"type":"date"}))
     end = forms.DateField(label="End Date", required=False, widget=forms.TextInput(attrs={"type":"date"}))
+    waterfall = forms.BooleanField(label="<hr> Waterfall plot (time on the y-axis)", required=False)
 
     # method for cleaning the data
     def clean(self, num_of_pts=0):
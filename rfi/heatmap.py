@@ -0,0 +1,80 @@
+"""Binned max-intensity heatmaps (one row per scan datetime, one column per frequency bin).
+
+The per-session color plots only show the maximum intensity in each 1 MHz bin.
+They are binned from the data that was already fetched (and budgeted) for the
+line plot, so making them doesn't query the database again.
+
+Bins are aligned to multiples of the bin width, so bin `k` covers
+[k * bin_width, (k + 1) * bin_width) MHz.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Width of the frequency bins of the color plots, in MHz
+HEATMAP_BIN_WIDTH = 1.0
+
+
+def binned_max_frame(data, bin_width=HEATMAP_BIN_WIDTH):
+    """The max intensity of `data` (a DataFrame) per scan and frequency bin.
+
+    `data` must have the frequency, intensity and scan__datetime columns. Every row
+    is binned in a single vectorized pass, so the cost hardly depends on how many
+    scans there are.
+
+    Returns the sorted unique datetimes (one per row), the edges of the frequency
+    bins (one more than there are columns) and the 2D array, which is NaN where
+    there is no data
+    """
+    if data.empty:
+        return pd.DatetimeIndex([], tz="UTC"), np.array([]), np.empty((0, 0))
+
+    rows, row_datetimes = pd.factorize(
+        pd.DatetimeIndex(pd.to_datetime(data.scan__datetime, utc=True)), sort=True
+    )
+    freq_bins = np.floor(data.frequency.to_numpy() / bin_width).astype(np.int64)
+    first_bin = freq_bins.min()
+    num_bins = freq_bins.max() - first_bin + 1
+
+    # number the cells of the grid row by row and sort the data by them, so that the
+    # max of each cell can be taken over contiguous runs
+    cells = rows * num_bins + (freq_bins - first_bin)
+    order = np.argsort(cells, kind="stable")
+    cells = cells[order]
+    starts = np.flatnonzero(np.r_[True, np.diff(cells) != 0])
+
+    grid = np.full((len(row_datetimes), num_bins), np.nan)
+    grid.flat[cells[starts]] = np.maximum.reduceat(
+        data.intensity.to_numpy(dtype=np.float64)[order], starts
+    )
+    freq_edges = (first_bin + np.arange(num_bins + 1)) * bin_width
+    return row_datetimes, freq_edges, grid
+
+
+def waterfall(row_datetimes, grid, max_rows):
+    """Put the rows of a heatmap on an evenly spaced time axis (for a waterfall plot).
+
+    The time step is the typical spacing between rows, so missing sessions show up
+    as gaps (NaN rows). If that would give more than `max_rows` rows (e.g. more
+    sessions than vertical pixels), the step is widened and the rows that share a
+    step are merged by taking their max.
+
+    Returns the center time of each row and the new grid
+    """
+    if len(row_datetimes) < 2:
+        return row_datetimes, grid
+
+    times = row_datetimes.asi8
+    # (the first and the last row are max_rows - 1 steps apart at most)
+    step = max(np.median(np.diff(times)), (times[-1] - times[0]) / max(max_rows - 1, 1))
+    # (clamped, in case rounding pushes the last row past them)
+    slots = np.minimum(((times - times[0]) / step).astype(np.int64), max_rows - 1)
+    # rows are sorted by time, so rows that share a slot are contiguous
+    starts = np.flatnonzero(np.r_[True, np.diff(slots) != 0])
+
+    rows = np.full((slots[-1] + 1, grid.shape[1]), np.nan)
+    rows[slots[starts]] = np.fmax.reduceat(grid, starts, axis=0)
+    row_times = row_datetimes[0] + pd.to_timedelta(
+        (np.arange(len(rows)) + 0.5) * step, unit="ns"
+    )
+    return row_times, rows
@@ -0,0 +1,171 @@
+"""Run heavy queries in a worker process instead of the web server.
+
+A query that would have to read more than RFI_JOB_MIN_POINTS channels is saved
+as a QueryJob, and the page polls its status while the `run_query_jobs` worker
+builds the graphs. Jobs live in the database, so nothing else needs to run:
+workers claim queued jobs with SELECT ... FOR UPDATE SKIP LOCKED (on PostgreSQL),
+so any number of them can share the queue.
+
+Identical queries (the same parameters, in any order) share a job while it's
+pending, and reuse its result for JOB_RESULT_MAX_AGE after it's done.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+
+from rfi_query.timing import collect_timings, log_timings
+
+from .models import QueryJob
+
+logger = logging.getLogger(__name__)
+
+# Parameters that don't change the result of a query
+IGNORED_PARAMS = {"submit", "job", "format", "page"}
+JOB_RESULT_MAX_AGE = timedelta(hours=1)
+# Running jobs that haven't been touched by their worker for this long are assumed
+# to be lost (e.g. their worker was killed) and are queued again
+STALE_JOB_AGE = timedelta(minutes=30)
+# How often the worker touches the job it runs (see `heartbeat`)
+JOB_HEARTBEAT = timedelta(minutes=1)
+
+
+def query_params(query_dict):
+    """The parameters of a query (a QueryDict), normalized so that identical queries are equal."""
+    return {
+        name: sorted(query_dict.getlist(name))
+        for name in sorted(query_dict)
+        if name not in IGNORED_PARAMS and any(query_dict.getlist(name))
+    }
+
+
+def job_key(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def submit_job(params):
+    """The job that answers the query with the given parameters, creating it if needed."""
+    key = job_key(params)
+    shared = Q(status__in=QueryJob.PENDING) | Q(
+        status=QueryJob.DONE, updated__gte=timezone.now() - JOB_RESULT_MAX_AGE
+    )
+    job = QueryJob.objects.filter(shared, key=key).order_by("-created").first()
+    if job:
+        return job
+    try:
+        with transaction.atomic():
+            return QueryJob.objects.create(key=key, params=params)
+    except IntegrityError:
+        # an identical query was submitted at the same time
+        return QueryJob.objects.filter(shared, key=key).order_by("-created").first()
+
+
+def set_progress(job, progress, message):
+    job.progress = progress
+    job.message = message
+    QueryJob.objects.filter(pk=job.pk).update(
+        progress=progress, message=message, updated=timezone.now()
+    )
+
+
+@contextmanager
+def heartbeat(job, interval=JOB_HEARTBEAT):
+    """Touch the running job every `interval` while the block runs.
+
+    So a job is only taken for lost once its worker is gone, however long a step
+    of it takes without reporting progress
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval.total_seconds()):
+                QueryJob.objects.filter(pk=job.pk, status=QueryJob.RUNNING).update(
+                    updated=timezone.now()
+                )
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name=f"rfi-job-{job.pk}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def requeue_stale_jobs():
+    """Queue the running jobs that seem to have been lost again. Returns how many."""
+    return QueryJob.objects.filter(
+        status=QueryJob.RUNNING, updated__lt=timezone.now() - STALE_JOB_AGE
+    ).update(status=QueryJob.QUEUED, progress=0, message="", updated=timezone.now())
+
+
+def claim_job():
+    """Take the oldest queued job and mark it as running. Returns None if there is none."""
+    with transaction.atomic():
+        job = (
+            QueryJob.objects.select_for_update(skip_locked=True)
+            .filter(status=QueryJob.QUEUED)
+            .order_by("created")
+            .first()
+        )
+        # (the status check also keeps databases without row locks from double-claiming)
+        if job is None or not QueryJob.objects.filter(
+            pk=job.pk, status=QueryJob.QUEUED
+        ).update(status=QueryJob.RUNNING, updated=timezone.now()):
+            return None
+    job.status = QueryJob.RUNNING
+    return job
+
+
+def run_job(job):
+    """Build the graphs of a job (like `DoGraph.get` does) and save the result."""
+    from .views import DoGraph
+
+    request = HttpRequest()
+    request.method = "GET"
+    request.GET = QueryDict(urlencode(job.params, doseq=True))
+    graph = DoGraph(request=request, job=job)
+    try:
+        with heartbeat(job), collect_timings() as timings:
+            div = graph.make_graphs()
+        log_timings(timings, job=job.pk)
+    except Exception:
+        # (the message is shown to anyone, so the details only go to the log)
+        logger.exception(f"{job} failed")
+        job.status = QueryJob.FAILED
+        job.message = "The query failed"
+    else:
+        if div is None:
+            job.status = QueryJob.FAILED
+            job.message = "; ".join(
+                str(message)
+                for errors in graph.cache_form.errors.values()
+                for message in errors
+            ) or getattr(graph, "error_data_str", "No data")
+        else:
+            job.status = QueryJob.DONE
+            job.progress = 1
+            job.message = ""
+            job.graphs = [str(graph_div) for graph_div in div]
+    job.save()
+    return job
+
+
+def delete_old_jobs(max_age):
+    """Delete the finished jobs that haven't been touched for `max_age`."""
+    return QueryJob.objects.filter(
+        status__in=[QueryJob.DONE, QueryJob.FAILED],
+        updated__lt=timezone.now() - max_age,
+    ).delete()[0]
@@ -0,0 +1,135 @@
+"""Load QuerySets straight into NumPy columns.
+
+`pd.DataFrame(queryset.values(...))` builds one dict per row before pandas ever
+sees the data, which costs gigabytes of memory for a few million channels.
+`load_columns` instead runs the SQL of the QuerySet through a server-side
+cursor (on PostgreSQL) and copies each fixed-size chunk of rows into
+preallocated NumPy columns. Repetitive columns (session names, scan datetimes)
+are dictionary-encoded as integer codes while they are read, so each distinct
+value is only converted once.
+"""
+
+import numpy as np
+import pandas as pd
+
+from django.db import connections
+from django.db.models import Max, Min
+
+from .models import Frequency
+
+# Rows fetched from the cursor at a time
+CHUNK_SIZE = 50_000
+CODE_DTYPE = np.dtype(np.int32)
+
+
+class Column:
+    """A growable NumPy column, optionally dictionary-encoded."""
+
+    def __init__(self, size, encoded=False, dtype=np.float64):
+        self.encoded = encoded
+        self.values = np.empty(size, dtype=CODE_DTYPE if encoded else dtype)
+        # maps each distinct (raw) value to its code
+        self.codes = {}
+
+    def reserve(self, size):
+        if size > len(self.values):
+            # grow geometrically so that a bad size hint doesn't make loading quadratic
+            grown = np.empty(max(size, 2 * len(self.values)), dtype=self.values.dtype)
+            grown[: len(self.values)] = self.values
+            self.values = grown
+
+    def fill(self, start, raw_values):
+        stop = start + len(raw_values)
+        self.reserve(stop)
+        if self.encoded:
+            codes = self.codes
+            self.values[start:stop] = [
+                codes[value] if value in codes else codes.setdefault(value, len(codes))
+                for value in raw_values
+            ]
+        else:
+            self.values[start:stop] = raw_values
+
+    def categories(self):
+        return list(self.codes)
+
+
+def load_columns(
+    queryset,
+    fields,
+    encoded=(),
+    datetimes=(),
+    size_hint=0,
+    chunk_size=CHUNK_SIZE,
+    progress=None,
+):
+    """Fetch `fields` of every row of `queryset` into a DataFrame (one column per field).
+
+    Fields in `encoded` become Categoricals; fields in `datetimes` are
+    dictionary-encoded while reading and converted to UTC datetimes at the end.
+    All other fields must be numeric. `size_hint` (e.g. from a previous count) is
+    the number of rows to preallocate for. `progress(num_rows)` is called with the
+    number of rows fetched so far after every chunk
+    """
+    sql, params = queryset.values_list(*fields).query.sql_with_params()
+    columns = [
+        Column(size_hint, encoded=field in encoded or field in datetimes)
+        for field in fields
+    ]
+    num_rows = 0
+    with connections[queryset.db].chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(chunk_size):
+            for column, raw_values in zip(columns, zip(*rows)):
+                column.fill(num_rows, raw_values)
+            num_rows += len(rows)
+            if progress:
+                progress(num_rows)
+
+    data = {}
+    for field, column in zip(fields, columns):
+        values = column.values[:num_rows]
+        if field in datetimes:
+            # SQLite returns strings and PostgreSQL datetimes; only convert each one once
+            data[field] = pd.DatetimeIndex(
+                pd.to_datetime(column.categories(), utc=True)
+            ).take(values)
+        elif field in encoded:
+            data[field] = pd.Categorical.from_codes(values, column.categories())
+        else:
+            data[field] = values
+    return pd.DataFrame(data)
+
+
+def load_channels(channels, size_hint=0, progress=None):
+    """Load a Frequency QuerySet with the columns used for plotting.
+
+    The result has the columns of
+    `Frequency.objects.values("frequency", "intensity", "scan__datetime", "scan__session__name")`,
+    with the session names as a Categorical
+    """
+    return load_columns(
+        channels,
+        ("frequency", "intensity", "scan__datetime", "scan__session__name"),
+        encoded=("scan__session__name",),
+        datetimes=("scan__datetime",),
+        size_hint=size_hint,
+        progress=progress,
+    )
+
+
+def load_scan_channels(scans, freq_low=None, freq_high=None, progress=None):
+    """Load the channels of `scans` in the given range (see `load_channels`)."""
+    bounds = scans.aggregate(Min("datetime"), Max("datetime"))
+    # also filter on the denormalized scan_datetime so that Postgres only has to touch
+    # the partitions of the requested scans
+    channels = Frequency.objects.filter(
+        scan__in=scans,
+        scan_datetime__gte=bounds["datetime__min"],
+        scan_datetime__lte=bounds["datetime__max"],
+    )
+    if freq_low is not None:
+        channels = channels.filter(frequency__gte=freq_low)
+    if freq_high is not None:
+        channels = channels.filter(frequency__lte=freq_high)
+    return load_channels(channels, progress=progress)
@@ -0,0 +1,92 @@
+"""Convert existing Frequency rows into packed ScanSpectrum rows."""
+
+from tqdm import tqdm
+
+from django.core.management.base import BaseCommand
+
+from rfi.models import Scan
+from rfi.peaks import build_scan_peaks
+from rfi.rollups import build_rollups
+from rfi.spectrum import build_scan_spectra
+from rfi.summaries import build_scan_summaries
+from rfi_query.utils import chunks
+
+
+class Command(BaseCommand):
+    help = "Pack the per-channel Frequency rows of each Scan into ScanSpectrum rows"
+    # Don't run Django's automated health checks on each execution
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild the spectra of every scan, not just those without any",
+        )
+        parser.add_argument(
+            "--summaries",
+            action="store_true",
+            help="Also compute the channel count/frequency range/max intensity of the "
+            "processed scans",
+        )
+        parser.add_argument(
+            "--rollups",
+            action="store_true",
+            help="Also rebuild the SpectrumRollup rows of the sessions of the processed scans",
+        )
+        parser.add_argument(
+            "--peaks",
+            action="store_true",
+            help="Also find and store the peaks of the processed scans",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Limit the number of scans that are processed",
+        )
+        parser.add_argument(
+            "-c",
+            "--chunk-size",
+            type=int,
+            help="Number of scans to convert per transaction",
+            default=50,
+        )
+        parser.add_argument(
+            "--no-progress", action="store_true", help="Don't show progress bars"
+        )
+
+    def handle(self, *args, **options):
+        scans = Scan.objects.order_by("datetime")
+        if not options["all"]:
+            scans = scans.filter(scanspectrum__isnull=True)
+        scan_ids = list(scans.values_list("id", flat=True))
+        if options["limit"]:
+            scan_ids = scan_ids[: options["limit"]]
+
+        chunk_size = options["chunk_size"]
+        tqdm.write(f"Converting {len(scan_ids)} scans in chunks of {chunk_size}")
+        progress = tqdm(
+            total=len(scan_ids), unit="scan", disable=options["no_progress"]
+        )
+        num_spectra = 0
+        num_summaries = 0
+        num_rollups = 0
+        num_peaks = 0
+        for chunk in chunks(scan_ids, chunk_size):
+            num_spectra += build_scan_spectra(chunk)
+            if options["summaries"]:
+                num_summaries += build_scan_summaries(chunk)
+            if options["rollups"]:
+                num_rollups += build_rollups(chunk)
+            if options["peaks"]:
+                num_peaks += build_scan_peaks(chunk)
+            progress.update(len(chunk))
+        progress.close()
+
+        print(f"Wrote {num_spectra} ScanSpectrum rows for {len(scan_ids)} scans")
+        if options["summaries"]:
+            print(f"Summarized {num_summaries} scans")
+        if options["rollups"]:
+            print(f"Wrote {num_rollups} SpectrumRollup rows")
+        if options["peaks"]:
+            print(f"Wrote {num_peaks} ScanPeaks rows")
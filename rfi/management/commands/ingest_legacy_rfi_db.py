@@ -8,9 +8,12 @@ from pathlib import Path
 import pytz
 from tqdm import tqdm
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from legacy_rfi.models import MasterRfiCatalog
+from rfi.archive import export_scans
+from rfi.cache import SPECTRUM_CACHE
 from rfi.mjd import mjd_to_datetime
 from rfi.models import (
     Backend,
@@ -26,8 +29,12 @@ from rfi.models import (
     Session,
     Source,
 )
+from rfi.peaks import build_scan_peaks
+from rfi.rollups import build_rollups
+from rfi.spectrum import build_scan_spectra
+from rfi.summaries import build_scan_summaries
 from rfi_query.handlers import TqdmLoggingHandler
-from rfi_query.utils import ModelCache
+from rfi_query.utils import Benchmark, ModelCache, chunks
 
 BackendCache = ModelCache(Backend)
 CoordinatesCache = ModelCache(Coordinates)
@@ -187,6 +194,7 @@ class Command(BaseCommand):
                 datetime=mjd_to_datetime(row["mjd"]).replace(tzinfo=pytz.UTC),
             ),
         )
+        self.scan_ids.add(scan.id)
         if not str(row["window"]).isnumeric():
             # tqdm.write(f"Window number is non-numeric: {row["window"]}; substituting 0")
             row["window"] = 0
@@ -195,6 +203,9 @@ class Command(BaseCommand):
             row["channel"] = 0
         frequency = Frequency(
             scan_id=scan.id,
+            # (copied from the scan itself, which may have been created by an earlier row)
+            scan_datetime=scan.datetime,
+            frontend_id=scan.frontend_id,
             window=row["window"],
             channel=row["channel"],
             frequency=row["frequency_mhz"],
@@ -233,11 +244,49 @@ class Command(BaseCommand):
             help="Set the size of each chunk that is written to 'new' DB",
             default=20000,
         )
+        parser.add_argument(
+            "-c",
+            "--chunk-size",
+            type=int,
+            help="Number of ingested scans whose spectra, summaries and peaks are built "
+            "per transaction",
+            default=50,
+        )
         parser.add_argument(
             "--rfi-data-path",
             help="The path to the directory holding our GBT data files",
             default="/home/www.gb.nrao.edu/content/IPG/rfiarchive_files/GBTDataImages/",
         )
+        parser.add_argument(
+            "--no-summaries",
+            action="store_true",
+            help="Don't compute the channel count/frequency range/max intensity of the "
+            "ingested scans (use backfill_spectra --summaries to do so later)",
+        )
+        parser.add_argument(
+            "--no-spectra",
+            action="store_true",
+            help="Don't pack the ingested scans into ScanSpectrum rows "
+            "(use the backfill_spectra command to do so later)",
+        )
+        parser.add_argument(
+            "--no-rollups",
+            action="store_true",
+            help="Don't rebuild the SpectrumRollup rows of the ingested sessions "
+            "(use backfill_spectra --rollups to do so later)",
+        )
+        parser.add_argument(
+            "--no-peaks",
+            action="store_true",
+            help="Don't find and store the peaks of the ingested scans "
+            "(use backfill_spectra --peaks to do so later)",
+        )
+        parser.add_argument(
+            "--no-parquet",
+            action="store_true",
+            help="Don't export the ingested scans to the Parquet archive at RFI_PARQUET_ROOT "
+            "(use the sync_parquet_archive command to do so later)",
+        )
         parser.add_argument("--sql", action="store_true", help="Print all SQL queries")
         parser.add_argument(
             "--no-progress", action="store_true", help="Don't show progress bars"
@@ -262,7 +311,59 @@ class Command(BaseCommand):
             write_chunk(frequencies, write_chunk_size, chunk_start)
             progress.update(read_chunk_size)
 
+    def finalize_scans(
+        self,
+        scan_ids,
+        chunk_size=50,
+        summaries=True,
+        spectra=True,
+        rollups=True,
+        peaks=True,
+        parquet=True,
+        progress=False,
+    ):
+        """Build the per-scan data products of the scans touched by this ingestion.
+
+        The per-scan ones (spectra, summaries and peaks) are built `chunk_size` scans
+        at a time (in a transaction each), like backfill_spectra does
+        """
+        scan_ids = sorted(scan_ids)
+        num_spectra = 0
+        num_summaries = 0
+        num_peaks = 0
+        progress = tqdm(total=len(scan_ids), unit="scan", disable=not progress)
+        for chunk in chunks(scan_ids, chunk_size):
+            # drop the cached copies of the touched sessions (other processes stop using
+            # theirs on their own, since cache keys include when their scans were summarized)
+            SPECTRUM_CACHE.invalidate_sessions(
+                Scan.objects.filter(id__in=chunk).values_list("session_id", flat=True)
+            )
+            if spectra:
+                num_spectra += build_scan_spectra(chunk)
+            # (after the spectra: summarizing marks the sessions as changed for the caches)
+            if summaries:
+                num_summaries += build_scan_summaries(chunk)
+            if peaks:
+                num_peaks += build_scan_peaks(chunk)
+            progress.update(len(chunk))
+        progress.close()
+        if spectra:
+            tqdm.write(f"Packed {len(scan_ids)} scans into {num_spectra} ScanSpectrum rows")
+        if summaries:
+            tqdm.write(f"Summarized {num_summaries} scans")
+        if rollups:
+            num_rollups = build_rollups(scan_ids)
+            tqdm.write(f"Wrote {num_rollups} SpectrumRollup rows")
+        if peaks:
+            tqdm.write(f"Wrote {num_peaks} ScanPeaks rows")
+        if parquet and settings.RFI_PARQUET_ROOT:
+            num_channels = export_scans(settings.RFI_PARQUET_ROOT, scan_ids)
+            tqdm.write(
+                f"Exported {num_channels} channels to {settings.RFI_PARQUET_ROOT}"
+            )
+
     def handle(self, *args, **options):
+        self.scan_ids = set()
         if options["sql"]:
             db_logging_on()
 
@@ -320,14 +421,26 @@ class Command(BaseCommand):
             f"Fetching {num_rows} rows from MasterRfiCatalog in chunks of {read_chunk_size}"
         )
         rfi_data_path = Path(options["rfi_data_path"])
-        self.handle_rows(
-            rows=rows,
-            num_rows=num_rows,
-            read_chunk_size=read_chunk_size,
-            write_chunk_size=write_chunk_size,
-            rfi_data_path=rfi_data_path,
-            progress=not options["no_progress"],
-        )
+        with Benchmark(f"Ingested {num_rows} rows", logger=tqdm.write):
+            self.handle_rows(
+                rows=rows,
+                num_rows=num_rows,
+                read_chunk_size=read_chunk_size,
+                write_chunk_size=write_chunk_size,
+                rfi_data_path=rfi_data_path,
+                progress=not options["no_progress"],
+            )
+        with Benchmark(f"Finalized {len(self.scan_ids)} scans", logger=tqdm.write):
+            self.finalize_scans(
+                self.scan_ids,
+                chunk_size=options["chunk_size"],
+                summaries=not options["no_summaries"],
+                spectra=not options["no_spectra"],
+                rollups=not options["no_rollups"],
+                peaks=not options["no_peaks"],
+                parquet=not options["no_parquet"],
+                progress=not options["no_progress"],
+            )
 
         print(BackendCache)
         print(CoordinatesCache)
@@ -0,0 +1,243 @@
+"""Maintain the monthly partitions of the Frequency table.
+
+Migration 0006 turns rfi_frequency into a table partitioned by scan_datetime
+(PostgreSQL only) with all pre-existing rows in the DEFAULT partition. This
+command creates the monthly partitions (moving rows out of the DEFAULT
+partition as needed), attaches/detaches old ones, and backfills the
+denormalized scan_datetime/frontend columns of rows ingested before they existed
+(migration 0010 already does that once; this is for rows written afterwards by
+an older ingestion).
+"""
+
+import datetime
+import re
+
+from tqdm import tqdm
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from rfi.models import Frequency, Scan
+
+PARENT_TABLE = "rfi_frequency"
+DEFAULT_PARTITION = "rfi_frequency_default"
+PARTITION_NAME_REGEX = re.compile(r"^rfi_frequency_p(?P<year>\d{4})_(?P<month>\d{2})$")
+
+
+def parse_month(value):
+    """Parse a YYYY-MM string into the first day of that month."""
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m").date()
+    except ValueError as error:
+        raise CommandError(f"Expected a month as YYYY-MM, got {value!r}") from error
+
+
+def add_months(month, num_months):
+    month_index = month.year * 12 + month.month - 1 + num_months
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"rfi_frequency_p{month.year:04d}_{month.month:02d}"
+
+
+def partition_month(name):
+    match = PARTITION_NAME_REGEX.match(name)
+    if not match:
+        raise CommandError(f"{name!r} is not a monthly partition of {PARENT_TABLE}")
+    return datetime.date(int(match["year"]), int(match["month"]), 1)
+
+
+def month_bounds(month):
+    return (f"{month.isoformat()} 00:00:00+00", f"{add_months(month, 1).isoformat()} 00:00:00+00")
+
+
+class Command(BaseCommand):
+    help = "Create, attach and detach the monthly partitions of the Frequency table"
+    # Don't run Django's automated health checks on each execution
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="Create partitions up to this many months after the current one",
+        )
+        parser.add_argument(
+            "--since",
+            help="Also create partitions for every month from this one (YYYY-MM) on. "
+            "Rows in the DEFAULT partition that belong to them are moved over",
+        )
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Fill in scan_datetime/frontend on Frequency rows that predate them",
+        )
+        parser.add_argument(
+            "--detach-before",
+            help="Detach (but don't drop) every partition older than this month (YYYY-MM)",
+        )
+        parser.add_argument(
+            "--attach",
+            action="append",
+            default=[],
+            help="Re-attach a previously detached partition, e.g. rfi_frequency_p2021_10",
+        )
+        parser.add_argument(
+            "--merge",
+            action="store_true",
+            help="Move every row back into the DEFAULT partition and drop the monthly "
+            "partitions (required before reversing migration 0006)",
+        )
+        parser.add_argument(
+            "--list", action="store_true", help="List the partitions and exit"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Print the SQL instead of running it"
+        )
+        parser.add_argument(
+            "--no-progress", action="store_true", help="Don't show progress bars"
+        )
+
+    def execute_sql(self, sql, params=None):
+        if self.dry_run:
+            print(f"{sql};" if params is None else f"{sql}; -- {params}")
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def fetch(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def attached_partitions(self):
+        return [
+            name
+            for (name,) in self.fetch(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = %s::regclass ORDER BY c.relname",
+                [PARENT_TABLE],
+            )
+            if name != DEFAULT_PARTITION
+        ]
+
+    def table_exists(self, name):
+        return self.fetch("SELECT to_regclass(%s) IS NOT NULL", [name])[0][0]
+
+    def create_partition(self, month):
+        name = partition_name(month)
+        if self.table_exists(name):
+            return
+        lower, upper = month_bounds(month)
+        rows_in_default = self.fetch(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+            "WHERE scan_datetime >= %s AND scan_datetime < %s)",
+            [lower, upper],
+        )[0][0]
+        with transaction.atomic():
+            if rows_in_default:
+                # Postgres won't create a partition whose rows are still in the DEFAULT
+                # partition, so take it out of the way while the rows are moved over
+                tqdm.write(f"Moving {name} rows out of {DEFAULT_PARTITION}")
+                self.execute_sql(
+                    f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"
+                )
+            self.execute_sql(
+                f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+                "FOR VALUES FROM (%s) TO (%s)",
+                [lower, upper],
+            )
+            self.execute_sql(f"ALTER TABLE {name} ADD PRIMARY KEY (id)")
+            self.execute_sql(
+                f"ALTER TABLE {name} ADD UNIQUE (scan_id, channel, frequency)"
+            )
+            if rows_in_default:
+                where = "WHERE scan_datetime >= %s AND scan_datetime < %s"
+                self.execute_sql(
+                    f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} {where}",
+                    [lower, upper],
+                )
+                self.execute_sql(f"DELETE FROM {DEFAULT_PARTITION} {where}", [lower, upper])
+                self.execute_sql(
+                    f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"
+                )
+        tqdm.write(f"Created partition {name}")
+
+    def attach_partition(self, name):
+        lower, upper = month_bounds(partition_month(name))
+        self.execute_sql(
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+            [lower, upper],
+        )
+        tqdm.write(f"Attached partition {name}")
+
+    def detach_partitions_before(self, month):
+        for name in self.attached_partitions():
+            if partition_month(name) < month:
+                self.execute_sql(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+                tqdm.write(f"Detached partition {name}")
+
+    def merge_partitions(self):
+        for name in self.attached_partitions():
+            with transaction.atomic():
+                self.execute_sql(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+                self.execute_sql(f"INSERT INTO {DEFAULT_PARTITION} SELECT * FROM {name}")
+                self.execute_sql(f"DROP TABLE {name}")
+            tqdm.write(f"Merged partition {name} into {DEFAULT_PARTITION}")
+
+    def list_partitions(self):
+        for name, bound, num_rows in self.fetch(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), GREATEST(c.reltuples, 0)::bigint "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass ORDER BY c.relname",
+            [PARENT_TABLE],
+        ):
+            print(f"{name}\t{bound}\t~{num_rows} rows")
+
+    def backfill(self, progress=True):
+        scans = Scan.objects.values_list("id", "datetime", "frontend_id")
+        num_rows = 0
+        for scan_id, scan_datetime, frontend_id in tqdm(
+            scans, total=scans.count(), unit="scan", disable=not progress
+        ):
+            num_rows += Frequency.objects.filter(
+                scan_id=scan_id, scan_datetime__isnull=True
+            ).update(scan_datetime=scan_datetime, frontend_id=frontend_id)
+        print(f"Backfilled {num_rows} Frequency rows")
+
+    def handle(self, *args, **options):
+        self.dry_run = options["dry_run"]
+
+        if options["backfill"]:
+            # Works on any database; on PostgreSQL rows move to their monthly partition
+            self.backfill(progress=not options["no_progress"])
+
+        if connection.vendor != "postgresql":
+            if not options["backfill"]:
+                raise CommandError(
+                    f"Partitioning is only supported on PostgreSQL, not {connection.vendor}"
+                )
+            return
+
+        if options["list"]:
+            self.list_partitions()
+            return
+
+        if options["merge"]:
+            self.merge_partitions()
+            return
+
+        for name in options["attach"]:
+            self.attach_partition(name)
+
+        if options["detach_before"]:
+            self.detach_partitions_before(parse_month(options["detach_before"]))
+
+        this_month = datetime.date.today().replace(day=1)
+        first_month = parse_month(options["since"]) if options["since"] else this_month
+        month = first_month
+        while month <= add_months(this_month, options["months_ahead"]):
+            self.create_partition(month)
+            month = add_months(month, 1)
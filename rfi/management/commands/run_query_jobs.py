@@ -0,0 +1,58 @@
+"""Answer the heavy queries that the website hands off to the job queue (see rfi.jobs)."""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from rfi.jobs import claim_job, delete_old_jobs, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Run queued QueryJobs, waiting for new ones unless --once is given"
+    # Don't run Django's automated health checks on each execution
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once there are no more queued jobs",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between checks for new jobs",
+        )
+        parser.add_argument(
+            "--keep-days",
+            type=float,
+            default=1.0,
+            help="Delete finished jobs that are older than this",
+        )
+
+    def handle(self, *args, **options):
+        keep = timedelta(days=options["keep_days"])
+        num_jobs = 0
+        while True:
+            close_old_connections()
+            requeued = requeue_stale_jobs()
+            if requeued:
+                print(f"Queued {requeued} lost jobs again")
+            delete_old_jobs(keep)
+
+            job = claim_job()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+                continue
+
+            start = time.perf_counter()
+            job = run_job(job)
+            num_jobs += 1
+            print(f"{job} in {time.perf_counter() - start:.1f}s")
+
+        print(f"Ran {num_jobs} jobs")
@@ -0,0 +1,68 @@
+"""Export scans to the Parquet mirror of the RFI archive (see rfi.archive)."""
+
+from tqdm import tqdm
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rfi.archive import export_scans, exported_scan_ids
+from rfi.models import Scan
+
+
+class Command(BaseCommand):
+    help = "Write every scan that isn't in the Parquet archive yet to it"
+    # Don't run Django's automated health checks on each execution
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--root",
+            default=settings.RFI_PARQUET_ROOT,
+            help="The directory holding the archive (default: RFI_PARQUET_ROOT)",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-export every scan, not just those missing from the archive",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Limit the number of scans that are exported",
+        )
+        parser.add_argument(
+            "-c",
+            "--chunk-size",
+            type=int,
+            help="Number of scans to fetch per query",
+            default=50,
+        )
+        parser.add_argument(
+            "--no-progress", action="store_true", help="Don't show progress bars"
+        )
+
+    def handle(self, *args, **options):
+        root = options["root"]
+        if not root:
+            raise CommandError("Give an archive directory via --root or RFI_PARQUET_ROOT")
+
+        scan_ids = list(Scan.objects.order_by("datetime").values_list("id", flat=True))
+        if not options["all"]:
+            exported = exported_scan_ids(root)
+            scan_ids = [scan_id for scan_id in scan_ids if scan_id not in exported]
+        if options["limit"]:
+            scan_ids = scan_ids[: options["limit"]]
+
+        chunk_size = options["chunk_size"]
+        tqdm.write(f"Exporting {len(scan_ids)} scans to {root}")
+        progress = tqdm(
+            total=len(scan_ids), unit="scan", disable=options["no_progress"]
+        )
+        num_channels = 0
+        for chunk_start in range(0, len(scan_ids), chunk_size):
+            chunk = scan_ids[chunk_start : chunk_start + chunk_size]
+            num_channels += export_scans(root, chunk)
+            progress.update(len(chunk))
+        progress.close()
+
+        print(f"Wrote {num_channels} channels of {len(scan_ids)} scans")
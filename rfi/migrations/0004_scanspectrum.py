@@ -0,0 +1,30 @@
+# Generated by Django 3.2.23 on 2026-10-18 12:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rfi', '0003_file_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanSpectrum',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.PositiveIntegerField()),
+                ('freq_start', models.FloatField(help_text='Lowest frequency in MHz')),
+                ('freq_step', models.FloatField(help_text='Mean channel spacing in MHz')),
+                ('count', models.PositiveIntegerField(help_text='Number of channels')),
+                ('frequencies', models.BinaryField(help_text='Offsets from freq_start in MHz')),
+                ('intensities', models.BinaryField(help_text='Intensities in Jy')),
+                ('scan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rfi.scan')),
+            ],
+            options={
+                'unique_together': {('scan', 'window')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.23 on 2026-10-18 12:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rfi', '0004_scanspectrum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpectrumRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bin_width_khz', models.PositiveIntegerField(help_text='Width of each bin in kHz')),
+                ('datetime', models.DateTimeField(help_text='Datetime of the first scan in the session', null=True)),
+                ('freq_start', models.FloatField(help_text='Lower edge of bin 0 in MHz')),
+                ('count', models.PositiveIntegerField(help_text='Number of non-empty bins')),
+                ('bins', models.BinaryField(help_text='Bin numbers (uint32)')),
+                ('mins', models.BinaryField(help_text='Minimum intensity in Jy (float32)')),
+                ('maxs', models.BinaryField(help_text='Maximum intensity in Jy (float32)')),
+                ('means', models.BinaryField(help_text='Mean intensity in Jy (float32)')),
+                ('counts', models.BinaryField(help_text='Number of channels (uint32)')),
+                ('frontend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rfi.frontend')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rfi.session')),
+            ],
+            options={
+                'unique_together': {('session', 'frontend', 'bin_width_khz')},
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 3.2.23 on 2026-10-18 12:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Existing rows are kept in the DEFAULT partition; the manage_frequency_partitions
+# command creates the monthly partitions and moves rows into them.
+PARTITION_SQL = [
+    "ALTER TABLE rfi_frequency RENAME TO rfi_frequency_default",
+    "CREATE TABLE rfi_frequency (LIKE rfi_frequency_default INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+    "PARTITION BY RANGE (scan_datetime)",
+    "ALTER TABLE rfi_frequency ATTACH PARTITION rfi_frequency_default DEFAULT",
+    # These are created on every partition; existing equivalent indexes are reused
+    "CREATE INDEX rfi_frequency_scan_id_part ON rfi_frequency (scan_id)",
+    "CREATE INDEX rfi_frequency_frontend_datetime_part ON rfi_frequency (frontend_id, scan_datetime)",
+    "ALTER TABLE rfi_frequency ADD CONSTRAINT rfi_frequency_scan_id_fk_part "
+    "FOREIGN KEY (scan_id) REFERENCES rfi_scan (id) DEFERRABLE INITIALLY DEFERRED",
+    "ALTER TABLE rfi_frequency ADD CONSTRAINT rfi_frequency_frontend_id_fk_part "
+    "FOREIGN KEY (frontend_id) REFERENCES rfi_frontend (id) DEFERRABLE INITIALLY DEFERRED",
+]
+
+UNPARTITION_SQL = [
+    "ALTER TABLE rfi_frequency DETACH PARTITION rfi_frequency_default",
+    "DROP TABLE rfi_frequency",
+    "ALTER TABLE rfi_frequency_default RENAME TO rfi_frequency",
+]
+
+
+def partition_frequency(apps, schema_editor):
+    """Turn rfi_frequency into a table partitioned by month (PostgreSQL only)"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for sql in PARTITION_SQL:
+        schema_editor.execute(sql)
+
+
+def unpartition_frequency(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM pg_inherits "
+            "WHERE inhparent = 'rfi_frequency'::regclass"
+        )
+        if cursor.fetchone()[0] > 1:
+            raise ValueError(
+                "rfi_frequency has monthly partitions; merge them back into "
+                "rfi_frequency_default (manage_frequency_partitions --merge) first"
+            )
+    for sql in UNPARTITION_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rfi', '0005_spectrumrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='frequency',
+            name='frontend',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='rfi.frontend'),
+        ),
+        migrations.AddField(
+            model_name='frequency',
+            name='scan_datetime',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.RunPython(partition_frequency, unpartition_frequency),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.23 on 2026-10-18 12:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rfi', '0006_frequency_partitioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanPeaks',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prominence', models.FloatField(help_text='Prominence passed to find_peaks')),
+                ('freq_start', models.FloatField(help_text='Lowest peak frequency in MHz')),
+                ('count', models.PositiveIntegerField(help_text='Number of peaks')),
+                ('frequencies', models.BinaryField(help_text='Offsets from freq_start in MHz')),
+                ('intensities', models.BinaryField(help_text='Intensities in Jy')),
+                ('scan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rfi.scan')),
+            ],
+            options={
+                'unique_together': {('scan', 'prominence')},
+            },
+        ),
+    ]
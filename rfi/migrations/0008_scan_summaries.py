@@ -0,0 +1,33 @@
+# Generated by Django 3.2.23 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rfi', '0007_scanpeaks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scan',
+            name='channel_count',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='scan',
+            name='freq_max',
+            field=models.FloatField(help_text='Highest frequency in MHz', null=True),
+        ),
+        migrations.AddField(
+            model_name='scan',
+            name='freq_min',
+            field=models.FloatField(help_text='Lowest frequency in MHz', null=True),
+        ),
+        migrations.AddField(
+            model_name='scan',
+            name='intensity_max',
+            field=models.FloatField(help_text='Highest intensity in Jy', null=True),
+        ),
+    ]
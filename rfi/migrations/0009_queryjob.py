@@ -0,0 +1,33 @@
+# Generated by Django 3.2.23 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rfi', '0008_scan_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, help_text='Hash of the query parameters', max_length=64)),
+                ('params', models.JSONField(help_text='Query parameters (a list of values per name)')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=16)),
+                ('progress', models.FloatField(default=0, help_text='Fraction of the work done')),
+                ('message', models.TextField(blank=True, help_text='Current step, or the error')),
+                ('graphs', models.JSONField(help_text='HTML of each graph', null=True)),
+                ('spectra', models.BinaryField(null=True)),
+                ('sessions', models.JSONField(help_text='[session name, number of rows] of each run of the spectra', null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='queryjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('key',), name='unique_pending_query_job'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:02
+
+from django.db import migrations
+
+
+def backfill_frequency(apps, schema_editor):
+    """Fill in the scan_datetime/frontend columns (added by 0006) of the existing rows
+
+    Every query filters on them, so rows without them would never be found. One
+    scan is updated at a time, each in its own transaction (see `atomic` below)
+    """
+    Frequency = apps.get_model("rfi", "Frequency")
+    Scan = apps.get_model("rfi", "Scan")
+    scans = Scan.objects.filter(
+        id__in=Frequency.objects.filter(scan_datetime__isnull=True).values("scan_id")
+    ).values_list("id", "datetime", "frontend_id")
+    for scan_id, scan_datetime, frontend_id in scans.iterator():
+        Frequency.objects.filter(scan_id=scan_id, scan_datetime__isnull=True).update(
+            scan_datetime=scan_datetime, frontend_id=frontend_id
+        )
+
+
+class Migration(migrations.Migration):
+    # commit each scan's rows as they are done, rather than the whole table at once
+    atomic = False
+
+    dependencies = [
+        ('rfi', '0009_queryjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_frequency, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rfi', '0010_backfill_frequency_scan_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scan',
+            name='channels_updated',
+            field=models.DateTimeField(help_text='When the channels were last summarized', null=True),
+        ),
+    ]
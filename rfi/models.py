@@ -73,6 +73,18 @@ class Scan(models.Model):
     exposure = models.DecimalField(max_digits=8, decimal_places=5)
     tsys = models.DecimalField(max_digits=6, decimal_places=4)
     unit = models.TextField()
+    # Summary of the Frequency rows of this scan, so that point budgets and empty
+    # ranges can be checked without touching Frequency. Null until computed; see
+    # rfi.summaries
+    channel_count = models.PositiveIntegerField(null=True)
+    freq_min = models.FloatField(null=True, help_text="Lowest frequency in MHz")
+    freq_max = models.FloatField(null=True, help_text="Highest frequency in MHz")
+    intensity_max = models.FloatField(null=True, help_text="Highest intensity in Jy")
+    # Set whenever the summary is computed, i.e. after the channels were (re)written,
+    # so that caches of the channels can tell they changed (see rfi.cache)
+    channels_updated = models.DateTimeField(
+        null=True, help_text="When the channels were last summarized"
+    )
 
     def __str__(self):
         return f"{self.session.name} #{self.number}"
@@ -101,6 +113,11 @@ class Frequency(models.Model):
     channel = models.PositiveIntegerField()
     frequency = models.FloatField()
     intensity = models.FloatField(help_text="Intensity in Jy")
+    # Denormalized from Scan so that date/receiver filters don't have to join through
+    # Scan. On PostgreSQL the table is partitioned by month on scan_datetime; see the
+    # manage_frequency_partitions command
+    scan_datetime = models.DateTimeField(null=True, db_index=True)
+    frontend = models.ForeignKey("Frontend", null=True, on_delete=models.CASCADE)
 
     class Meta:
         unique_together = ("scan", "channel", "frequency")
@@ -113,6 +130,133 @@ class Frequency(models.Model):
         )
 
 
+# Packed version of Frequency: one row per scan/window instead of one per channel
+class ScanSpectrum(models.Model):
+    scan = models.ForeignKey("Scan", on_delete=models.CASCADE)
+    window = models.PositiveIntegerField()
+    freq_start = models.FloatField(help_text="Lowest frequency in MHz")
+    freq_step = models.FloatField(help_text="Mean channel spacing in MHz")
+    count = models.PositiveIntegerField(help_text="Number of channels")
+    # Little-endian float32 arrays, sorted by frequency; see rfi.spectrum
+    frequencies = models.BinaryField(help_text="Offsets from freq_start in MHz")
+    intensities = models.BinaryField(help_text="Intensities in Jy")
+
+    class Meta:
+        unique_together = ("scan", "window")
+
+    def __str__(self):
+        return (
+            f"{self.scan.session.name}: Scan #{self.scan.number}: "
+            f"Window #{self.window}: {self.count} channels from "
+            f"{self.freq_start} MHz"
+        )
+
+    @property
+    def frequency_array(self):
+        from .spectrum import unpack_array
+
+        return unpack_array(self.frequencies) + self.freq_start
+
+    @property
+    def intensity_array(self):
+        from .spectrum import unpack_array
+
+        return unpack_array(self.intensities)
+
+
+# Local maxima of a scan's spectrum (see rfi.peaks), found at ingest time
+class ScanPeaks(models.Model):
+    scan = models.ForeignKey("Scan", on_delete=models.CASCADE)
+    prominence = models.FloatField(help_text="Prominence passed to find_peaks")
+    freq_start = models.FloatField(help_text="Lowest peak frequency in MHz")
+    count = models.PositiveIntegerField(help_text="Number of peaks")
+    # Little-endian float32 arrays, sorted by frequency; see rfi.spectrum
+    frequencies = models.BinaryField(help_text="Offsets from freq_start in MHz")
+    intensities = models.BinaryField(help_text="Intensities in Jy")
+
+    class Meta:
+        unique_together = ("scan", "prominence")
+
+    def __str__(self):
+        return (
+            f"{self.scan.session.name}: Scan #{self.scan.number}: "
+            f"{self.count} peaks with prominence {self.prominence}"
+        )
+
+
+# Precomputed min/max/mean/count of a session's spectra, binned at a fixed resolution
+class SpectrumRollup(models.Model):
+    session = models.ForeignKey("Session", on_delete=models.CASCADE)
+    frontend = models.ForeignKey("Frontend", on_delete=models.CASCADE)
+    bin_width_khz = models.PositiveIntegerField(help_text="Width of each bin in kHz")
+    datetime = models.DateTimeField(
+        null=True, help_text="Datetime of the first scan in the session"
+    )
+    freq_start = models.FloatField(help_text="Lower edge of bin 0 in MHz")
+    count = models.PositiveIntegerField(help_text="Number of non-empty bins")
+    # Little-endian arrays with one entry per non-empty bin; see rfi.rollups
+    bins = models.BinaryField(help_text="Bin numbers (uint32)")
+    mins = models.BinaryField(help_text="Minimum intensity in Jy (float32)")
+    maxs = models.BinaryField(help_text="Maximum intensity in Jy (float32)")
+    means = models.BinaryField(help_text="Mean intensity in Jy (float32)")
+    counts = models.BinaryField(help_text="Number of channels (uint32)")
+
+    class Meta:
+        unique_together = ("session", "frontend", "bin_width_khz")
+
+    def __str__(self):
+        return (
+            f"{self.session.name}: {self.frontend.name}: "
+            f"{self.count} bins of {self.bin_width_khz} kHz"
+        )
+
+
+# A heavy query, answered by the run_query_jobs worker instead of the web server; see rfi.jobs
+class QueryJob(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+    PENDING = [QUEUED, RUNNING]
+
+    key = models.CharField(
+        max_length=64, db_index=True, help_text="Hash of the query parameters"
+    )
+    params = models.JSONField(help_text="Query parameters (a list of values per name)")
+    status = models.CharField(
+        max_length=16, choices=STATUSES, default=QUEUED, db_index=True
+    )
+    progress = models.FloatField(default=0, help_text="Fraction of the work done")
+    message = models.TextField(blank=True, help_text="Current step, or the error")
+    graphs = models.JSONField(null=True, help_text="HTML of each graph")
+    # The spectra of the line plot, in the f32 format of rfi.renderers
+    spectra = models.BinaryField(null=True)
+    sessions = models.JSONField(
+        null=True, help_text="[session name, number of rows] of each run of the spectra"
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            # identical queries share a job while it's pending
+            models.UniqueConstraint(
+                fields=["key"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="unique_pending_query_job",
+            )
+        ]
+
+    def __str__(self):
+        return f"QueryJob #{self.id}: {self.status} ({self.progress:.0%})"
+
+
 # TODO: Prefix all names with /home/www.gb.nrao.edu/content/IPG/rfiarchive_files/GBTDataImages/
 # From column 'filename'
 class File(models.Model):
@@ -0,0 +1,100 @@
+"""Peaks of each scan, precomputed at ingest time.
+
+DoGraph used to run `find_peaks` over the whole (up to 3M row) result set on
+every request. Instead, the peaks of every scan are found once, at each of the
+prominence levels used by the receivers, and stored as ScanPeaks rows; the web
+view then only fetches the (much smaller) stored peaks.
+"""
+
+import numpy as np
+from scipy.signal import find_peaks
+
+from django.db import transaction
+
+from .models import ScanPeaks
+from .spectrum import pack_array, packed_frame, scan_arrays
+
+# find_peaks prominence to use for each receiver; see DoGraph.refine_data
+PROMINENCE_BY_RECEIVER = {
+    "RcvrPF_1": 0.05,
+    "Rcvr_800": 0.05,
+    "Prime Focus 1": 0.05,
+    "Prime Focus 2": 0.001,
+    "Rcvr1_2": 0.03,
+    "Rcvr2_3": 0.001,
+    "Rcvr4_6": 0.001,
+    "Rcvr8_10": 0.001,
+    "Rcvr12_18": 0.001,
+    "RcvrArray18_26": 0.001,
+    "Rcvr26_40": 0.001,
+    "Rcvr40_52": 0.0001,
+}
+# Peaks are stored at every level, since a query for several receivers uses the smallest
+PROMINENCE_LEVELS = tuple(sorted(set(PROMINENCE_BY_RECEIVER.values())))
+
+
+def prominence_for(receivers):
+    """The prominence to use for a query over the given receivers."""
+    return min(PROMINENCE_BY_RECEIVER[rcvr] for rcvr in receivers)
+
+
+def make_peaks(scan_id, prominence, frequencies, intensities):
+    """Find the peaks of the given (sorted) spectrum; create (but don't save) a ScanPeaks."""
+    if len(intensities):
+        peaks = find_peaks(intensities, prominence=prominence)[0]
+    else:
+        peaks = np.array([], dtype=np.int64)
+    freq_start = float(frequencies[peaks[0]]) if len(peaks) else 0.0
+    return ScanPeaks(
+        scan_id=scan_id,
+        prominence=prominence,
+        freq_start=freq_start,
+        count=len(peaks),
+        frequencies=pack_array(frequencies[peaks] - freq_start),
+        intensities=pack_array(intensities[peaks]),
+    )
+
+
+def build_scan_peaks(scan_ids, batch_size=100):
+    """(Re)build the ScanPeaks rows of the given scans at every prominence level.
+
+    Returns the number of ScanPeaks rows written
+    """
+    scan_ids = list(scan_ids)
+    peaks = []
+    for scan_id in scan_ids:
+        frequencies, intensities = scan_arrays(scan_id)
+        for prominence in PROMINENCE_LEVELS:
+            peaks.append(make_peaks(scan_id, prominence, frequencies, intensities))
+    with transaction.atomic():
+        ScanPeaks.objects.filter(scan_id__in=scan_ids).delete()
+        ScanPeaks.objects.bulk_create(peaks, batch_size=batch_size)
+    return len(peaks)
+
+
+def has_peaks(scans, prominence):
+    """True if the peaks of every one of `scans` have been stored at the given prominence."""
+    num_scans = scans.count()
+    return (
+        num_scans > 0
+        and ScanPeaks.objects.filter(scan__in=scans, prominence=prominence).count()
+        == num_scans
+    )
+
+
+def load_peaks(scans, prominence, freq_low=None, freq_high=None):
+    """Decode the stored peaks of `scans` into a DataFrame.
+
+    The columns match those of `rfi.spectrum.load_spectra`
+    """
+    return packed_frame(
+        ScanPeaks.objects.filter(scan__in=scans, prominence=prominence).values_list(
+            "freq_start",
+            "frequencies",
+            "intensities",
+            "scan__datetime",
+            "scan__session__name",
+        ),
+        freq_low,
+        freq_high,
+    )
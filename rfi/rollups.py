@@ -0,0 +1,198 @@
+"""Multi-resolution spectrum pyramid.
+
+Wide queries (a full receiver band over months) used to pull every raw channel
+only to throw most of them away. Instead, each session/receiver is binned at a
+few fixed resolutions when it is ingested, and wide queries are answered from
+the coarsest level that still gives enough bins to fill the plot.
+"""
+
+import numpy as np
+import pandas as pd
+
+from django.db import transaction
+from django.db.models import Exists, Min, OuterRef
+
+from .loaders import load_columns
+from .models import Frequency, Scan, SpectrumRollup
+from .spectrum import load_spectra, pack_array, unpack_array
+
+# Bin widths of each level of the pyramid, finest first
+ROLLUP_BIN_WIDTHS_KHZ = (10, 100, 1_000, 10_000)
+# A level is only used if it gives at least this many bins across the requested span
+MIN_PLOT_BINS = 2_000
+
+BIN_DTYPE = np.dtype("<u4")
+
+
+def rollup(frequencies, intensities, bin_width_khz):
+    """Bin the given channels into `bin_width_khz` wide bins.
+
+    Returns the lower edge of bin 0 and, for every non-empty bin, its bin number
+    and the min/max/mean/count of the intensities that fell into it
+    """
+    width = bin_width_khz / 1000
+    bins = np.floor(np.asarray(frequencies) / width).astype(np.int64)
+    first_bin = bins.min()
+    bins -= first_bin
+
+    order = np.argsort(bins, kind="stable")
+    bins = bins[order]
+    intensities = np.asarray(intensities, dtype=np.float64)[order]
+    starts = np.flatnonzero(np.r_[True, np.diff(bins) != 0])
+    counts = np.diff(np.r_[starts, len(bins)])
+    return (
+        float(first_bin * width),
+        bins[starts],
+        np.minimum.reduceat(intensities, starts),
+        np.maximum.reduceat(intensities, starts),
+        np.add.reduceat(intensities, starts) / counts,
+        counts,
+    )
+
+
+def session_data(scans):
+    """All channels of the given scans, from packed spectra if they exist."""
+    data = load_spectra(scans)
+    if data.empty:
+        data = load_columns(
+            Frequency.objects.filter(scan__in=scans), ("frequency", "intensity")
+        )
+    return data
+
+
+def build_rollups(scan_ids):
+    """(Re)build every level of the rollups of the sessions the given scans belong to.
+
+    Returns the number of SpectrumRollup rows written
+    """
+    pairs = (
+        Scan.objects.filter(id__in=list(scan_ids))
+        .values_list("session_id", "frontend_id")
+        .distinct()
+    )
+    num_rollups = 0
+    for session_id, frontend_id in pairs:
+        scans = Scan.objects.filter(session_id=session_id, frontend_id=frontend_id)
+        data = session_data(scans)
+        rollups = []
+        if not data.empty:
+            first_datetime = scans.aggregate(Min("datetime"))["datetime__min"]
+            for bin_width_khz in ROLLUP_BIN_WIDTHS_KHZ:
+                freq_start, bins, mins, maxs, means, counts = rollup(
+                    data.frequency, data.intensity, bin_width_khz
+                )
+                rollups.append(
+                    SpectrumRollup(
+                        session_id=session_id,
+                        frontend_id=frontend_id,
+                        bin_width_khz=bin_width_khz,
+                        datetime=first_datetime,
+                        freq_start=freq_start,
+                        count=len(bins),
+                        bins=pack_array(bins, BIN_DTYPE),
+                        mins=pack_array(mins),
+                        maxs=pack_array(maxs),
+                        means=pack_array(means),
+                        counts=pack_array(counts, BIN_DTYPE),
+                    )
+                )
+        with transaction.atomic():
+            SpectrumRollup.objects.filter(
+                session_id=session_id, frontend_id=frontend_id
+            ).delete()
+            SpectrumRollup.objects.bulk_create(rollups)
+        num_rollups += len(rollups)
+    return num_rollups
+
+
+def choose_bin_width(span):
+    """The coarsest bin width (in kHz) that still gives MIN_PLOT_BINS over `span` MHz.
+
+    Returns None if even the finest level is too coarse (use the raw data instead)
+    """
+    for bin_width_khz in sorted(ROLLUP_BIN_WIDTHS_KHZ, reverse=True):
+        if span / (bin_width_khz / 1000) >= MIN_PLOT_BINS:
+            return bin_width_khz
+    return None
+
+
+def of_pairs(scans):
+    """Matches the rows (scans or rollups) of the session/receiver pairs of `scans`."""
+    return Exists(scans.filter(session=OuterRef("session"), frontend=OuterRef("frontend")))
+
+
+def rollups_for(scans, bin_width_khz):
+    return SpectrumRollup.objects.filter(of_pairs(scans), bin_width_khz=bin_width_khz)
+
+
+def has_rollups(scans, bin_width_khz):
+    """True if the rollups at the given level cover exactly the channels of `scans`.
+
+    That is, every session/receiver of `scans` has been rolled up, and `scans` holds
+    every scan of them (a rollup covers the whole session, so it can't answer a
+    query for only some of its scans, like a date range that splits the session)
+    """
+    num_pairs = scans.values("session", "frontend").distinct().count()
+    return (
+        num_pairs > 0
+        and rollups_for(scans, bin_width_khz).count() == num_pairs
+        and Scan.objects.filter(of_pairs(scans)).count() == scans.count()
+    )
+
+
+def rollup_extent(scans):
+    """The (low, high) frequency span of the rollups of `scans`, or None if there are none."""
+    bin_width_khz = max(ROLLUP_BIN_WIDTHS_KHZ)
+    rollups = list(
+        rollups_for(scans, bin_width_khz).values_list("freq_start", "count", "bins")
+    )
+    if not rollups:
+        return None
+    width = bin_width_khz / 1000
+    return (
+        min(freq_start for freq_start, _, _ in rollups),
+        max(
+            freq_start + (int(unpack_array(bins, BIN_DTYPE)[-1]) + 1) * width
+            for freq_start, count, bins in rollups
+            if count
+        ),
+    )
+
+
+def load_rollups(scans, bin_width_khz, freq_low=None, freq_high=None):
+    """Decode the rollups of `scans` into a DataFrame with one row per non-empty bin.
+
+    `frequency` is the center of each bin and `intensity` is the maximum intensity in
+    it, so spikes survive; `mean` and `count` are included as well. The remaining
+    columns match those of `rfi.spectrum.load_spectra`
+    """
+    width = bin_width_khz / 1000
+    frames = []
+    for freq_start, bins, maxs, means, counts, datetime, session_name in rollups_for(
+        scans, bin_width_khz
+    ).values_list(
+        "freq_start", "bins", "maxs", "means", "counts", "datetime", "session__name"
+    ):
+        frequency = freq_start + (unpack_array(bins, BIN_DTYPE) + 0.5) * width
+        in_range = np.ones(len(frequency), dtype=bool)
+        if freq_low is not None:
+            in_range &= frequency >= freq_low
+        if freq_high is not None:
+            in_range &= frequency <= freq_high
+        frames.append(
+            pd.DataFrame(
+                {
+                    "frequency": frequency[in_range],
+                    "intensity": unpack_array(maxs)[in_range].astype(np.float64),
+                    "mean": unpack_array(means)[in_range].astype(np.float64),
+                    "count": unpack_array(counts, BIN_DTYPE)[in_range],
+                    "scan__datetime": pd.Timestamp(datetime),
+                    "scan__session__name": session_name,
+                }
+            )
+        )
+    if not frames:
+        return pd.DataFrame(
+            columns=["frequency", "intensity", "scan__datetime", "scan__session__name"]
+        )
+    return pd.concat(frames, ignore_index=True)
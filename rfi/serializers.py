@@ -1,9 +1,15 @@
 from rest_framework import serializers
 
-from rfi.models import MasterRfiCatalog
+from rfi.forms import QueryForm
 
 
-class MasterRfiCatalogSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = MasterRfiCatalog
-        fields = ["frequency_mhz", "intensity_jy"]
+class SpectrumQuerySerializer(serializers.Serializer):
+    """The query parameters of the spectra endpoint; the same as those of `QueryForm`."""
+
+    def validate(self, attrs):
+        form = QueryForm(self.initial_data)
+        if not form.is_valid():
+            raise serializers.ValidationError(
+                {field: list(errors) for field, errors in form.errors.items()}
+            )
+        return form.cleaned_data
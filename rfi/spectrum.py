@@ -0,0 +1,217 @@
+"""Packed per-scan spectra.
+
+Frequency stores one row per channel, which makes for billions of tiny rows.
+ScanSpectrum instead stores each scan/window as a pair of contiguous
+little-endian float32 arrays. This module converts Frequency rows into
+ScanSpectrum rows and decodes ScanSpectrum rows straight into NumPy/pandas.
+
+Frequencies are stored as offsets from `freq_start` so that float32 keeps
+sub-kHz precision even at Q-band; intensities are stored as-is.
+"""
+
+import numpy as np
+import pandas as pd
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Frequency, ScanSpectrum
+
+DTYPE = np.dtype("<f4")
+
+
+def pack_array(values, dtype=DTYPE):
+    """Pack the given values into little-endian (float32, by default) bytes."""
+    return np.ascontiguousarray(values, dtype=dtype).tobytes()
+
+
+def unpack_array(blob, dtype=DTYPE):
+    """Decode bytes (or a memoryview) produced by `pack_array`. No copy is made."""
+    return np.frombuffer(blob, dtype=dtype)
+
+
+def make_spectrum(scan_id, window, frequencies, intensities):
+    """Create (but don't save) a ScanSpectrum from per-channel arrays."""
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    intensities = np.asarray(intensities, dtype=np.float64)
+    order = np.argsort(frequencies, kind="stable")
+    frequencies = frequencies[order]
+    intensities = intensities[order]
+
+    count = len(frequencies)
+    freq_start = float(frequencies[0])
+    freq_step = float((frequencies[-1] - freq_start) / (count - 1)) if count > 1 else 0.0
+    return ScanSpectrum(
+        scan_id=scan_id,
+        window=window,
+        freq_start=freq_start,
+        freq_step=freq_step,
+        count=count,
+        frequencies=pack_array(frequencies - freq_start),
+        intensities=pack_array(intensities),
+    )
+
+
+def spectra_from_frequencies(scan_id):
+    """Build the ScanSpectrum objects for every window of the given scan."""
+    rows = np.array(
+        Frequency.objects.filter(scan_id=scan_id).values_list(
+            "window", "frequency", "intensity"
+        ),
+        dtype=np.float64,
+    )
+    if not len(rows):
+        return []
+
+    windows = rows[:, 0].astype(np.int64)
+    return [
+        make_spectrum(
+            scan_id, int(window), rows[windows == window, 1], rows[windows == window, 2]
+        )
+        for window in np.unique(windows)
+    ]
+
+
+def scan_arrays(scan_id):
+    """The frequencies and intensities of every channel of a scan, sorted by frequency.
+
+    Packed spectra are used if the scan has any; otherwise its Frequency rows are
+    """
+    spectra = ScanSpectrum.objects.filter(scan_id=scan_id).values_list(
+        "freq_start", "frequencies", "intensities"
+    )
+    if spectra:
+        frequencies = np.concatenate(
+            [unpack_array(freqs) + freq_start for freq_start, freqs, _ in spectra]
+        )
+        intensities = np.concatenate(
+            [unpack_array(intens) for _, _, intens in spectra]
+        ).astype(np.float64)
+    else:
+        rows = np.array(
+            Frequency.objects.filter(scan_id=scan_id).values_list("frequency", "intensity"),
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        frequencies, intensities = rows.T
+    order = np.argsort(frequencies, kind="stable")
+    return frequencies[order], intensities[order]
+
+
+def build_scan_spectra(scan_ids, batch_size=100):
+    """(Re)build the ScanSpectrum rows of the given scans from their Frequency rows.
+
+    Returns the number of ScanSpectrum rows written
+    """
+    scan_ids = list(scan_ids)
+    spectra = []
+    for scan_id in scan_ids:
+        spectra.extend(spectra_from_frequencies(scan_id))
+    with transaction.atomic():
+        ScanSpectrum.objects.filter(scan_id__in=scan_ids).delete()
+        ScanSpectrum.objects.bulk_create(spectra, batch_size=batch_size)
+    return len(spectra)
+
+
+def spectra_in_range(scans, freq_low=None, freq_high=None):
+    """Return the ScanSpectrum rows of `scans` that overlap the given frequency range."""
+    spectra = ScanSpectrum.objects.filter(scan__in=scans).annotate(
+        freq_end=F("freq_start") + F("freq_step") * (F("count") - 1)
+    )
+    if freq_low is not None:
+        spectra = spectra.filter(freq_end__gte=freq_low)
+    if freq_high is not None:
+        spectra = spectra.filter(freq_start__lte=freq_high)
+    return spectra
+
+
+def count_points(scans, freq_low=None, freq_high=None):
+    """Estimate the number of channels in the given range from spectrum metadata alone."""
+    meta = np.array(
+        spectra_in_range(scans, freq_low, freq_high).values_list(
+            "freq_start", "freq_step", "count"
+        ),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    freq_start, freq_step, count = meta.T
+    first = np.zeros_like(count)
+    last = count.copy()
+    # Only uniformly spaced channels can be sliced from metadata; others count in full
+    spaced = freq_step > 0
+    if freq_low is not None:
+        first[spaced] = np.ceil((freq_low - freq_start[spaced]) / freq_step[spaced])
+    if freq_high is not None:
+        last[spaced] = np.floor((freq_high - freq_start[spaced]) / freq_step[spaced]) + 1
+    return int(np.clip(last - np.clip(first, 0, None), 0, count).sum())
+
+
+def packed_frame(rows, freq_low=None, freq_high=None, progress=None):
+    """Decode (freq_start, frequencies, intensities, scan datetime, session name) rows.
+
+    The frequencies of each row must be sorted. Returns a DataFrame with the columns of
+    `Frequency.objects.values("frequency", "intensity", "scan__datetime", "scan__session__name")`.
+    `progress(num_channels)` is called with the number of channels decoded so far
+    after every row
+    """
+    num_channels = 0
+    frequencies = []
+    intensities = []
+    labels = []
+    for freq_start, freq_blob, intens_blob, scan_datetime, session_name in rows:
+        freqs = unpack_array(freq_blob) + freq_start
+        intens = unpack_array(intens_blob)
+        # Frequencies are sorted, so the requested range is a contiguous slice
+        lo = np.searchsorted(freqs, freq_low, side="left") if freq_low is not None else 0
+        hi = (
+            np.searchsorted(freqs, freq_high, side="right")
+            if freq_high is not None
+            else len(freqs)
+        )
+        if hi <= lo:
+            continue
+        frequencies.append(freqs[lo:hi])
+        intensities.append(intens[lo:hi])
+        labels.append((scan_datetime, session_name))
+        if progress:
+            num_channels += hi - lo
+            progress(num_channels)
+
+    if not frequencies:
+        return pd.DataFrame(
+            columns=["frequency", "intensity", "scan__datetime", "scan__session__name"]
+        )
+
+    counts = [len(freqs) for freqs in frequencies]
+    scan_datetimes, session_names = zip(*labels)
+    return pd.DataFrame(
+        {
+            "frequency": np.concatenate(frequencies),
+            "intensity": np.concatenate(intensities).astype(np.float64),
+            "scan__datetime": pd.to_datetime(
+                np.repeat(np.array(scan_datetimes, dtype=object), counts), utc=True
+            ),
+            "scan__session__name": np.repeat(
+                np.array(session_names, dtype=object), counts
+            ),
+        }
+    )
+
+
+def load_spectra(scans, freq_low=None, freq_high=None, progress=None):
+    """Decode the spectra of `scans` into a DataFrame.
+
+    The columns match those of
+    `Frequency.objects.values("frequency", "intensity", "scan__datetime", "scan__session__name")`
+    so the result can be used in place of the per-channel query
+    """
+    return packed_frame(
+        spectra_in_range(scans, freq_low, freq_high).values_list(
+            "freq_start",
+            "frequencies",
+            "intensities",
+            "scan__datetime",
+            "scan__session__name",
+        ),
+        freq_low,
+        freq_high,
+        progress,
+    )
@@ -0,0 +1,212 @@
+// Draw the figures embedded by rfi.figures.figure_div (needs plotly.js)
+(function () {
+  const TYPED_ARRAYS = {
+    i1: Int8Array,
+    u1: Uint8Array,
+    i2: Int16Array,
+    u2: Uint16Array,
+    i4: Int32Array,
+    u4: Uint32Array,
+    f4: Float32Array,
+    f8: Float64Array,
+  };
+
+  // turn {dtype, bdata, shape} specs back into typed arrays (2D ones into rows)
+  function decode(value) {
+    if (Array.isArray(value)) {
+      return value.map(decode);
+    }
+    if (value === null || typeof value !== "object") {
+      return value;
+    }
+    if ("bdata" in value && "dtype" in value) {
+      const bytes = Uint8Array.from(atob(value.bdata), (c) => c.charCodeAt(0));
+      const array = new TYPED_ARRAYS[value.dtype](bytes.buffer);
+      if (!value.shape) {
+        return array;
+      }
+      const [rows, columns] = value.shape;
+      return Array.from({ length: rows }, (_, row) =>
+        array.subarray(row * columns, (row + 1) * columns)
+      );
+    }
+    const decoded = {};
+    for (const [key, item] of Object.entries(value)) {
+      decoded[key] = decode(item);
+    }
+    return decoded;
+  }
+
+  // the mean intensity at each frequency, over all sessions
+  function averageTrace(frequencies, intensities) {
+    const sums = new Map();
+    frequencies.forEach((frequency, i) => {
+      const [sum, count] = sums.get(frequency) || [0, 0];
+      sums.set(frequency, [sum + intensities[i], count + 1]);
+    });
+    const x = Float64Array.from(sums.keys()).sort();
+    const y = x.map((frequency) => {
+      const [sum, count] = sums.get(frequency);
+      return sum / count;
+    });
+    return { type: "scattergl", mode: "lines", name: "Average", x, y, line: { color: "black" } };
+  }
+
+  // fetch spectra in the f32 format of rfi.renderers: one line per session, plus their average
+  async function loadSpectra(url) {
+    const response = await fetch(url);
+    if (!response.ok) {
+      throw new Error(`${url}: ${response.status} ${await response.text()}`);
+    }
+    const sessions = JSON.parse(response.headers.get("X-RFI-Sessions"));
+    // float64 frequencies, then float32 intensities
+    const buffer = await response.arrayBuffer();
+    const numRows = buffer.byteLength / 12;
+    const frequencies = new Float64Array(buffer, 0, numRows);
+    const intensities = new Float32Array(buffer, 8 * numRows, numRows);
+
+    const traces = [averageTrace(frequencies, intensities)];
+    let start = 0;
+    for (const [name, count] of sessions) {
+      traces.push({
+        type: "scattergl",
+        mode: "lines",
+        name,
+        x: frequencies.subarray(start, start + count),
+        y: intensities.subarray(start, start + count),
+      });
+      start += count;
+    }
+    return traces;
+  }
+
+  // fetch a tile of rfi.views.tile: the max of each of its columns, per session
+  async function loadTile(url, tiles, level, index) {
+    const response = await fetch(`${url}${level}/${index}/`);
+    if (!response.ok) {
+      throw new Error(`${url}: ${response.status} ${await response.text()}`);
+    }
+    const sessions = JSON.parse(response.headers.get("X-RFI-Sessions"));
+    const values = new Float32Array(await response.arrayBuffer());
+    const maxs = new Map();
+    sessions.forEach((session, row) => {
+      // each row holds the mins, then the maxs
+      const start = (2 * row + 1) * tiles.columns;
+      maxs.set(session, values.subarray(start, start + tiles.columns));
+    });
+    return maxs;
+  }
+
+  // the max of each column of the tiles that cover [low, high], as one line per session
+  async function loadTiles(tiles, low, high, widthPixels) {
+    // about one column per pixel
+    const level = Math.min(
+      tiles.max_level,
+      Math.max(0, Math.ceil(Math.log2((tiles.level0_column_width * widthPixels) / (high - low))))
+    );
+    const columnWidth = tiles.level0_column_width / 2 ** level;
+    const tileWidth = tiles.columns * columnWidth;
+    const first = Math.max(0, Math.floor(low / tileWidth));
+    const last = Math.floor(high / tileWidth);
+    const numColumns = (last - first + 1) * tiles.columns;
+
+    const x = Float64Array.from({ length: numColumns }, (_, i) => (first * tiles.columns + i + 0.5) * columnWidth);
+    const lines = new Map();
+    const requests = [];
+    for (const url of tiles.urls) {
+      for (let index = first; index <= last; index++) {
+        requests.push(
+          loadTile(url, tiles, level, index).then((maxs) => {
+            for (const [session, values] of maxs) {
+              if (!lines.has(session)) {
+                lines.set(session, new Float32Array(numColumns).fill(NaN));
+              }
+              // receivers may share sessions; keep the max of both
+              const line = lines.get(session);
+              const offset = (index - first) * tiles.columns;
+              values.forEach((value, i) => {
+                if (!(line[offset + i] >= value)) {
+                  line[offset + i] = value;
+                }
+              });
+            }
+          })
+        );
+      }
+    }
+    await Promise.all(requests);
+
+    // the mean of the sessions at each column
+    const sums = new Float64Array(numColumns);
+    const counts = new Uint32Array(numColumns);
+    for (const line of lines.values()) {
+      line.forEach((value, i) => {
+        if (!Number.isNaN(value)) {
+          sums[i] += value;
+          counts[i] += 1;
+        }
+      });
+    }
+    const traces = [
+      {
+        type: "scattergl",
+        mode: "lines",
+        name: "Average",
+        x,
+        y: sums.map((sum, i) => (counts[i] ? sum / counts[i] : NaN)),
+        line: { color: "black" },
+      },
+    ];
+    for (const session of Array.from(lines.keys()).sort()) {
+      traces.push({ type: "scattergl", mode: "lines", name: session, x, y: lines.get(session) });
+    }
+    return traces;
+  }
+
+  // replace the lines with tiles when zooming in, and restore them when zooming out
+  function zoomWithTiles(target, figure, tiles) {
+    const lines = figure.data;
+    let request = 0;
+    target.on("plotly_relayout", (event) => {
+      if (event["xaxis.autorange"]) {
+        request += 1;
+        Plotly.react(target, lines, target.layout, figure.config);
+        return;
+      }
+      const low = event["xaxis.range[0]"];
+      const high = event["xaxis.range[1]"];
+      if (low === undefined || high === undefined) {
+        return;
+      }
+      const current = (request += 1);
+      loadTiles(tiles, low, high, target.clientWidth)
+        .then((traces) => {
+          // a newer zoom may have finished first
+          if (current === request) {
+            Plotly.react(target, traces, target.layout, figure.config);
+          }
+        })
+        .catch(console.error);
+    });
+  }
+
+  async function drawFigure(script) {
+    const figure = decode(JSON.parse(script.textContent));
+    if (script.dataset.spectra) {
+      figure.data = figure.data.concat(await loadSpectra(script.dataset.spectra));
+    }
+    const target = document.getElementById(script.dataset.target);
+    await Plotly.newPlot(target, figure.data, figure.layout, figure.config);
+    if (script.dataset.tiles) {
+      zoomWithTiles(target, figure, JSON.parse(script.dataset.tiles));
+    }
+  }
+
+  function drawFigures() {
+    for (const script of document.querySelectorAll("script.rfi-figure")) {
+      drawFigure(script).catch(console.error);
+    }
+  }
+
+  document.addEventListener("DOMContentLoaded", drawFigures);
+})();
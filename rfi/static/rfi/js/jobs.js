@@ -0,0 +1,23 @@
+// Show the progress of a QueryJob (see rfi.jobs), and its graphs once it's finished
+(function () {
+  const POLL_INTERVAL_MS = 1000;
+
+  async function poll(element) {
+    const response = await fetch(element.dataset.statusUrl);
+    const job = await response.json();
+    element.querySelector(".progress-bar").style.width = `${Math.round(job.progress * 100)}%`;
+    element.querySelector(".job-message").textContent = job.message;
+    if (job.status === "done" || job.status === "failed") {
+      // the page of a finished job holds its graphs (or errors)
+      window.location.reload();
+      return;
+    }
+    setTimeout(() => poll(element), POLL_INTERVAL_MS);
+  }
+
+  document.addEventListener("DOMContentLoaded", () => {
+    for (const element of document.querySelectorAll(".query-job")) {
+      poll(element).catch(console.error);
+    }
+  });
+})();
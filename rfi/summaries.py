@@ -0,0 +1,80 @@
+"""Per-scan summaries of the Frequency rows (Scan.channel_count/freq_min/freq_max/intensity_max).
+
+With these, the point budget, the session list and "is there any data in this
+range?" can all be answered from Scan alone, before a single Frequency row is
+read. Scans whose summary hasn't been computed yet (null columns) are treated
+as possibly having data anywhere, and make the estimates fall back to counting.
+"""
+
+import numpy as np
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils.timezone import now
+
+from .models import Frequency, Scan
+
+SUMMARY_FIELDS = ["channel_count", "freq_min", "freq_max", "intensity_max", "channels_updated"]
+
+
+def build_scan_summaries(scan_ids):
+    """(Re)compute the summary columns of the given scans. Returns the number of scans updated."""
+    scans = {scan.id: scan for scan in Scan.objects.filter(id__in=list(scan_ids))}
+    updated = now()
+    for scan in scans.values():
+        # scans without any Frequency rows are known to be empty
+        scan.channel_count = 0
+        scan.freq_min = scan.freq_max = scan.intensity_max = None
+        scan.channels_updated = updated
+    for scan_id, channel_count, freq_min, freq_max, intensity_max in (
+        Frequency.objects.filter(scan_id__in=list(scans))
+        .order_by()
+        .values_list("scan_id")
+        .annotate(Count("id"), Min("frequency"), Max("frequency"), Max("intensity"))
+    ):
+        scan = scans[scan_id]
+        scan.channel_count = channel_count
+        scan.freq_min = freq_min
+        scan.freq_max = freq_max
+        scan.intensity_max = intensity_max
+    with transaction.atomic():
+        Scan.objects.bulk_update(scans.values(), SUMMARY_FIELDS, batch_size=500)
+    return len(scans)
+
+
+def in_freq_range(scans, freq_low=None, freq_high=None):
+    """Keep the scans of `scans` that may have channels in the given range."""
+    has_data = Q(channel_count__gt=0)
+    if freq_low is not None:
+        has_data &= Q(freq_max__gte=freq_low)
+    if freq_high is not None:
+        has_data &= Q(freq_min__lte=freq_high)
+    return scans.filter(has_data | Q(channel_count__isnull=True))
+
+
+def estimate_points(scans, freq_low=None, freq_high=None):
+    """Estimate the number of channels of `scans` in the given range from their summaries.
+
+    Channels are assumed to be evenly spread between freq_min and freq_max, so the
+    estimate is exact if no range is given. Returns None if any scan has no summary
+    """
+    summaries = np.array(
+        scans.values_list("channel_count", "freq_min", "freq_max"), dtype=np.float64
+    ).reshape(-1, 3)
+    channel_count, freq_min, freq_max = summaries.T
+    if np.isnan(channel_count).any():
+        return None
+
+    has_data = channel_count > 0
+    channel_count, freq_min, freq_max = (
+        channel_count[has_data],
+        freq_min[has_data],
+        freq_max[has_data],
+    )
+    low = freq_min if freq_low is None else np.maximum(freq_min, freq_low)
+    high = freq_max if freq_high is None else np.minimum(freq_max, freq_high)
+    span = freq_max - freq_min
+    fraction = np.where(
+        span > 0, np.clip(high - low, 0, None) / np.where(span > 0, span, 1), high >= low
+    )
+    return int(np.ceil((channel_count * fraction).sum()))
@@ -1,8 +1,34 @@
+import json
+import shutil
+import tempfile
 from datetime import datetime
+from pathlib import Path
 
-from django.test import TestCase
+import numpy as np
 
+from django.test import TestCase, TransactionTestCase
+
+from . import archive
+from .cache import DiskSpectrumCache, SpectrumCache, cached_spectra, freq_bucket
+from .decimate import decimate, m4_indices
+from .export import COLUMNS, FORMATS, export
+from .figures import figure_div, figure_json
 from .forms import QueryForm
+from .heatmap import binned_max_frame, waterfall
+from .jobs import claim_job, query_params, run_job, submit_job
+from .loaders import load_channels, load_columns, load_scan_channels
+from .peaks import PROMINENCE_LEVELS, build_scan_peaks, make_peaks, prominence_for
+from .renderers import ArrowRenderer, Float32Renderer
+from .rollups import build_rollups, choose_bin_width, has_rollups, rollup, rollups_for
+from .spectrum import (
+    build_scan_spectra,
+    count_points,
+    load_spectra,
+    pack_array,
+    unpack_array,
+)
+from .summaries import build_scan_summaries, estimate_points, in_freq_range
+from .tiles import TILE_COLUMNS, TileTooLarge, build_tile, column_width, tile_span
 
 
 # Create your tests here.
@@ -52,3 +78,926 @@ class DateTestCases(TestCase):
 		self.assertEquals(form.errors["end"], ['Specify a date of interest OR date range'])
 		self.assertEquals(form.errors["start"], ['Specify a date of interest OR date range'])
 		self.assertEquals(form.errors["date"], ['Specify a date of interest OR date range'])
+
+
+def make_scan(session_name="AGBT22A_999_01", frontend_name="Rcvr1_2", number=1, when=datetime(2022, 10, 1, 12)):
+	"""Create a Scan (and everything it hangs off of) for the given session"""
+	from django.utils.timezone import make_aware
+
+	from .models import (
+	    Backend,
+	    Coordinates,
+	    Feed,
+	    File,
+	    FrequencyType,
+	    Frontend,
+	    Polarization,
+	    Project,
+	    Scan,
+	    Session,
+	    Source,
+	)
+
+	project, _ = Project.objects.get_or_create(name=session_name[:12])
+	file, _ = File.objects.get_or_create(name=session_name, path=f"/tmp/{session_name}")
+	session, _ = Session.objects.get_or_create(name=session_name, project=project, file=file)
+	frontend, _ = Frontend.objects.get_or_create(name=frontend_name)
+	return Scan.objects.create(
+		session=session,
+		feed=Feed.objects.get_or_create(number=0, frontend=frontend)[0],
+		frontend=frontend,
+		backend=Backend.objects.get_or_create(name="VEGAS")[0],
+		coordinates=Coordinates.objects.get_or_create(azimuth=0, elevation=45)[0],
+		source=Source.objects.get_or_create(name="RFI")[0],
+		frequency_type=FrequencyType.objects.get_or_create(name="TOPO")[0],
+		polarization=Polarization.objects.get_or_create(name="L")[0],
+		number=number,
+		mjd=59853 + number / 1000,
+		datetime=make_aware(when),
+		lst=0,
+		resolution=0.01,
+		exposure=1,
+		tsys=1,
+		unit="Jy",
+	)
+
+
+class SpectrumTestCases(TestCase):
+	def setUp(self):
+		from .models import Frequency
+
+		self.scan = make_scan()
+		self.frequencies = np.linspace(1100, 1900, 801)
+		self.intensities = np.random.default_rng(0).random(801)
+		Frequency.objects.bulk_create(
+			Frequency(scan=self.scan, window=i // 401, channel=i, frequency=f, intensity=n)
+			for i, (f, n) in enumerate(zip(self.frequencies[::-1], self.intensities[::-1]))
+		)
+
+	def test_PackRoundTrip(self):
+		values = np.array([0.5, -1.25, 3e6])
+		np.testing.assert_array_equal(unpack_array(pack_array(values)), values.astype(np.float32))
+
+	def test_BuildAndLoad(self):
+		from .models import Scan
+
+		self.assertEqual(build_scan_spectra([self.scan.id]), 2)
+		scans = Scan.objects.filter(pk=self.scan.pk)
+		data = load_spectra(scans, 1200, 1300).sort_values("frequency")
+		in_range = (self.frequencies >= 1200) & (self.frequencies <= 1300)
+		np.testing.assert_allclose(data.frequency, self.frequencies[in_range], atol=1e-4)
+		np.testing.assert_allclose(data.intensity, self.intensities[in_range], rtol=1e-6)
+		self.assertEqual(set(data.scan__session__name), {"AGBT22A_999_01"})
+		self.assertEqual(count_points(scans, 1200, 1300), in_range.sum())
+
+	def test_FinalizeInChunks(self):
+		from unittest import mock
+
+		from .management.commands import ingest_legacy_rfi_db
+		from .models import Frequency, Scan, ScanPeaks, ScanSpectrum
+
+		scans = [self.scan] + [make_scan(number=number) for number in (2, 3)]
+		for scan in scans[1:]:
+			Frequency.objects.bulk_create(Frequency(scan=scan, window=0, channel=i, frequency=1100 + i, intensity=i) for i in range(10))
+		with mock.patch.object(ingest_legacy_rfi_db, "build_scan_spectra", wraps=build_scan_spectra) as build, mock.patch.object(
+			ingest_legacy_rfi_db, "build_scan_peaks", wraps=build_scan_peaks
+		) as build_peaks:
+			ingest_legacy_rfi_db.Command().finalize_scans([scan.id for scan in scans], chunk_size=2, rollups=False, parquet=False)
+		# the scans are packed (and summarized, and their peaks found) two at a time
+		self.assertEqual([len(call.args[0]) for call in build.call_args_list], [2, 1])
+		self.assertEqual([len(call.args[0]) for call in build_peaks.call_args_list], [2, 1])
+		self.assertEqual(ScanSpectrum.objects.count(), 4)
+		self.assertEqual(ScanPeaks.objects.count(), 3 * len(PROMINENCE_LEVELS))
+		self.assertEqual([scan.channel_count for scan in Scan.objects.order_by("number")], [801, 10, 10])
+
+
+class RollupTestCases(TestCase):
+	def test_Rollup(self):
+		freq_start, bins, mins, maxs, means, counts = rollup([1.0005, 1.0009, 1.0031, 1.0004], [1, 5, 2, 3], 1)
+		self.assertAlmostEqual(freq_start, 1.0)
+		np.testing.assert_array_equal(bins, [0, 3])
+		np.testing.assert_array_equal(mins, [1, 2])
+		np.testing.assert_array_equal(maxs, [5, 2])
+		np.testing.assert_array_equal(means, [3, 2])
+		np.testing.assert_array_equal(counts, [3, 1])
+	def test_ChooseBinWidth(self):
+		self.assertEqual(choose_bin_width(10_000), 1_000)
+		self.assertEqual(choose_bin_width(800), 100)
+		self.assertIsNone(choose_bin_width(5))
+	def test_RollupsOfPairs(self):
+		from .models import Frequency, Scan
+
+		scans = [
+			make_scan("AGBT22A_999_01", "Rcvr1_2", 1, datetime(2022, 10, 1, 12)),
+			make_scan("AGBT22A_999_01", "Rcvr2_3", 2, datetime(2022, 10, 1, 13)),
+			make_scan("AGBT22A_999_01", "Rcvr1_2", 3, datetime(2022, 10, 1, 14)),
+			make_scan("AGBT22A_999_02", "Rcvr2_3", 4, datetime(2022, 10, 2, 12)),
+		]
+		for scan in scans:
+			Frequency.objects.bulk_create(
+				Frequency(scan=scan, window=0, channel=i, frequency=1000 + i, intensity=scan.number) for i in range(50)
+			)
+		self.assertEqual(build_rollups([scan.id for scan in scans]), 12)
+		# only the rollups of the selected session/receiver pairs (not of AGBT22A_999_01 with Rcvr2_3)
+		selected = Scan.objects.filter(pk__in=[scans[0].pk, scans[3].pk])
+		self.assertEqual(
+			set(rollups_for(selected, 1_000).values_list("session__name", "frontend__name")),
+			{("AGBT22A_999_01", "Rcvr1_2"), ("AGBT22A_999_02", "Rcvr2_3")},
+		)
+		# a rollup can't stand in for only some of the scans of its session
+		self.assertFalse(has_rollups(selected, 1_000))
+		self.assertTrue(has_rollups(Scan.objects.filter(pk__in=[scans[0].pk, scans[2].pk, scans[3].pk]), 1_000))
+
+
+class IngestTestCases(TestCase):
+	def test_FrequencyCopiesItsScan(self):
+		from rfi_query.utils import ModelCache
+
+		from .management.commands import ingest_legacy_rfi_db
+
+		root = Path(tempfile.mkdtemp())
+		self.addCleanup(shutil.rmtree, root)
+		(root / "AGBT22A_999_01.fits").touch()
+		for cache in vars(ingest_legacy_rfi_db).values():
+			if isinstance(cache, ModelCache):
+				self.addCleanup(cache._cache.clear)
+		row = dict(
+			projid="AGBT22A_999_01", filename="AGBT22A_999_01.fits", frontend="Rcvr1_2", feed=0, backend="VEGAS",
+			azimuth_deg=0, elevation_deg=45, source="RFI", frequency_type="TOPO", polarization="L", scan_number=1,
+			mjd=59853.5, lst=0, resolution_mhz=0.01, exposure=1, tsys=1, units="Jy", window=0, channel=0,
+			frequency_mhz=1100, intensity_jy=1,
+		)
+		command = ingest_legacy_rfi_db.Command()
+		command.scan_ids = set()
+		first = command.handle_row(row, root)
+		# a row of the same scan (as the ingestion identifies them) that names another frontend
+		second = command.handle_row(dict(row, frontend="Rcvr2_3", channel=1), root)
+		self.assertEqual(second.scan_id, first.scan_id)
+		self.assertEqual((second.frontend_id, second.scan_datetime), (first.scan.frontend_id, first.scan.datetime))
+
+
+class MigrationTestCases(TestCase):
+	def test_BackfillFrequency(self):
+		from importlib import import_module
+
+		from django.apps import apps
+
+		from .models import Frequency
+
+		scan = make_scan()
+		Frequency.objects.bulk_create(Frequency(scan=scan, window=0, channel=i, frequency=1000 + i, intensity=1) for i in range(5))
+		import_module("rfi.migrations.0010_backfill_frequency_scan_columns").backfill_frequency(apps, None)
+		self.assertEqual(set(Frequency.objects.values_list("scan_datetime", "frontend")), {(scan.datetime, scan.frontend_id)})
+
+
+class PeaksTestCases(TestCase):
+	def test_ProminenceFor(self):
+		self.assertEqual(prominence_for(["Rcvr1_2", "Rcvr40_52"]), 0.0001)
+	def test_MakePeaks(self):
+		frequencies = np.linspace(1000, 1010, 11)
+		intensities = np.array([0, 1, 0, 0, 5, 0, 0, 0, 2, 0, 0], dtype=float)
+		peaks = make_peaks(1, 0.5, frequencies, intensities)
+		self.assertEqual(peaks.count, 3)
+		np.testing.assert_allclose(unpack_array(peaks.frequencies) + peaks.freq_start, [1001, 1004, 1008])
+		np.testing.assert_array_equal(unpack_array(peaks.intensities), [1, 5, 2])
+
+
+class ArchiveTestCases(TestCase):
+	def setUp(self):
+		from .models import Frequency
+
+		self.root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.root)
+		self.scans = [
+			make_scan("AGBT22A_999_01", "Rcvr1_2", 1, datetime(2022, 9, 30, 12)),
+			make_scan("AGBT22A_999_02", "Rcvr1_2", 2, datetime(2022, 10, 2, 12)),
+			make_scan("AGBT22A_999_02", "Prime Focus 1", 3, datetime(2022, 10, 2, 13)),
+		]
+		for scan in self.scans:
+			Frequency.objects.bulk_create(
+				Frequency(scan=scan, window=0, channel=i, frequency=1000 + i, intensity=scan.number)
+				for i in range(100)
+			)
+		self.assertEqual(archive.export_scans(self.root, [scan.id for scan in self.scans]), 300)
+
+	def test_ExportedScanIds(self):
+		self.assertEqual(archive.exported_scan_ids(self.root), {scan.id for scan in self.scans})
+
+	def test_Query(self):
+		data = archive.query(self.root, receivers=["Rcvr1_2"], freq_low=1010, freq_high=1019)
+		self.assertEqual(list(data.columns), ["frequency", "intensity", "scan__datetime", "scan__session__name"])
+		self.assertEqual(len(data), 20)
+		self.assertEqual(set(data.scan__session__name), {"AGBT22A_999_01", "AGBT22A_999_02"})
+		data = archive.query(self.root, start=self.scans[1].datetime, end=self.scans[2].datetime)
+		self.assertEqual(set(data.intensity), {2, 3})
+		self.assertEqual(archive.count_rows(self.root, receivers=["Prime Focus 1"]), 100)
+
+	def test_LatestDatetime(self):
+		self.assertEqual(archive.latest_datetime(self.root, ["Rcvr1_2"]), self.scans[1].datetime)
+		self.assertEqual(archive.latest_datetime(self.root, ["Rcvr1_2"], before=self.scans[1].datetime.replace(day=1)), self.scans[0].datetime)
+		self.assertIsNone(archive.latest_datetime(self.root, ["Rcvr1_2"], before=datetime(2022, 1, 1).astimezone()))
+		self.assertIsNone(archive.latest_datetime(self.root, ["Rcvr1_2"], freq_low=1200))
+
+	def test_WebQuery(self):
+		from django.core.exceptions import ValidationError
+		from django.test import RequestFactory, override_settings
+
+		from .models import Scan
+		from .views import DoGraph
+
+		# the web queries of the archive don't need the database to have the scans
+		Scan.objects.all().delete()
+		with override_settings(RFI_DATA_SOURCE="parquet", RFI_PARQUET_ROOT=self.root), self.assertNumQueries(0):
+			request = RequestFactory().get("/", {"receivers": ["Rcvr1_2"], "date": "2022-10-05", "freq_low": 1010, "freq_high": 1019})
+			graph = DoGraph(request=request)
+			graph.get_data()
+			# (the intensities are flat, so there are no peaks)
+			self.assertTrue(graph.refine_data(graph.filter_data()).empty)
+			self.assertEqual(graph.scan_start, self.scans[1].datetime)
+			data = graph.load_data()
+			self.assertEqual(len(data), 10)
+			self.assertEqual(set(data.scan__session__name), {"AGBT22A_999_02"})
+			self.assertEqual(graph.estimated_cost(), 10)
+			self.assertEqual(graph.session_names(), ["AGBT22A_999_02"])
+
+			request = RequestFactory().get("/", {"receivers": ["Rcvr1_2"], "date": "2022-09-01"})
+			graph = DoGraph(request=request)
+			graph.get_data()
+			with self.assertRaises(ValidationError):
+				graph.filter_data()
+
+
+class HeatmapTestCases(TestCase):
+	def test_BinnedMax(self):
+		import pandas as pd
+
+		datetimes = pd.to_datetime(["2022-10-02 12:00", "2022-10-01 12:00"], utc=True)
+		data = pd.DataFrame(
+			{
+				"frequency": [1000.25 + i / 2 for i in range(5)] + [1000.25 + i / 2 for i in range(2)],
+				"intensity": [(i % 3) * 1 for i in range(5)] + [(i % 3) * 2 for i in range(2)],
+				"scan__datetime": [datetimes[0]] * 5 + [datetimes[1]] * 2,
+			}
+		)
+		row_datetimes, freq_bins, max_intensities = binned_max_frame(data)
+		self.assertEqual(list(row_datetimes), [datetimes[1], datetimes[0]])
+		np.testing.assert_array_equal(freq_bins, [1000, 1001, 1002, 1003])
+		np.testing.assert_array_equal(max_intensities, [[2, np.nan, np.nan], [1, 2, 1]])
+
+	def test_Waterfall(self):
+		import pandas as pd
+
+		row_datetimes = pd.DatetimeIndex(["2022-10-01 12:00", "2022-10-02 12:00", "2022-10-05 12:00", "2022-10-05 13:00"], tz="UTC")
+		grid = np.array([[1, np.nan], [2, 3], [4, np.nan], [np.nan, 5]])
+		# daily sessions; the missing days are gaps
+		row_times, rows = waterfall(row_datetimes, grid, max_rows=500)
+		self.assertEqual(list(row_times), list(pd.date_range("2022-10-02", periods=5, tz="UTC")))
+		np.testing.assert_array_equal(rows, [[1, np.nan], [2, 3], [np.nan, np.nan], [np.nan, np.nan], [4, 5]])
+		# more sessions than rows are merged
+		row_times, rows = waterfall(row_datetimes, grid, max_rows=2)
+		np.testing.assert_array_equal(rows, [[4, 3], [np.nan, 5]])
+		# evenly spaced sessions fill exactly max_rows rows, not one more
+		row_datetimes = pd.date_range("2020-01-01", periods=1000, tz="UTC")
+		row_times, rows = waterfall(row_datetimes, np.arange(1000.0)[:, np.newaxis], max_rows=500)
+		self.assertEqual(len(row_times), 500)
+		self.assertEqual(rows.shape, (500, 1))
+		self.assertEqual(np.nanmax(rows), 999)
+
+
+class LoaderTestCases(TestCase):
+	def test_LoadChannels(self):
+		import pandas as pd
+
+		from .models import Frequency
+
+		for number, session_name in enumerate(["AGBT22A_999_01", "AGBT22A_999_02", "AGBT22A_999_01"]):
+			scan = make_scan(session_name, number=number, when=datetime(2022, 10, 1 + number, 12))
+			Frequency.objects.bulk_create(
+				Frequency(scan=scan, window=0, channel=i, frequency=1000 + i, intensity=i * number) for i in range(7)
+			)
+		channels = Frequency.objects.filter(frequency__gte=1002).order_by("scan__datetime", "frequency")
+		# grow past the preallocated size
+		data = load_channels(channels, size_hint=3)
+		expected = pd.DataFrame(channels.values("frequency", "intensity", "scan__datetime", "scan__session__name"))
+		self.assertEqual(data.scan__session__name.dtype, "category")
+		self.assertEqual(list(data.scan__session__name.cat.categories), ["AGBT22A_999_01", "AGBT22A_999_02"])
+		pd.testing.assert_frame_equal(data.astype({"scan__session__name": object}), expected, check_dtype=False)
+		progress = []
+		load_columns(channels, ("frequency",), chunk_size=6, progress=progress.append)
+		self.assertEqual(progress, [6, 12, 15])
+
+
+class CacheTestCases(TestCase):
+	def setUp(self):
+		from .models import Frequency
+
+		self.scans = [make_scan(f"AGBT22A_999_0{number}", number=number, when=datetime(2022, 10, number, 12)) for number in range(1, 4)]
+		for scan in self.scans:
+			Frequency.objects.bulk_create(
+				Frequency(scan=scan, scan_datetime=scan.datetime, frontend=scan.frontend, window=0, channel=i, frequency=1290 + i, intensity=scan.number) for i in range(40)
+			)
+		self.loaded = []
+
+	def loader(self, scans, freq_low, freq_high):
+		self.loaded.append(sorted(scans.values_list("session__name", flat=True)))
+		return load_scan_channels(scans, freq_low, freq_high)
+
+	def test_FreqBucket(self):
+		self.assertEqual(freq_bucket(1302, 1320), (1300, 1350))
+		self.assertEqual(freq_bucket(None, 1320), (None, 1350))
+
+	def test_Eviction(self):
+		import pandas as pd
+
+		data = pd.DataFrame({"frequency": np.zeros(100)})
+		cache = SpectrumCache(2000)
+		cache.put("a", data)
+		cache.put("b", data)
+		self.assertIsNotNone(cache.get("a"))
+		cache.put("c", data)
+		self.assertIsNone(cache.get("b"))
+		self.assertEqual(len(cache), 2)
+		cache.put("d", pd.DataFrame({"frequency": np.zeros(1000)}))
+		self.assertIsNone(cache.get("d"))
+
+	def test_PointBudget(self):
+		from .models import Scan
+
+		build_scan_summaries([scan.pk for scan in self.scans])
+		ranges = []
+
+		def loader(scans, freq_low, freq_high):
+			ranges.append((freq_low, freq_high))
+			return load_scan_channels(scans, freq_low, freq_high)
+
+		scans = Scan.objects.filter(pk=self.scans[0].pk)
+		cache = SpectrumCache(10 ** 8)
+		# the session has 30 channels in the bucket, more than the budget allows
+		data = cached_spectra(scans, ["Rcvr1_2"], 1300, 1301, loader, cache, max_points=10)
+		self.assertEqual(list(data.frequency), [1300, 1301])
+		self.assertEqual(ranges, [(1300, 1301)])
+		self.assertEqual(len(cache), 0)
+		# within the budget the whole bucket is read, and cached
+		data = cached_spectra(scans, ["Rcvr1_2"], 1300, 1301, loader, cache, max_points=30)
+		self.assertEqual(list(data.frequency), [1300, 1301])
+		self.assertEqual(ranges[1:], [(1300, 1350)])
+		self.assertEqual(len(cache), 1)
+
+	def test_OnlyMissingSessionsAreFetched(self):
+		from .models import Scan
+
+		cache = SpectrumCache(10 ** 8)
+		scans = Scan.objects.filter(pk__in=[self.scans[0].pk, self.scans[1].pk])
+		data = cached_spectra(scans, ["Rcvr1_2"], 1300, 1309, self.loader, cache)
+		self.assertEqual(len(data), 20)
+		data = cached_spectra(Scan.objects.all(), ["Rcvr1_2"], 1302, 1320, self.loader, cache)
+		self.assertEqual(self.loaded, [["AGBT22A_999_01", "AGBT22A_999_02"], ["AGBT22A_999_03"]])
+		self.assertEqual(len(data), 3 * 19)
+		self.assertEqual(data.frequency.min(), 1302)
+
+		# a new scan makes the session's entry stale
+		new_scan = make_scan("AGBT22A_999_01", number=4, when=datetime(2022, 10, 1, 13))
+		cached_spectra(Scan.objects.filter(pk=new_scan.pk), ["Rcvr1_2"], 1302, 1320, self.loader, cache)
+		self.assertEqual(self.loaded[-1], ["AGBT22A_999_01", "AGBT22A_999_01"])
+		# and so do channels that are re-ingested (and summarized again) for existing scans
+		build_scan_summaries([self.scans[2].pk])
+		cached_spectra(Scan.objects.all(), ["Rcvr1_2"], 1302, 1320, self.loader, cache)
+		self.assertEqual(self.loaded[-1], ["AGBT22A_999_03"])
+
+	def test_DiskCache(self):
+		import time
+		from unittest import mock
+
+		import pandas as pd
+
+		from .models import Scan
+
+		root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, root)
+		data = cached_spectra(Scan.objects.all(), ["Rcvr1_2"], 1300, 1309, self.loader, DiskSpectrumCache(root, 10 ** 8))
+		# a new process finds the entries, and they are the same as what was loaded
+		cache = DiskSpectrumCache(root, 10 ** 8)
+		self.assertEqual(len(cache), 3)
+		cached = cached_spectra(Scan.objects.all(), ["Rcvr1_2"], 1302, 1305, self.loader, cache)
+		self.assertEqual(len(self.loaded), 1)
+		self.assertEqual(cache.hits, 3)
+		expected = data[data.frequency.between(1302, 1305)].reset_index(drop=True)
+		pd.testing.assert_frame_equal(cached, expected)
+
+		# the least recently used entries are evicted
+		session_id = self.scans[2].session_id
+		cache.invalidate_sessions([session_id])
+		self.assertEqual(len(cache), 2)
+		cache.max_bytes = cache.num_bytes
+		cache.get((self.scans[0].session_id, ("Rcvr1_2",), (1300.0, 1350.0), (1, self.scans[0].pk, None)))
+		cache.put((session_id, ("Rcvr1_2",), (1300.0, 1350.0), (1, self.scans[2].pk, None)), expected)
+		self.assertEqual(len(cache), 2)
+		self.assertIsNone(cache.get((self.scans[1].session_id, ("Rcvr1_2",), (1300.0, 1350.0), (1, self.scans[1].pk, None))))
+		self.assertEqual(len(list(Path(root).glob("*.parquet"))), 2)
+		cache.clear()
+		self.assertEqual(len(cache), 0)
+		self.assertEqual(list(Path(root).glob("*.parquet")), [])
+
+		# entries that were stored longer ago than the maximum age are fetched again
+		key = (session_id, ("Rcvr1_2",), (1300.0, 1350.0), (1, self.scans[2].pk, None))
+		cache = DiskSpectrumCache(root, 10 ** 8, max_age=60)
+		cache.put(key, expected)
+		with mock.patch("rfi.cache.time.time", return_value=time.time() + 30):
+			self.assertIsNotNone(cache.get(key))
+		with mock.patch("rfi.cache.time.time", return_value=time.time() + 90):
+			self.assertIsNone(cache.get(key))
+		self.assertEqual(len(cache), 0)
+		self.assertEqual(list(Path(root).glob("*.parquet")), [])
+
+
+class SummaryTestCases(TestCase):
+	def test_Summaries(self):
+		from .models import Frequency, Scan
+
+		scan = make_scan(number=1)
+		empty_scan = make_scan(number=2)
+		unsummarized_scan = make_scan(number=3)
+		Frequency.objects.bulk_create(
+			Frequency(scan=scan, window=0, channel=i, frequency=1100 + i, intensity=i % 7) for i in range(801)
+		)
+		self.assertEqual(build_scan_summaries([scan.id, empty_scan.id]), 2)
+		scan.refresh_from_db()
+		empty_scan.refresh_from_db()
+		self.assertEqual((scan.channel_count, scan.freq_min, scan.freq_max, scan.intensity_max), (801, 1100, 1900, 6))
+		self.assertEqual(empty_scan.channel_count, 0)
+
+		self.assertEqual(set(in_freq_range(Scan.objects.all(), 1000, 1200)), {scan, unsummarized_scan})
+		self.assertEqual(set(in_freq_range(Scan.objects.all(), 2000, 2100)), {unsummarized_scan})
+		summarized = Scan.objects.exclude(pk=unsummarized_scan.pk)
+		self.assertEqual(estimate_points(summarized), 801)
+		self.assertAlmostEqual(estimate_points(summarized, 1200, 1300), 101, delta=1)
+		self.assertIsNone(estimate_points(Scan.objects.all()))
+
+
+class DecimateTestCases(TestCase):
+	def test_M4(self):
+		frequencies = np.linspace(1000, 2000, 100_001)
+		intensities = np.random.default_rng(0).random(len(frequencies))
+		intensities[12_345] = 100
+		intensities[54_321] = -100
+		kept = m4_indices(frequencies, intensities, 100)
+		self.assertLessEqual(len(kept), 400)
+		self.assertTrue(np.all(np.diff(kept) > 0))
+		self.assertIn(12_345, kept)
+		self.assertIn(54_321, kept)
+		self.assertEqual((kept[0], kept[-1]), (0, len(frequencies) - 1))
+		# small inputs are left alone
+		np.testing.assert_array_equal(m4_indices(frequencies[:10], intensities[:10], 100), np.arange(10))
+
+	def test_Decimate(self):
+		import pandas as pd
+
+		frequencies = np.linspace(1000, 2000, 10_000)
+		data = pd.concat(
+			pd.DataFrame({"frequency": frequencies, "intensity": np.sin(frequencies * number), "scan__session__name": f"AGBT22A_999_0{number}"})
+			for number in range(1, 4)
+		)
+		decimated = decimate(data, 3_000)
+		self.assertLessEqual(len(decimated), 3_000)
+		self.assertEqual(set(decimated.scan__session__name), set(data.scan__session__name))
+		for _, session_data in decimated.groupby("scan__session__name"):
+			self.assertAlmostEqual(session_data.intensity.max(), 1, places=3)
+
+
+class FigureTestCases(TestCase):
+	def test_FigureJson(self):
+		import base64
+		import json
+
+		import plotly.graph_objs as go
+
+		z = np.array([[1.5, np.nan, 3], [4, 5, 6]])
+		figure = go.Figure(go.Heatmap(x=np.array([1000.125, 1001.125, 1002.125]), y=["2022-10-01", "2022-10-02"], z=z))
+		trace = json.loads(figure_json(figure))["data"][0]
+		self.assertEqual(trace["x"]["dtype"], "f8")
+		np.testing.assert_array_equal(np.frombuffer(base64.b64decode(trace["x"]["bdata"]), "<f8"), [1000.125, 1001.125, 1002.125])
+		self.assertEqual((trace["z"]["dtype"], trace["z"]["shape"]), ("f4", [2, 3]))
+		np.testing.assert_array_equal(np.frombuffer(base64.b64decode(trace["z"]["bdata"]), "<f4").reshape(2, 3), z)
+		self.assertEqual(trace["y"], ["2022-10-01", "2022-10-02"])
+
+		# the JSON can't close its script tag
+		figure.update_layout(title="</script>")
+		self.assertEqual(figure_div(figure).count("</script>"), 1)
+
+
+class SpectraApiTestCases(TestCase):
+	def setUp(self):
+		import pandas as pd
+
+		self.data = pd.DataFrame({
+			"frequency": [1001.0, 1000.0, 1000.5],
+			"intensity": [3.0, 1.0, 2.0],
+			"scan__datetime": pd.to_datetime(["2022-10-02 12:00", "2022-10-01 12:00", "2022-10-01 12:00"], utc=True),
+			"scan__session__name": ["AGBT22A_999_02", "AGBT22A_999_01", "AGBT22A_999_01"],
+		})
+
+	def test_Float32Renderer(self):
+		from django.http import HttpResponse
+
+		response = HttpResponse()
+		body = Float32Renderer().render(self.data, renderer_context={"response": response})
+		np.testing.assert_array_equal(np.frombuffer(body, "<f8", count=3), [1000, 1000.5, 1001])
+		np.testing.assert_array_equal(np.frombuffer(body, "<f4", offset=3 * 8), [1, 2, 3])
+		# neighbouring channels stay apart at high frequencies
+		self.data.frequency = [40_000.002, 40_000.0, 40_000.001]
+		body = Float32Renderer().render(self.data, renderer_context={"response": response})
+		self.assertEqual(len(set(np.frombuffer(body, "<f8", count=3))), 3)
+		self.assertEqual(response["X-RFI-Sessions"], '[["AGBT22A_999_01", 2], ["AGBT22A_999_02", 1]]')
+
+	def test_ArrowRenderer(self):
+		import pyarrow as pa
+
+		table = pa.ipc.open_stream(ArrowRenderer().render(self.data)).read_all()
+		self.assertEqual(table.column_names, ["frequency", "intensity", "scan_datetime", "session"])
+		self.assertEqual(table.column("session").to_pylist(), list(self.data.scan__session__name))
+		np.testing.assert_array_equal(table.column("intensity").to_numpy(), self.data.intensity)
+
+	def test_InvalidQuery(self):
+		response = self.client.get("/api/spectra/", {"receivers": "Rcvr1_2", "start": "2022-10-10", "end": "2022-09-30", "format": "f32"})
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(response["Content-Type"], "application/json")
+		self.assertIn("start", response.json())
+		# so are queries without any data
+		response = self.client.get("/api/spectra/", {"receivers": "Rcvr1_2", "date": "2001-01-01"})
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(response.json(), {"date": ["No Data previous to your specified date."]})
+
+
+	def test_PageSpectra(self):
+		import html
+		import re
+
+		from .models import Frequency
+
+		scan = make_scan()
+		Frequency.objects.bulk_create(
+			Frequency(scan=scan, scan_datetime=scan.datetime, frontend=scan.frontend, window=0, channel=i, frequency=1300 + i * 0.1, intensity=i % 5)
+			for i in range(100)
+		)
+		page = self.client.get("/", {"receivers": "Rcvr1_2", "start": "2022-09-30", "end": "2022-10-10", "freq_low": "1300", "freq_high": "1400", "submit": "Submit"})
+		spectra_url = html.unescape(re.search(r'data-spectra="([^"]+)"', page.content.decode())[1])
+		# the page already read and refined the spectra; the API hands them over
+		with self.assertNumQueries(0):
+			spectra = self.client.get(spectra_url)
+		self.assertEqual(spectra.status_code, 200)
+		self.assertEqual(json.loads(spectra["X-RFI-Sessions"])[0][0], "AGBT22A_999_01")
+		# only once, after which they are read again
+		self.assertEqual(self.client.get(spectra_url).content, spectra.content)
+
+
+class TileTestCases(TestCase):
+	def setUp(self):
+		from .cache import SPECTRUM_CACHE
+		from .models import Frequency
+
+		SPECTRUM_CACHE.clear()
+		for number in (1, 2):
+			scan = make_scan(f"AGBT22A_999_0{number}", number=number, when=datetime(2022, 10, number, 12))
+			Frequency.objects.bulk_create(
+				Frequency(scan=scan, scan_datetime=scan.datetime, frontend=scan.frontend, window=0, channel=i, frequency=1300 + i * 0.004, intensity=i * number)
+				for i in range(10)
+			)
+
+	def test_TileSpan(self):
+		self.assertEqual(tile_span(0, 0), (0, TILE_COLUMNS * 10))
+		self.assertEqual(column_width(10), 10 / 1024)
+		low, high = tile_span(10, 130)
+		self.assertTrue(low <= 1300 < high)
+
+	def test_BuildTile(self):
+		import pandas as pd
+
+		data = pd.DataFrame({
+			"frequency": [1.5, 1.7, 2.5, 1.5],
+			"min": [1.0, 3.0, 2.0, 5.0],
+			"max": [1.0, 4.0, 2.0, 5.0],
+			"scan__session__name": ["b", "b", "b", "a"],
+		})
+		sessions, grid = build_tile(data, level=0, index=0)
+		self.assertEqual(sessions, ["a", "b"])
+		self.assertEqual(grid.shape, (2, 2, TILE_COLUMNS))
+		# columns are 10 MHz wide at level 0
+		np.testing.assert_array_equal(grid[1, :, 0], [1, 4])
+		np.testing.assert_array_equal(grid[0, :, 0], [5, 5])
+		self.assertTrue(np.isnan(grid[:, :, 1:]).all())
+
+	def test_RollupTile(self):
+		from unittest import mock
+
+		import pandas as pd
+
+		from django.utils.timezone import make_aware
+
+		from . import tiles
+		from .models import Scan, SpectrumRollup
+
+		build_rollups(Scan.objects.values_list("id", flat=True))
+		scans = Scan.objects.all()
+		window = (["Rcvr1_2"], make_aware(datetime(2022, 9, 30)), make_aware(datetime(2022, 10, 10)))
+		# level 9 tiles are 20 MHz wide, and made of the 10 kHz rollups
+		self.assertEqual(tiles.rollup_width(9), 10)
+		data = pd.concat([tiles.load_tile_data(scans, *window, 9, index) for index in (64, 65, 66)])
+		num_bins = sum(SpectrumRollup.objects.filter(bin_width_khz=10).values_list("count", flat=True))
+		self.assertEqual(len(data), num_bins)
+		self.assertEqual(data["max"].max(), 18)
+		# the bins of a tile count against the same budget as its channels
+		with mock.patch.object(tiles, "MAX_TILE_POINTS", 1):
+			with self.assertRaises(TileTooLarge):
+				for index in (64, 65):
+					tiles.load_tile_data(scans, *window, 9, index)
+
+	def test_TileView(self):
+		from django.test import override_settings
+
+		root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, root)
+		url = "/api/tiles/Rcvr1_2/2022-09-30/2022-10-10/12/520/"
+		with override_settings(RFI_TILE_ROOT=root):
+			response = self.client.get(url)
+			self.assertEqual(response.status_code, 200)
+			self.assertEqual(response["X-RFI-Sessions"], '["AGBT22A_999_01", "AGBT22A_999_02"]')
+			grid = np.frombuffer(response.content, "<f4").reshape(2, 2, TILE_COLUMNS)
+			# 2.44 kHz columns, so the 4 kHz channels each get their own column
+			self.assertEqual(np.nanmax(grid[1, 1]), 18)
+			self.assertEqual(np.isfinite(grid[1, 1]).sum(), 10)
+			# the second request is served from the tile store
+			self.assertEqual(len(list(Path(root).rglob("*.tile"))), 1)
+			self.assertEqual(self.client.get(url).content, response.content)
+			self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+		self.assertEqual(self.client.get("/api/tiles/Rcvr1_2/2022-10-10/2022-09-30/12/520/").status_code, 400)
+
+
+class JobTestCases(TestCase):
+	def setUp(self):
+		from .models import Frequency
+
+		scan = make_scan()
+		Frequency.objects.bulk_create(
+			Frequency(scan=scan, scan_datetime=scan.datetime, frontend=scan.frontend, window=0, channel=i, frequency=1300 + i * 0.1, intensity=i % 5)
+			for i in range(100)
+		)
+		build_scan_summaries([scan.id])
+		self.params = {"receivers": "Rcvr1_2", "start": "2022-09-30", "end": "2022-10-10", "freq_low": "1300", "freq_high": "1400", "submit": "Submit"}
+
+	def test_SubmitJob(self):
+		from django.http import QueryDict
+
+		params = query_params(QueryDict("b=2&a=1&a=0&empty=&submit=Submit"))
+		self.assertEqual(params, {"a": ["0", "1"], "b": ["2"]})
+		job = submit_job(params)
+		# identical queries share the job, and only one worker gets it
+		self.assertEqual(submit_job({"b": ["2"], "a": ["0", "1"]}), job)
+		self.assertNotEqual(submit_job({"a": ["0"]}), job)
+		self.assertEqual(claim_job(), job)
+		self.assertNotEqual(claim_job(), job)
+		self.assertIsNone(claim_job())
+
+	def test_HeavyQuery(self):
+		from unittest import mock
+
+		from django.test import override_settings
+
+		with override_settings(RFI_JOB_MIN_POINTS=1):
+			response = self.client.get("/", self.params)
+		self.assertEqual(response.status_code, 302)
+		job_id = int(response["Location"].rpartition("=")[2])
+		self.assertIn(b"data-status-url", self.client.get(response["Location"]).content)
+		self.assertEqual(self.client.get(f"/api/jobs/{job_id}/").json()["status"], "queued")
+
+		job = run_job(claim_job())
+		self.assertEqual((job.pk, job.status, job.progress), (job_id, "done", 1))
+		self.assertEqual(self.client.get(response["Location"]).content.count(b"rfi-figure"), 2)
+		spectra = self.client.get(f"/api/jobs/{job_id}/spectra/")
+		[[session, count]] = json.loads(spectra["X-RFI-Sessions"])
+		self.assertEqual(session, "AGBT22A_999_01")
+		self.assertEqual(len(spectra.content), count * (8 + 4))
+
+		# errors are logged, not shown
+		job = submit_job({"receivers": ["Rcvr1_2"], "date": ["2022-10-05"]})
+		self.assertEqual(claim_job(), job)
+		with mock.patch("rfi.views.DoGraph.make_graphs", side_effect=RuntimeError("/secret/path")):
+			with self.assertLogs("rfi.jobs", "ERROR"):
+				job = run_job(job)
+		self.assertEqual((job.status, job.message), ("failed", "The query failed"))
+		self.assertNotIn("secret", self.client.get(f"/api/jobs/{job.pk}/").json()["message"])
+
+		# below the threshold, queries are answered right away
+		with override_settings(RFI_JOB_MIN_POINTS=1000):
+			response = self.client.get("/", self.params)
+		self.assertEqual(response.status_code, 200)
+		# the color plot is binned from the line plot's data, without reading the channels again
+		self.assertRegex(response["Server-Timing"], r'color_bins;dur=[\d.]+;desc="0 queries"')
+
+
+class JobHeartbeatTestCases(TransactionTestCase):
+	def test_RunningJobsAreNotRequeued(self):
+		import time
+		from datetime import timedelta
+
+		from django.utils import timezone
+
+		from .jobs import heartbeat, requeue_stale_jobs
+		from .models import QueryJob
+
+		job = submit_job({"a": ["1"]})
+		self.assertEqual(claim_job(), job)
+		claimed_long_ago = timezone.now() - timedelta(hours=1)
+		QueryJob.objects.filter(pk=job.pk).update(updated=claimed_long_ago)
+		# a long step of the job, which reports no progress
+		with heartbeat(job, interval=timedelta(seconds=0.01)):
+			time.sleep(0.2)
+		self.assertEqual(requeue_stale_jobs(), 0)
+		self.assertEqual(QueryJob.objects.get(pk=job.pk).status, QueryJob.RUNNING)
+		# once the worker stopped touching it, it's lost
+		QueryJob.objects.filter(pk=job.pk).update(updated=claimed_long_ago)
+		self.assertEqual(requeue_stale_jobs(), 1)
+
+
+class TimingTestCases(TestCase):
+	def test_Stages(self):
+		from rfi_query.timing import METRICS, collect_timings, stage
+
+		from .models import Scan
+
+		with collect_timings() as timings:
+			with stage("outer"):
+				with stage("inner"):
+					list(Scan.objects.all())
+				Scan.objects.count()
+		self.assertEqual([(name, num_queries) for name, _, num_queries in timings.stages], [("inner", 1), ("outer", 2)])
+		# outside of collect_timings, stages are free
+		with stage("ignored"):
+			pass
+		self.assertEqual(len(timings.stages), 2)
+
+		METRICS.clear()
+		response = self.client.get("/api/jobs/1/")
+		self.assertEqual(response.status_code, 404)
+		self.assertRegex(response["Server-Timing"], r'^total;dur=[\d.]+;desc="\d+ queries"$')
+		self.assertEqual(self.client.get("/metrics/", REMOTE_ADDR="192.0.2.1").status_code, 404)
+		summary = self.client.get("/metrics/", REMOTE_ADDR="127.0.0.1").json()
+		self.assertEqual(list(summary), ["job_status"])
+		self.assertEqual(summary["job_status"]["total"]["count"], 1)
+
+	def test_QueryAccounting(self):
+		from django.db import connection
+
+		from rfi_query.utils import Benchmark, QueryAccounting, statement_type
+
+		from .models import QueryJob
+
+		self.assertEqual(statement_type('\n  SELECT "id" FROM x'), "SELECT")
+		self.assertEqual(statement_type("(SELECT 1) UNION (SELECT 2)"), "SELECT")
+		num_wrappers = len(connection.execute_wrappers)
+		with QueryAccounting() as outer:
+			QueryJob.objects.create(key="a", params={})
+			with QueryAccounting() as inner:
+				QueryJob.objects.bulk_create([QueryJob(key="b", params={}), QueryJob(key="c", params={})])
+				list(QueryJob.objects.all())
+			# the totals of a closed span don't change
+			QueryJob.objects.update(message="x")
+			self.assertEqual(inner.queries(), 2)
+		self.assertEqual(len(connection.execute_wrappers), num_wrappers)
+		self.assertEqual((inner.queries("INSERT"), inner.rows("INSERT")), (1, 2))
+		self.assertEqual(inner.queries("SELECT"), 1)
+		self.assertEqual(inner.queries("UPDATE"), 0)
+		self.assertEqual((outer.queries("INSERT"), outer.rows("INSERT")), (2, 3))
+		self.assertEqual((outer.queries("UPDATE"), outer.rows("UPDATE")), (1, 3))
+		self.assertGreater(outer.seconds(), 0)
+
+		messages = []
+		with Benchmark("Renamed", logger=messages.append):
+			QueryJob.objects.update(message="y")
+		self.assertRegex(messages[0], r"^Renamed in [\d.e-]+ seconds and 1 queries \(0 inserts; 1 UPDATE \(3 rows")
+
+	def test_QueryCanceller(self):
+		import threading
+
+		from django.db import connection, transaction
+
+		from rfi_query.utils import QueryCancelled, QueryCanceller
+
+		canceller = QueryCanceller()
+		# a statement that runs for a long time, unless it's cancelled
+		count_up = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 1000000000) SELECT count(*) FROM c"
+		# (PostgreSQL aborts the transaction of a cancelled statement)
+		with self.assertRaises(QueryCancelled), transaction.atomic():
+			with canceller.watch(), connection.cursor() as cursor:
+				threading.Timer(0.2, canceller.cancel).start()
+				cursor.execute(count_up)
+		# later statements aren't even sent
+		with self.assertRaises(QueryCancelled):
+			with canceller.watch(), connection.cursor() as cursor:
+				cursor.execute("SELECT 1")
+		with QueryCanceller().watch(), connection.cursor() as cursor:
+			cursor.execute("SELECT 1")
+			self.assertEqual(cursor.fetchone(), (1,))
+
+
+class ReceiverFanOutTestCases(TransactionTestCase):
+	def setUp(self):
+		from .models import Frequency
+
+		# a V shaped spectrum with one spike in the middle for each receiver: its ends
+		# only look like peaks if the spectra of both receivers are taken as one
+		for receiver, number, low, edge in (("Rcvr1_2", 1, 1300, 8), ("Rcvr2_3", 2, 2000, 9)):
+			scan = make_scan(frontend_name=receiver, number=number)
+			intensities = [edge] + [1] * 20 + [edge]
+			intensities[10] = 5
+			Frequency.objects.bulk_create(
+				Frequency(scan=scan, scan_datetime=scan.datetime, frontend=scan.frontend, window=0, channel=i, frequency=low + i, intensity=intensity)
+				for i, intensity in enumerate(intensities)
+			)
+
+	def refine(self):
+		from django.test import RequestFactory
+
+		from .views import DoGraph
+
+		request = RequestFactory().get("/", {"receivers": ["Rcvr1_2", "Rcvr2_3"], "start": "2022-09-30", "end": "2022-10-10"})
+		graph = DoGraph(request=request)
+		graph.get_data()
+		return graph.refine_data(graph.filter_data())
+
+	def test_PeaksPerReceiver(self):
+		from concurrent.futures import ThreadPoolExecutor
+		from unittest import mock
+
+		from . import views
+
+		with mock.patch.object(views, "RECEIVER_POOL", None):
+			data = self.refine()
+		self.assertEqual(list(data.frequency), [1310, 2010])
+		self.assertEqual(list(data.intensity), [5, 5])
+
+		with ThreadPoolExecutor(2) as pool, mock.patch.object(views, "RECEIVER_POOL", pool):
+			self.assertTrue(self.refine().reset_index(drop=True).equals(data.reset_index(drop=True)))
+
+	def test_QueriesAndProgress(self):
+		import threading
+		from concurrent.futures import ThreadPoolExecutor
+		from unittest import mock
+
+		from rfi_query.timing import collect_timings, stage
+
+		from . import views
+		from .cache import SPECTRUM_CACHE
+
+		def refine_timed():
+			SPECTRUM_CACHE.clear()
+			with collect_timings() as timings, stage("refine"):
+				self.refine()
+			return dict((name, num_queries) for name, seconds, num_queries in timings.stages)
+
+		with mock.patch.object(views, "RECEIVER_POOL", None):
+			sequential = refine_timed()
+		threads = []
+		with ThreadPoolExecutor(2) as pool, mock.patch.object(views, "RECEIVER_POOL", pool), mock.patch.object(
+			views, "set_progress", side_effect=lambda *args: threads.append(threading.current_thread())
+		), mock.patch.object(views.DoGraph, "job", "job", create=True):
+			concurrent = refine_timed()
+		# the queries of the receiver threads count for the stage that waited for them
+		self.assertGreater(sequential["refine"], sequential["load"])
+		self.assertEqual(concurrent["refine"], sequential["refine"])
+		# and they don't report the progress of the job (only the graph of all receivers does)
+		self.assertEqual(threads, [])
+
+
+class ExportTestCases(TestCase):
+	def test_Formats(self):
+		import pandas as pd
+
+		root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, root)
+		data = pd.DataFrame(
+			{
+				"frequency": np.linspace(1100, 1104, 5),
+				"intensity": np.arange(5) / 10,
+				"scan__datetime": pd.to_datetime(["2022-10-01 12:00"] * 3 + ["2022-10-02 12:00"] * 2, utc=True),
+				"scan__session__name": "AGBT22A_999_01",
+			}
+		)
+		readers = {
+			".csv": lambda path: pd.read_csv(path, index_col=0, parse_dates=["scan__datetime"]),
+			".csv.gz": lambda path: pd.read_csv(path, index_col=0, parse_dates=["scan__datetime"]),
+			".parquet": pd.read_parquet,
+			".h5": lambda path: pd.read_hdf(path, "rfi"),
+		}
+		for suffix, writer in FORMATS.values():
+			path = f"{root}/rfi{suffix}"
+			# several chunks
+			writer(data, path, chunk_rows=2)
+			read = readers[suffix](path).astype({"scan__datetime": "datetime64[ns, UTC]"})
+			pd.testing.assert_frame_equal(read, data[COLUMNS], check_dtype=False, check_index_type=False)
+			writer(data.iloc[:0], path)
+			self.assertEqual(list(readers[suffix](path).columns), COLUMNS)
+
+		export(data, f"{root}/rfi.csv.gz")
+		with self.assertRaises(ValueError):
+			export(data, f"{root}/rfi.xlsx")
@@ -0,0 +1,234 @@
+"""Fixed frequency tiles of min/max intensities, for zooming (like map tiles).
+
+A tile is addressed by (receiver, time window, zoom level, tile index). At level
+`z` the columns are LEVEL0_COLUMN_KHZ / 2**z wide, and tile `i` holds the
+TILE_COLUMNS columns of [i * tile width, (i + 1) * tile width), so every level
+doubles the resolution and tile boundaries never move. For every session of the
+time window a tile holds the min and the max intensity of each column (NaN
+where there is no data).
+
+Tiles are aggregated from the rollups (see `rfi.rollups`) if there is a level at
+least as fine as the columns; rollup bins are assigned to columns by their
+centers. Finer zoom levels read the channels themselves, which is cheap since
+each of their tiles only covers a narrow slice.
+
+Encoded tiles are kept on disk under RFI_TILE_ROOT, keyed by the number and the
+highest ID of the scans of the window, so ingesting new scans makes new tiles.
+"""
+
+import json
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from rfi_query.timing import stage
+
+from . import archive
+from .cache import cached_spectra
+from .loaders import load_scan_channels
+from .models import Scan
+from .rollups import BIN_DTYPE, ROLLUP_BIN_WIDTHS_KHZ, has_rollups, rollups_for
+from .spectrum import load_spectra, unpack_array
+from .summaries import estimate_points, in_freq_range
+
+TILE_COLUMNS = 1024
+# Width of the columns at zoom level 0 (so a level 0 tile is about 10 GHz wide)
+LEVEL0_COLUMN_KHZ = 10_000
+MAX_LEVEL = 16
+# Tiles that would have to read more channels than this are refused (zoom in instead)
+MAX_TILE_POINTS = 3_000_000
+TILE_DTYPE = np.dtype("<f4")
+
+
+class TileTooLarge(Exception):
+    pass
+
+
+def column_width(level):
+    """The width (in MHz) of the columns of the given zoom level."""
+    return LEVEL0_COLUMN_KHZ / 1000 / 2**level
+
+
+def tile_span(level, index):
+    """The [low, high) frequency range (in MHz) of a tile."""
+    width = TILE_COLUMNS * column_width(level)
+    return index * width, (index + 1) * width
+
+
+def rollup_width(level):
+    """The coarsest rollup bin width (in kHz) that is still as fine as the columns, if any."""
+    column_khz = column_width(level) * 1000
+    return max(
+        (width for width in ROLLUP_BIN_WIDTHS_KHZ if width <= column_khz), default=None
+    )
+
+
+def window_scans(receivers, start, end):
+    return Scan.objects.filter(
+        frontend__name__in=receivers, datetime__gte=start, datetime__lte=end
+    )
+
+
+def window_version(scans):
+    """Changes whenever scans are added to (or removed from) the window, or their channels change."""
+    version = scans.aggregate(Count("id"), Max("id"), Max("channels_updated"))
+    updated = version["channels_updated__max"]
+    return f"{version['id__count']}-{version['id__max'] or 0}-{updated.timestamp() if updated else 0}"
+
+
+def load_tile_data(scans, receivers, start, end, level, index):
+    """The data of a tile, as a DataFrame with one row per rollup bin or channel.
+
+    The columns are frequency, min, max and scan__session__name. Raises TileTooLarge
+    if there are more than MAX_TILE_POINTS rollup bins or channels in the tile
+    """
+    low, high = tile_span(level, index)
+    bin_width_khz = rollup_width(level)
+    if bin_width_khz and has_rollups(scans, bin_width_khz):
+        width = bin_width_khz / 1000
+        frames = []
+        num_points = 0
+        for freq_start, bins, mins, maxs, session_name in rollups_for(
+            scans, bin_width_khz
+        ).values_list("freq_start", "bins", "mins", "maxs", "session__name"):
+            # the bins are sorted, so only the slice of them in the tile is decoded (with
+            # a bin to spare on each side, for the exact comparison of the centers below)
+            bins = unpack_array(bins, BIN_DTYPE)
+            first, last = np.searchsorted(
+                bins, [(low - freq_start) / width - 1.5, (high - freq_start) / width + 0.5]
+            )
+            frequency = freq_start + (bins[first:last] + 0.5) * width
+            in_tile = (frequency >= low) & (frequency < high)
+            num_points += np.count_nonzero(in_tile)
+            if num_points > MAX_TILE_POINTS:
+                raise TileTooLarge(
+                    f"Level {level} tiles span more than {MAX_TILE_POINTS:,} rollup bins; "
+                    "zoom in further"
+                )
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "frequency": frequency[in_tile],
+                        "min": unpack_array(mins)[first:last][in_tile],
+                        "max": unpack_array(maxs)[first:last][in_tile],
+                        "scan__session__name": session_name,
+                    }
+                )
+            )
+        if frames:
+            return pd.concat(frames, ignore_index=True)
+        return pd.DataFrame(columns=["frequency", "min", "max", "scan__session__name"])
+
+    scans = in_freq_range(scans, low, high)
+    # (scans without summaries can't be estimated, and are just read)
+    num_points = estimate_points(scans, low, high)
+    if num_points is not None and num_points > MAX_TILE_POINTS:
+        raise TileTooLarge(
+            f"Level {level} tiles span about {num_points:,} channels; zoom in further"
+        )
+
+    if settings.RFI_DATA_SOURCE == "parquet":
+        data = archive.query(
+            settings.RFI_PARQUET_ROOT,
+            receivers=receivers,
+            start=start,
+            end=end,
+            freq_low=low,
+            freq_high=high,
+        )
+    else:
+        loader = load_spectra if settings.RFI_DATA_SOURCE == "spectrum" else load_scan_channels
+        data = cached_spectra(scans, receivers, low, high, loader, max_points=MAX_TILE_POINTS)
+    data = data[data.frequency < high]
+    return pd.DataFrame(
+        {
+            "frequency": data.frequency,
+            "min": data.intensity,
+            "max": data.intensity,
+            "scan__session__name": data.scan__session__name.astype(str),
+        }
+    )
+
+
+def build_tile(data, level, index):
+    """Aggregate the data of a tile (see `load_tile_data`) into its columns.
+
+    Returns the (sorted) session names and a (sessions, 2, TILE_COLUMNS) array of
+    the min and the max of each column of each session
+    """
+    low, _ = tile_span(level, index)
+    codes, sessions = pd.factorize(data.scan__session__name.astype(str), sort=True)
+    grid = np.full((len(sessions), 2, TILE_COLUMNS), np.nan, dtype=TILE_DTYPE)
+    if data.empty:
+        return list(sessions), grid
+
+    columns = np.clip(
+        ((data.frequency.to_numpy() - low) / column_width(level)).astype(np.int64),
+        0,
+        TILE_COLUMNS - 1,
+    )
+    # number the cells by session and column, and take the min/max of each run
+    cells = codes * TILE_COLUMNS + columns
+    order = np.argsort(cells, kind="stable")
+    cells = cells[order]
+    starts = np.flatnonzero(np.r_[True, np.diff(cells) != 0])
+    rows, columns = np.divmod(cells[starts], TILE_COLUMNS)
+    grid[rows, 0, columns] = np.minimum.reduceat(
+        data["min"].to_numpy(dtype=np.float64)[order], starts
+    )
+    grid[rows, 1, columns] = np.maximum.reduceat(
+        data["max"].to_numpy(dtype=np.float64)[order], starts
+    )
+    return list(sessions), grid
+
+
+def encode_tile(sessions, grid):
+    """A tile as bytes: its session names as a line of JSON, then the grid as float32."""
+    return json.dumps(sessions).encode() + b"\n" + grid.astype(TILE_DTYPE).tobytes()
+
+
+def decode_tile(content):
+    """The session names and the grid (as float32 bytes) of an encoded tile."""
+    header, _, values = content.partition(b"\n")
+    return json.loads(header), values
+
+
+def tile_path(root, receiver, start, end, level, index, version):
+    window = f"{start:%Y%m%dT%H%M%S}-{end:%Y%m%dT%H%M%S}"
+    return Path(root) / quote(receiver, safe="") / window / str(level) / f"{index}-{version}.tile"
+
+
+def get_tile(receiver, receivers, start, end, level, index, root=None):
+    """The encoded tile, from the tile store at `root` (by default RFI_TILE_ROOT) if it's there.
+
+    `receivers` are the frontend names the `receiver` of the tile stands for
+    """
+    root = settings.RFI_TILE_ROOT if root is None else root
+    scans = window_scans(receivers, start, end)
+    path = None
+    if root:
+        path = tile_path(root, receiver, start, end, level, index, window_version(scans))
+        if path.exists():
+            return path.read_bytes()
+
+    with stage("tile_load"):
+        data = load_tile_data(scans, receivers, start, end, level, index)
+    with stage("tile_build"):
+        content = encode_tile(*build_tile(data, level, index))
+    if path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write next to the final file and move it into place (see rfi.archive), and
+        # drop the outdated versions of the tile
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+        for outdated in path.parent.glob(f"{index}-*.tile"):
+            if outdated != path:
+                outdated.unlink(missing_ok=True)
+    return content
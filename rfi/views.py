@@ -1,28 +1,104 @@
 
+import copy
 import datetime
+import hashlib
+import json
 import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from urllib.parse import urlencode
 
 import dateutil.parser as dp
-import matplotlib.dates as mdates
 import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objs as go
-import plotly.offline as opy
-from plotly.subplots import make_subplots
+from rest_framework import exceptions, permissions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from scipy.signal import find_peaks
 
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.shortcuts import render
-from django.utils.timezone import make_aware
+from django.db import connections
+from django.http import HttpResponse, JsonResponse, QueryDict
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.timezone import is_naive, make_aware, utc
 from django.views import View
-
-from .forms import QueryForm
-from .models import Frequency, Scan
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+
+from rfi_query.timing import stage
+from rfi_query.utils import QueryAccounting
+
+from . import archive
+from .cache import SpectrumCache, cached_spectra
+from .decimate import decimate
+from .figures import figure_div
+from .forms import MAX_TIME_SPAN, QueryForm
+from .heatmap import binned_max_frame, waterfall
+from .jobs import job_key, query_params, set_progress, submit_job
+from .loaders import load_scan_channels
+from .models import Frequency, QueryJob, Scan
+from .peaks import has_peaks, load_peaks, prominence_for
+from .renderers import SESSIONS_HEADER, ArrowRenderer, Float32Renderer, pack_float32
+from .rollups import choose_bin_width, has_rollups, load_rollups, rollup_extent
+from .serializers import SpectrumQuerySerializer
+from .spectrum import count_points, load_spectra
+from .summaries import estimate_points, in_freq_range
+from .tiles import (
+    MAX_LEVEL,
+    TILE_COLUMNS,
+    TileTooLarge,
+    column_width,
+    decode_tile,
+    get_tile,
+    window_scans,
+    window_version,
+)
 
 logger = logging.getLogger(__name__)
 
+# How long browsers and proxies may reuse a tile before checking its ETag again
+TILE_MAX_AGE = 60 * 60
+# Receivers of the query form that stand for several frontends
+RECEIVER_ALIASES = {"RcvrPF_1": ["Prime Focus 1", "Rcvr_800"]}
+# The receivers of a query are read concurrently by these threads, shared by all
+# requests (see DoGraph.for_each_receiver); None reads them one after the other
+RECEIVER_POOL = (
+    ThreadPoolExecutor(max_workers=settings.RFI_QUERY_THREADS, thread_name_prefix="rfi-receiver")
+    if settings.RFI_QUERY_THREADS > 1
+    else None
+)
+# The spectra of the line plots of the pages this process rendered, kept until the
+# browser fetches them from SpectraView (see DoGraph.create_line_figure)
+PAGE_SPECTRA = SpectrumCache(128 * 1024 * 1024)
+
+
+def frontend_names(receiver):
+    """The frontend names that a receiver of the query form stands for."""
+    return [receiver, *RECEIVER_ALIASES.get(receiver, [])]
+
+
+def run_in_thread(function, *args, account=False):
+    """Call `function` in a worker thread, closing the database connections it opened.
+
+    Returns its result, and the QueryAccounting of its queries if `account` (else None)
+    """
+    queries = QueryAccounting() if account else None
+    try:
+        if queries is None:
+            return function(*args), None
+        with queries:
+            return function(*args), queries
+    finally:
+        connections.close_all()
+
 
 def landing_page(request):
     # only call the query if the user submitted something.
@@ -30,6 +106,8 @@ def landing_page(request):
     if request.method == "GET":
         if request.GET.get("submit") == "Submit":
             return query(request)
+        if request.GET.get("job", "").isdigit():
+            return job_page(request, int(request.GET["job"]))
 
     return render(request, "rfi/query.html", {"form": form})
 
@@ -45,29 +123,87 @@ def query(request):
 
     return render(request, "rfi/query.html", {"form": form})
 
+def job_page(request, job_id):
+    # the graphs of a heavy query (see rfi.jobs), or its progress while it's running
+    job = get_object_or_404(QueryJob, pk=job_id)
+    form = QueryForm(QueryDict(urlencode(job.params, doseq=True)))
+    if job.status == QueryJob.DONE:
+        return render(request, "rfi/query.html", {"graphs": job.graphs, "form": form})
+    if job.status == QueryJob.FAILED:
+        form.is_valid()
+        form.add_error(None, job.message)
+        return render(request, "rfi/query.html", {"form": form})
+    return render(request, "rfi/query.html", {"job": job, "form": form})
+
 class DoGraph(View):
+    # check that we aren't querying too much even before find_peaks reduction
+    MAX_POINTS_TO_QUERY = 3_000_000
+    # NOTE: Can toggle this to make sure the shape stays the same
+    # more points than this are decimated (see rfi.decimate) before plotting
+    MAX_POINTS_TO_PLOT = 550_000
+    # rows of the waterfall plot (about its height in pixels); more sessions than this are merged
+    WATERFALL_ROWS = 500
+    # the QueryJob the graphs are made for, when the run_query_jobs worker makes them
+    job = None
+
     def get(self, request):
         self.request = request
         self.get_data()
         channels = self.filter_data()
+        with stage("estimate"):
+            queue = self.should_queue()
+        if queue:
+            # too slow to answer within the request; hand it to the worker and poll
+            job = submit_job(query_params(request.GET))
+            return redirect(f"{reverse('rfi_webpage')}?job={job.pk}")
+        return self.plot_it(self.make_graphs(channels))
+
+    def make_graphs(self, channels=None):
+        """Make the graphs; returns their divs, or None if there are errors (set on the form)."""
+        if channels is None:
+            self.get_data()
+            channels = self.filter_data()
+        self.report_progress(0.1, "Loading the spectra")
         div, refined_data = self.create_avg_line(channels)
         if div == None:
-            return self.plot_it(div)
-        else:
-            div = self.create_color_plot(div, refined_data)
-            return self.plot_it(div)
-
+            return div
+        self.report_progress(0.8, "Making the color plot")
+        return self.create_color_plot(div, refined_data)
+
+    def report_progress(self, progress, message):
+        if self.job is not None:
+            set_progress(self.job, progress, message)
+
+    def estimated_cost(self):
+        """Roughly how many channels have to be read to answer the query.
+
+        0 if it is answered from the rollups or the peaks, or if it is unknown
+        """
+        if settings.RFI_DATA_SOURCE == "parquet":
+            return archive.count_rows(settings.RFI_PARQUET_ROOT, **self.archive_selection())
+        if self.choose_rollup_width() or has_peaks(self.scans, prominence_for(self.requested_receivers)):
+            return 0
+        return estimate_points(self.scans, *self.requested_freq_range()) or 0
+
+    def should_queue(self):
+        """True if the query should be answered by the run_query_jobs worker instead."""
+        if self.job is not None or not settings.RFI_JOB_MIN_POINTS:
+            return False
+        return self.estimated_cost() >= settings.RFI_JOB_MIN_POINTS
+
+    @stage("form")
     def get_data(self):
         # clean the form
         if self.request.method == "GET":
             self.cache_form = QueryForm(self.request.GET)
             if self.cache_form.is_valid():
                 print("passed inspection. querying now")
+        self.requested_waterfall = self.cache_form.cleaned_data.get("waterfall", False)
 
         # gather all the fields
-        self.requested_receivers = self.request.GET.getlist("receivers")
-        if "RcvrPF_1" in self.requested_receivers:
-            self.requested_receivers.extend(["Prime Focus 1", "Rcvr_800"])
+        self.requested_receivers = [
+            name for receiver in self.request.GET.getlist("receivers") for name in frontend_names(receiver)
+        ]
 
         self.requested_freq_low = self.request.GET.get("freq_low", None)
         self.requested_freq_high = self.request.GET.get("freq_high", None)
@@ -89,39 +225,63 @@ class DoGraph(View):
             else None
         )
 
+    @stage("filter")
     def filter_data(self):
         # filter out non-relevant data
-        channels = Frequency.objects.all().filter(scan__frontend__name__in=self.requested_receivers)
+        # NOTE: Filter on the denormalized frontend/scan_datetime columns so Postgres only
+        #       has to touch the partitions in the requested date range
+        channels = Frequency.objects.all().filter(frontend__name__in=self.requested_receivers)
         # filter by the frequencies
         if self.requested_freq_low:
             channels = channels.filter(frequency__gte=float(self.requested_freq_low))
         if self.requested_freq_high:
             channels = channels.filter(frequency__lte=float(self.requested_freq_high))
 
+        if settings.RFI_DATA_SOURCE == "parquet":
+            # the archive is read directly, so this works without a database
+            self.filter_archive()
+            self.scans = Scan.objects.none()
+            return channels.none()
+
         # then we can either use the nearest date or a date range
         scans = Scan.objects.filter(frontend__name__in=self.requested_receivers)
+        # scans that (going by their summaries) have channels in the requested range
+        scans_with_data = in_freq_range(scans, *self.requested_freq_range())
+        # the same datetime selection, as a range (used by the Parquet archive)
+        self.scan_start = self.scan_end = None
         if self.requested_date:
             # Get the nearest MJD (without scanning the whole table)
             try:
                 self.nearest_date = (
-                    scans.filter(datetime__lte=self.requested_date)
+                    scans_with_data.filter(datetime__lte=self.requested_date)
                     .order_by("-datetime")
                     .first()
                     .datetime
                 )
-                channels = channels.filter(scan__datetime=self.nearest_date)
+                channels = channels.filter(scan_datetime=self.nearest_date)
+                scans = scans.filter(datetime=self.nearest_date)
+                self.scan_start = self.scan_end = self.nearest_date
             except:
                 raise ValidationError(("No Data previous to your specified date."), code="NoDataInRange")
 
         elif self.requested_start or self.requested_end:
             if self.requested_start:
-                channels = channels.filter(scan__datetime__gte=self.requested_start)
+                channels = channels.filter(scan_datetime__gte=self.requested_start)
+                scans = scans.filter(datetime__gte=self.requested_start)
+                self.scan_start = self.requested_start
             if self.requested_end:
-                channels = channels.filter(scan__datetime__lte=self.requested_end)
+                channels = channels.filter(scan_datetime__lte=self.requested_end)
+                scans = scans.filter(datetime__lte=self.requested_end)
+                self.scan_end = self.requested_end
 
         else:
-            most_recent_scan = scans.latest("datetime")
-            channels = channels.filter(scan=most_recent_scan)
+            most_recent_scan = scans_with_data.latest("datetime")
+            channels = channels.filter(scan=most_recent_scan, scan_datetime=most_recent_scan.datetime)
+            scans = scans.filter(pk=most_recent_scan.pk)
+            self.scan_start = self.scan_end = most_recent_scan.datetime
+
+        # the same selection, at the Scan level (used by the packed spectrum read path)
+        self.scans = scans
 
 
         # NOTE: Use this to decimate DURING the query. This will be a non-deterministic (but not quite random)
@@ -133,86 +293,247 @@ class DoGraph(View):
 
         return channels
 
-    def create_avg_line(self, channels):
+    def filter_archive(self):
+        """Like `filter_data`, but sets the datetime range from the Parquet archive."""
+        root = settings.RFI_PARQUET_ROOT
+        freq_low, freq_high = self.requested_freq_range()
+        self.scan_start = self.scan_end = None
+        if self.requested_date:
+            self.nearest_date = archive.latest_datetime(
+                root, self.requested_receivers, self.requested_date, freq_low, freq_high
+            )
+            if self.nearest_date is None:
+                raise ValidationError(("No Data previous to your specified date."), code="NoDataInRange")
+            self.scan_start = self.scan_end = self.nearest_date
+        elif self.requested_start or self.requested_end:
+            self.scan_start = self.requested_start
+            self.scan_end = self.requested_end
+        else:
+            most_recent = archive.latest_datetime(
+                root, self.requested_receivers, freq_low=freq_low, freq_high=freq_high
+            )
+            if most_recent is None:
+                raise Scan.DoesNotExist
+            self.scan_start = self.scan_end = most_recent
+
+    def has_data_in_range(self):
+        """True if any of the requested scans (may) have channels in the requested range."""
+        if settings.RFI_DATA_SOURCE == "parquet":
+            return archive.count_rows(settings.RFI_PARQUET_ROOT, **self.archive_selection()) > 0
+        return in_freq_range(self.scans, *self.requested_freq_range()).exists()
+
+    def session_names(self):
+        """The names of the sessions of the requested scans."""
+        if settings.RFI_DATA_SOURCE == "parquet":
+            data = archive.query(settings.RFI_PARQUET_ROOT, **self.archive_selection())
+            return sorted(data.scan__session__name.unique())
+        return [i[0] for i in self.scans.values_list("session__name").distinct()]
+
+    def requested_freq_range(self):
+        return (
+            float(self.requested_freq_low) if self.requested_freq_low else None,
+            float(self.requested_freq_high) if self.requested_freq_high else None,
+        )
 
-        # check that we aren't querying too much even before find_peaks reduction
-        refined_data = [] # this is just a placeholder if there is an error
-        MAX_POINTS_TO_QUERY = 3_000_000
+    def archive_selection(self):
+        """The requested data, as arguments of the `rfi.archive` queries."""
+        freq_low, freq_high = self.requested_freq_range()
+        return dict(
+            receivers=self.requested_receivers,
+            start=self.scan_start,
+            end=self.scan_end,
+            freq_low=freq_low,
+            freq_high=freq_high,
+        )
 
-        self.sessions = [i[0] for i in channels.values_list("scan__session__name").distinct()]
+    @stage("load")
+    def load_data(self):
+        if settings.RFI_DATA_SOURCE == "parquet":
+            # read the columns straight from the Parquet archive
+            return archive.query(settings.RFI_PARQUET_ROOT, **self.archive_selection())
+        if settings.RFI_DATA_SOURCE == "spectrum":
+            # decode the packed spectra straight into NumPy
+            loader = load_spectra
+        else:
+            # stream the rows into NumPy columns rather than building a dict per row
+            loader = load_scan_channels
+        # assemble the result from cached sessions; only the missing ones are fetched
+        # (whole, unless that would read more than this receiver's share of the budget)
+        max_points = self.MAX_POINTS_TO_QUERY // max(len(self.request.GET.getlist("receivers")), 1)
+        return cached_spectra(
+            self.scans,
+            self.requested_receivers,
+            *self.requested_freq_range(),
+            loader,
+            max_points=max_points,
+        )
 
-        if channels.count() > MAX_POINTS_TO_QUERY:
-            print(f"Points attempted: {channels.count()}")
+    def choose_rollup_width(self):
+        """Pick the coarsest rollup level that still fills the plot, if any."""
+        freq_low, freq_high = self.requested_freq_range()
+        if freq_low is None or freq_high is None:
+            # fall back to the span of the data itself
+            extent = rollup_extent(self.scans)
+            if extent is None:
+                return None
+            freq_low = extent[0] if freq_low is None else freq_low
+            freq_high = extent[1] if freq_high is None else freq_high
+        bin_width_khz = choose_bin_width(freq_high - freq_low)
+        if bin_width_khz and has_rollups(self.scans, bin_width_khz):
+            return bin_width_khz
+        return None
+
+    def refine_data(self, channels):
+        """Fetch the requested data, reduced to roughly what is worth plotting.
+
+        Every requested receiver is read and reduced on its own, concurrently (see
+        `for_each_receiver`), so peaks are never found across receivers. At most
+        MAX_POINTS_TO_PLOT points are returned. Returns None if too much data was
+        requested (the error is set on the form)
+        """
+        # no need to read anything if none of the scans have channels in the range
+        if not self.has_data_in_range():
+            return pd.DataFrame(columns=["frequency", "intensity", "scan__datetime", "scan__session__name"])
+
+        # decide how each receiver is answered, and check that the channels that have to
+        # be read (all at the same time) aren't too many
+        receivers = self.split_receivers(channels)
+        num_points = sum(self.for_each_receiver(DoGraph.plan_refinement, receivers))
+        if num_points > self.MAX_POINTS_TO_QUERY:
+            print(f"Points attempted: {num_points}")
+            self.sessions = self.session_names()
             self.cache_form._errors["receivers"] = forms.ValidationError(f"Too many points queried, you can query for \
-                {int(MAX_POINTS_TO_QUERY/(channels.count()/len(self.sessions)))} sessions with this configuration. \
+                {int(self.MAX_POINTS_TO_QUERY/(num_points/len(self.sessions)))} sessions with this configuration. \
                 Adjust date to limit sessions or freq. range to limit data. \
                 Sessions in your current query include: {' '.join(self.sessions)}")
-            div = None
             self.error_data_str = 'Maximum Data Queried - Reduce date or freq. ranges'
-            return div, refined_data
-
+            return None
+
+        parts = self.for_each_receiver(DoGraph.refine_receiver, receivers)
+        refined_data = pd.concat([part for part in parts if not part.empty] or parts[:1], ignore_index=True)
+        refined_data = refined_data.sort_values(by=["scan__session__name", "frequency"])
+
+        if len(refined_data.index) > self.MAX_POINTS_TO_PLOT:
+            # rather than refusing to plot, keep the first/last/min/max point of each
+            # pixel column of each session, which still shows every spike
+            print(f"Decimating {len(refined_data.index):,} points to <{self.MAX_POINTS_TO_PLOT:,}")
+            freq_low, freq_high = self.requested_freq_range()
+            with stage("decimate"):
+                refined_data = decimate(refined_data, self.MAX_POINTS_TO_PLOT, freq_low=freq_low, freq_high=freq_high)
+
+        return refined_data
+
+    def split_receivers(self, channels):
+        """A (graph, channels) pair with the selection of each requested receiver."""
+        receivers = self.request.GET.getlist("receivers")
+        if len(receivers) <= 1:
+            return [(self, channels)]
+        pairs = []
+        for receiver in receivers:
+            graph = copy.copy(self)
+            # (the progress of the job is only reported by the graph of all receivers,
+            # as the receivers may be read concurrently)
+            graph.job = None
+            graph.requested_receivers = frontend_names(receiver)
+            graph.scans = self.scans.filter(frontend__name__in=graph.requested_receivers)
+            pairs.append((graph, channels.filter(frontend__name__in=graph.requested_receivers)))
+        return pairs
+
+    def for_each_receiver(self, method, receivers):
+        """Call `method(graph, channels)` for each pair of `split_receivers`; returns the results.
+
+        The receivers are run concurrently on RECEIVER_POOL, each with its own
+        database connections. Their queries are added to the stages that are open
+        in this thread once they are done
+        """
+        if len(receivers) == 1 or RECEIVER_POOL is None:
+            return [method(graph, channels) for graph, channels in receivers]
+        account = QueryAccounting.is_open()
+        futures = [
+            # (each in a copy of this context, so that their stages are timed)
+            RECEIVER_POOL.submit(copy_context().run, run_in_thread, method, graph, channels, account=account)
+            for graph, channels in receivers
+        ]
+        results = []
+        for future in futures:
+            result, queries = future.result()
+            if queries is not None:
+                queries.add_to_this_thread()
+            results.append(result)
+        return results
+
+    def plan_refinement(self, channels):
+        """Decide how the data is read (see `refine_receiver`).
+
+        Returns the number of channels that have to be read for it (0 if it's read
+        from the precomputed rollups or peaks)
+        """
         # set the prominence
-        prom_by_rcvr = {
-        "RcvrPF_1": 0.05,
-        "Rcvr_800": 0.05,
-        "Prime Focus 1": 0.05,
-        "Prime Focus 2": 0.001,
-        "Rcvr1_2": 0.03,
-        "Rcvr2_3": 0.001,
-        "Rcvr4_6": 0.001,
-        "Rcvr8_10": 0.001,
-        "Rcvr12_18": 0.001,
-        "RcvrArray18_26": 0.001,
-        "Rcvr26_40": 0.001,
-        "Rcvr40_52": 0.0001,
-        }
-
-        proms=[]
-        for rcvr in self.requested_receivers:
-            proms.append(prom_by_rcvr[rcvr])
-        prominence_val = min(proms)
-        print(f"this is the prom val: {prominence_val}")
-
+        self.prominence_val = prominence_for(self.requested_receivers)
+        print(f"this is the prom val: {self.prominence_val}")
+        if settings.RFI_DATA_SOURCE == "parquet":
+            # the rollups and the peaks are in the database; the archive only has channels
+            self.rollup_width_khz = None
+            self.reads_channels = True
+            return archive.count_rows(settings.RFI_PARQUET_ROOT, **self.archive_selection())
+        # wide queries are answered from the precomputed rollups, which are already
+        # reduced to (at most) a few thousand bins per session
+        self.rollup_width_khz = self.choose_rollup_width()
+        # the peaks of each scan are normally found at ingest; only fall back to
+        # fetching every channel if some of them are missing
+        self.reads_channels = not self.rollup_width_khz and not has_peaks(self.scans, self.prominence_val)
+        if not self.reads_channels:
+            return 0
+
+        if settings.RFI_DATA_SOURCE == "spectrum":
+            return count_points(self.scans, *self.requested_freq_range())
+        # estimated from the scan summaries if they have all been computed
+        num_points = estimate_points(self.scans, *self.requested_freq_range())
+        if num_points is None:
+            num_points = channels.count()
+        return num_points
+
+    def refine_receiver(self, channels):
+        """The refined data, read as decided by `plan_refinement`."""
+        if self.rollup_width_khz:
+            print(f"Using the {self.rollup_width_khz} kHz rollups")
+            with stage("load_rollups"):
+                return load_rollups(self.scans, self.rollup_width_khz, *self.requested_freq_range())
+        if not self.reads_channels:
+            with stage("load_peaks"):
+                return load_peaks(self.scans, self.prominence_val, *self.requested_freq_range())
+        return self.find_data_peaks(self.prominence_val)
+
+    def find_data_peaks(self, prominence_val):
+        """Fetch every requested channel and reduce them to their local maxima."""
         # set up the data to be used
-        data = pd.DataFrame(
-            channels.values("frequency", "intensity", "scan__datetime", "scan__session__name")
-            )
+        data = self.load_data()
+        if data.empty:
+            return data
+        self.report_progress(0.5, "Finding the peaks")
 
-        if not data.empty:
+        with stage("find_peaks"):
             # Find local maxima (peaks) in intensities (second axis). This seems to reduce
             # the data by roughly a third, but doesn't throw away any spikes
             # prominence can reduce the data even further while preserving the peaks
             intensity_peaks = find_peaks(data.intensity, prominence=prominence_val)[0]
             #print(f"{data.intensity.head(10)} {intensity_peaks[:10]}")
             all_local_maximum_intensities = data[data.index.isin(intensity_peaks)]
-            # NOTE: Can toggle this to make sure the shape stays the same
-            MAX_POINTS_TO_PLOT = 550_000
-            refined_data = all_local_maximum_intensities
-            refined_data = refined_data.sort_values(by=["scan__session__name", "frequency"])
-            if len(refined_data.index) > MAX_POINTS_TO_PLOT:
-                self.cache_form._errors["receivers"] = forms.ValidationError(f"Too many points: {len(refined_data.index):,}. Must be <{MAX_POINTS_TO_PLOT:,}. Select smaller ranges.")
-                div = None
-                self.error_data_str = 'Maximum Data Queried - Reduce date or freq. ranges'
-                return div, refined_data
-
-            print(f"Actual # {len(refined_data.index)}")
-
-            self.unique_days = refined_data.scan__datetime.unique()
-
-            div=[]
-            avg_calculation = refined_data.groupby("frequency", as_index=False)['intensity'].mean()
-            avg_calculation = avg_calculation.assign(scan__session__name='Average')
+            # the loaders dictionary-encode the session names; the (much smaller) refined
+            # data goes back to plain names so that sessions without peaks don't linger
+            return all_local_maximum_intensities.astype({"scan__session__name": str})
 
+    def create_avg_line(self, channels):
+        refined_data = self.refine_data(channels)
+        if refined_data is None:
+            # too much data, the form errors are already set
+            div = None
+            return div, []
 
-            layout = self.make_the_layout(refined_data)
-            # make the session line
-            fig_session = px.line(refined_data, x="frequency", y="intensity", color="scan__session__name", labels={"scan__session__name":"Session"})
-            fig_avg = px.line(avg_calculation, x="frequency", y="intensity", color="scan__session__name", labels={"scan__session__name":"Session"})
-            fig_avg.update_traces(line_color="black")
+        if not refined_data.empty:
+            print(f"Actual # {len(refined_data.index)}")
 
-            figure = go.Figure(data=fig_avg.data + fig_session.data, layout=layout)
-            figure.update_xaxes(tickformat = "digit", range=[self.freq_min,self.freq_max])
-            div.append(opy.plot(figure, output_type='div'))
+            div = [self.create_line_figure(refined_data)]
 
         else:
             # set div none, then skip color plot
@@ -222,74 +543,80 @@ class DoGraph(View):
 
         return div, refined_data
 
+    @stage("line_plot")
+    def create_line_figure(self, refined_data):
+        """The line plot: its layout, with where the browser gets the session lines from."""
+        layout = self.make_the_layout(refined_data)
+        # the page only holds the layout; the browser fetches the session lines (and
+        # draws them, with their average) from the data API
+        figure = go.Figure(layout=layout)
+        figure.update_layout(legend_title_text="Session")
+        figure.update_xaxes(tickformat = "digit", range=[self.freq_min,self.freq_max])
+        if self.job is None:
+            spectra_params = self.request.GET.copy()
+            spectra_params["format"] = Float32Renderer.format
+            # hand the spectra to the API, so that it doesn't read and refine them again
+            spectra_params["page"] = uuid.uuid4().hex
+            PAGE_SPECTRA.put(page_spectra_key(spectra_params), refined_data)
+            spectra_url = f"{reverse('spectra')}?{spectra_params.urlencode()}"
+        else:
+            # keep the spectra with the job, so that they aren't read again
+            self.job.sessions, self.job.spectra = pack_float32(refined_data)
+            spectra_url = reverse("job_spectra", args=[self.job.pk])
+        # zooming in fetches more detailed tiles of the same selection
+        tiles = tile_config(self.request.GET.getlist("receivers"), self.scan_start, self.scan_end)
+        return figure_div(figure, spectra_url=spectra_url, tiles=tiles)
+
+    @stage("color_plot")
     def create_color_plot(self, div, refined_data):
         # make the color plot/s and add them to div
-        session = 1
-        fig = make_subplots(rows=len(self.unique_days), cols=1, shared_xaxes=True, x_title="Frequency (MHz)")
-
-        for self.unique_day in self.unique_days:
-            date_of_interest_datetime = self.unique_day.to_pydatetime()
-
-            unique_date_range = refined_data[
-                refined_data["scan__datetime"] == date_of_interest_datetime
-            ]  # get the data but only for one session of interest at a time
-            date_of_interest_datetime = date_of_interest_datetime.replace(tzinfo=None)
-            # make the date bins for plotting
-            widen = datetime.timedelta(hours=1)
-            date_bins = np.arange(
-                date_of_interest_datetime - widen,
-                date_of_interest_datetime + widen,
-                datetime.timedelta(hours=1),
-            ).astype(datetime.datetime)
-            # Get the center of the date bins (for plotting)
-            dates = date_bins[:-1] + 0.5 * np.diff(date_bins)
-            # Convert from datetime
-            mdates.date2num(dates)
-
-            # make the freq bins for plotting
-            freq_bins = np.arange(
-                unique_date_range["frequency"].min(),
-                unique_date_range["frequency"].max(),
-                1.0,
-            )
-
-            # Get the center of the frequency bins (for plotting)
-            freqs = freq_bins[:-1] + 0.5 * np.diff(freq_bins)
-
-            df_rfi_grouped2 = unique_date_range.groupby(
-                [
-                    pd.cut(unique_date_range.scan__datetime, date_bins),
-                    pd.cut(unique_date_range.frequency, freq_bins),
-                ]
+        with stage("color_bins"):
+            # binned from the data of the line plot, so it reads nothing more (and stays
+            # within MAX_POINTS_TO_QUERY), whether that came from rollups, peaks or channels
+            row_datetimes, freq_bins, max_intensities = binned_max_frame(refined_data)
+        if not len(row_datetimes):
+            return div
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            to_plot = np.log10(max_intensities)
+
+        if self.requested_waterfall:
+            # a time axis with NaN rows where there are no sessions
+            row_datetimes, to_plot = waterfall(row_datetimes, to_plot, self.WATERFALL_ROWS)
+            y = row_datetimes
+            height = self.WATERFALL_ROWS + 200
+        else:
+            # one row per session of interest, all in a single trace
+            row_labels = row_datetimes.strftime("%Y-%m-%d")
+            if row_labels.has_duplicates:
+                row_labels = row_datetimes.strftime("%Y-%m-%d %H:%M")
+            y = list(row_labels)
+            height = 200+40*len(row_labels)
+
+        fig = go.Figure(go.Heatmap(
+            x=freq_bins,
+            y=y,
+            z=to_plot,
+            colorscale='Viridis',
+            coloraxis="coloraxis", connectgaps = not self.requested_waterfall
+            ))
+
+        title_color = "RFI Environment at Green Bank Observatory per Session <br> <i>%s    %s    %s MHz</i>" % (self.date_range_str, self.rcvr_str, self.freq_range_str)
+        layout = go.Layout(
+            title=title_color,
+            title_x=0.5,
+            coloraxis = {'colorscale':'viridis'},
+            height = height
             )
+        fig.update_layout(layout)
+        fig.update_xaxes(title="Frequency (MHz)", tickformat = "digit", range=[self.freq_min,self.freq_max])
+        if self.requested_waterfall:
+            fig.update_yaxes(title="Date", type="date")
+        else:
+            fig.update_yaxes(type="category")
+        fig.update_coloraxes(colorbar_title_text="log(flux) [Jy]")
 
-            timeseries_rfi = df_rfi_grouped2.max().intensity
-
-            to_plot = np.log10(timeseries_rfi.unstack())
-
-            fig.append_trace(go.Heatmap(
-                x=freq_bins,
-                y=[str(self.unique_day.date())],
-                z=to_plot,
-                colorscale='Viridis',
-                coloraxis="coloraxis", connectgaps = True
-                ), row=session, col=1,
-                )
-
-            session=session+1
-            title_color = "RFI Environment at Green Bank Observatory per Session <br> <i>%s    %s    %s MHz</i>" % (self.date_range_str, self.rcvr_str, self.freq_range_str)
-            layout = go.Layout(
-                title=title_color,
-                title_x=0.5,
-                coloraxis = {'colorscale':'viridis'},
-                height = 100+100*session-1
-                )
-            fig.update_layout(layout)
-            fig.update_xaxes(tickformat = "digit", range=[self.freq_min,self.freq_max])
-            fig.update_yaxes(tickformat="%b %d %Y", dtick=86400000)
-            fig.update_coloraxes(colorbar_title_text="log(flux) [Jy]")
-
-        div.append(opy.plot(fig, auto_open=False, output_type="div"))
+        div.append(figure_div(fig))
         return div
 
     def make_the_layout(self, refined_data):
@@ -337,6 +664,7 @@ class DoGraph(View):
 
         return layout
 
+    @stage("render")
     def plot_it(self, div):
         if div:
             return render(self.request, "rfi/query.html", {"graphs": div, "form": self.cache_form})
@@ -349,3 +677,122 @@ class DoGraph(View):
                 self.cache_form._errors["freq_low"] = forms.ValidationError(self.error_data_str)
                 self.cache_form._errors["freq_high"] = forms.ValidationError(self.error_data_str)
             return render(self.request, "rfi/query.html", {"form": self.cache_form})
+
+
+@method_decorator(gzip_page, name="dispatch")
+class SpectraView(APIView):
+    """The spectra of a query (the parameters of `QueryForm`), as plotted by `DoGraph`.
+
+    Returned as an Arrow IPC stream (?format=arrow, the default) or as packed
+    arrays (?format=f32); see `rfi.renderers`. Errors are JSON. The line plots of
+    the query page pass ?page=, to get the spectra that the page already refined
+    """
+
+    renderer_classes = [ArrowRenderer, Float32Renderer]
+    # there is no model behind it, so just allow read-only access (like the query page)
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    def get(self, request):
+        SpectrumQuerySerializer(data=request.query_params).is_valid(raise_exception=True)
+        if "page" in request.query_params:
+            # the spectra of a page that was just rendered (unless another process rendered
+            # it, or it was fetched already, in which case they are read again)
+            refined_data = PAGE_SPECTRA.pop(page_spectra_key(request.query_params))
+            if refined_data is not None:
+                return Response(refined_data)
+        graph = DoGraph(request=request)
+        graph.get_data()
+        # (DRF only turns its own exceptions into JSON responses)
+        try:
+            refined_data = graph.refine_data(graph.filter_data())
+        except ValidationError as error:
+            # no scans before the requested date
+            raise exceptions.ValidationError({"date": error.messages})
+        except Scan.DoesNotExist:
+            raise exceptions.ValidationError({"receivers": ["No Data - Check date or freq. ranges"]})
+        if refined_data is None:
+            raise exceptions.ValidationError(
+                {field: list(errors) for field, errors in graph.cache_form.errors.items()}
+            )
+        return Response(refined_data)
+
+    def handle_exception(self, exc):
+        # the binary renderers only handle spectra
+        self.request.accepted_renderer = JSONRenderer()
+        self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
+
+def page_spectra_key(params):
+    """The key of the spectra of a page in PAGE_SPECTRA: its ?page=, and its query."""
+    return (params["page"], job_key(query_params(params)))
+
+
+def tile_config(receivers, start, end):
+    """What figures.js needs to fetch the tiles of the given receivers and time window."""
+    return {
+        # the URLs without the level and index
+        "urls": [
+            reverse("tile", args=[receiver, start.isoformat(), end.isoformat(), 0, 0])[: -len("0/0/")]
+            for receiver in receivers
+        ],
+        "columns": TILE_COLUMNS,
+        "level0_column_width": column_width(0),
+        "max_level": MAX_LEVEL,
+    }
+
+
+def tile_selection(receiver, start, end, level):
+    """The frontend names and the UTC time window of a tile. Raises ValueError if invalid."""
+    receivers = frontend_names(receiver)
+    start, end = (dp.parse(value) for value in (start, end))
+    start, end = ((make_aware(value) if is_naive(value) else value).astimezone(utc) for value in (start, end))
+    if end < start:
+        raise ValueError("The time window must end after it starts")
+    if end - start > MAX_TIME_SPAN + datetime.timedelta(days=1):
+        raise ValueError("The time window must be at most a year long")
+    if level > MAX_LEVEL:
+        raise ValueError(f"The zoom level must be at most {MAX_LEVEL}")
+    return receivers, start, end
+
+
+def tile_etag(request, receiver, start, end, level, index):
+    try:
+        receivers, start, end = tile_selection(receiver, start, end, level)
+    except (ValueError, OverflowError):
+        return None
+    version = window_version(window_scans(receivers, start, end))
+    return hashlib.sha1(f"{receiver}/{start}/{end}/{level}/{index}/{version}".encode()).hexdigest()
+
+
+@gzip_page
+@condition(etag_func=tile_etag)
+def tile(request, receiver, start, end, level, index):
+    """A tile of min/max intensities (see `rfi.tiles`), as (sessions, 2, columns) float32 values.
+
+    The X-RFI-Sessions header lists the session of each row
+    """
+    try:
+        receivers, start, end = tile_selection(receiver, start, end, level)
+        sessions, values = decode_tile(get_tile(receiver, receivers, start, end, level, index))
+    except (ValueError, OverflowError, TileTooLarge) as error:
+        return JsonResponse({"detail": str(error)}, status=400)
+    response = HttpResponse(values, content_type="application/octet-stream")
+    response["X-RFI-Sessions"] = json.dumps(sessions)
+    # (only successful responses are cacheable)
+    patch_cache_control(response, public=True, max_age=TILE_MAX_AGE)
+    return response
+
+
+def job_status(request, pk):
+    job = get_object_or_404(QueryJob, pk=pk)
+    return JsonResponse({"status": job.status, "progress": job.progress, "message": job.message})
+
+
+@gzip_page
+def job_spectra(request, pk):
+    """The spectra of the line plot of a finished job, like `SpectraView` with ?format=f32."""
+    job = get_object_or_404(QueryJob, pk=pk, status=QueryJob.DONE)
+    response = HttpResponse(bytes(job.spectra or b""), content_type=Float32Renderer.media_type)
+    response[SESSIONS_HEADER] = json.dumps(job.sessions or [])
+    return response
@@ -14,6 +14,7 @@ from getpass import getuser
 from pathlib import Path
 
 import environ
+import plotly
 
 from email.utils import getaddresses
 
@@ -29,6 +30,15 @@ env = environ.Env(
     INTERNAL_IPS=(list, []),
     SENTRY_ENV=(str, f"{_user}_dev"),
     STATIC_ROOT=(str, None),
+    RFI_DATA_SOURCE=(str, "frequency"),
+    RFI_PARQUET_ROOT=(str, None),
+    RFI_SPECTRUM_CACHE_BYTES=(int, 256 * 1024 * 1024),
+    RFI_TILE_ROOT=(str, None),
+    RFI_JOB_MIN_POINTS=(int, 0),
+    RFI_QUERY_THREADS=(int, 4),
+    RFI_GUI_CACHE_DIR=(str, None),
+    RFI_GUI_CACHE_BYTES=(int, 2 * 1024 * 1024 * 1024),
+    RFI_GUI_CACHE_MAX_AGE=(int, 7 * 24 * 60 * 60),
 )
 _env_file_template_path = Path(SETTINGS_DIR, ".env.template")
 _default_env_file_path = Path(SETTINGS_DIR, ".env")
@@ -81,11 +91,13 @@ INSTALLED_APPS = [
     "debug_toolbar",
     "django_extensions",
     "crispy_forms",
+    "rest_framework",
     "legacy_rfi",
     "rfi",
 ]
 
 MIDDLEWARE = [
+    "rfi_query.timing.ServerTimingMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -168,12 +180,29 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATIC_ROOT = env("STATIC_ROOT")
+# Serve the plotly.js bundle that ships with the plotly package (as plotly/plotly.min.js),
+# so that it always matches the version that generates the figures
+STATICFILES_DIRS = [
+    ("plotly", os.path.join(os.path.dirname(plotly.__file__), "package_data")),
+]
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 APPEND_SLASH = True
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # a line of JSON with the stage timings of each request (see rfi_query.timing)
+        "rfi_query.timing": {"handlers": ["console"], "level": "INFO"},
+    },
+}
 ### Non-Django Settings
 
 REST_FRAMEWORK = {
@@ -188,3 +217,33 @@ REST_FRAMEWORK = {
 INTERNAL_IPS = ["127.0.0.1", "192.33.116.243"]
 
 CRISPY_TEMPLATE_PACK = "bootstrap4"
+
+### RFI
+# Where spectra are read from: "frequency" (one row per channel),
+# "spectrum" (packed ScanSpectrum rows; see the backfill_spectra command) or
+# "parquet" (the Parquet archive at RFI_PARQUET_ROOT; see sync_parquet_archive)
+RFI_DATA_SOURCE = env("RFI_DATA_SOURCE")
+# Directory of the Parquet mirror of the archive. If set, ingestion keeps it up to date
+RFI_PARQUET_ROOT = env("RFI_PARQUET_ROOT")
+# Memory budget of the (per-process) cache of decoded sessions; 0 disables it
+RFI_SPECTRUM_CACHE_BYTES = env("RFI_SPECTRUM_CACHE_BYTES")
+# Directory of the on-disk store of zoom tiles (see rfi.tiles); if unset, tiles are
+# only cached by HTTP caches
+RFI_TILE_ROOT = env("RFI_TILE_ROOT")
+# Queries that would read at least this many channels are handed to the
+# run_query_jobs worker (see rfi.jobs) instead of being answered in the request;
+# 0 answers every query in the request
+RFI_JOB_MIN_POINTS = env("RFI_JOB_MIN_POINTS")
+# Queries over several receivers read each receiver in its own thread (with its own
+# database connection), using at most this many threads per process; 1 reads them in turn
+RFI_QUERY_THREADS = env("RFI_QUERY_THREADS")
+# Directory of the GUI's on-disk cache of fetched sessions (see rfi.cache.DiskSpectrumCache);
+# defaults to gbt-rfi-gui in the user's cache directory
+RFI_GUI_CACHE_DIR = env("RFI_GUI_CACHE_DIR") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "gbt-rfi-gui"
+)
+# Disk budget of that cache; 0 disables it
+RFI_GUI_CACHE_BYTES = env("RFI_GUI_CACHE_BYTES")
+# Sessions are fetched again once they have been in that cache for this many seconds
+# (a week by default); 0 keeps them until they're evicted
+RFI_GUI_CACHE_MAX_AGE = env("RFI_GUI_CACHE_MAX_AGE")
@@ -0,0 +1,179 @@
+"""Where the time of a request goes: timings of its stages.
+
+Wrap the stages of a request in `stage` (as a context manager or a decorator):
+
+    with stage("load"):
+        data = load_data()
+
+Each stage records its wall time and the number of database queries it ran (see
+`rfi_query.utils.QueryAccounting`).
+`ServerTimingMiddleware` collects the stages of every request and
+
+* sends them back in a Server-Timing header, so they show up in the timing tab of
+  the browser's developer tools,
+* logs them as a line of JSON (to the "rfi_query.timing" logger), and
+* aggregates them per view, for the /metrics/ endpoint (which has the percentiles
+  of each stage over the last METRICS_WINDOW requests of this process).
+
+Stages outside of a request (e.g. in the run_query_jobs worker) can be collected
+with `collect_timings`. Stages may be nested, in which case the outer one includes
+the time and the queries of the inner ones.
+"""
+
+import json
+import logging
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+import numpy as np
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+
+from .utils import QueryAccounting
+
+logger = logging.getLogger(__name__)
+
+# How many of the latest timings of each stage the metrics are computed over
+METRICS_WINDOW = 1000
+PERCENTILES = (50, 90, 99)
+
+# the Timings that stages are collected into, if any
+_timings = ContextVar("timings", default=None)
+
+
+class Timings:
+    """The stages of a request (or job), in the order they finished."""
+
+    def __init__(self):
+        # (name, seconds, number of queries)
+        self.stages = []
+
+    def add(self, name, seconds, num_queries):
+        self.stages.append((name, seconds, num_queries))
+
+    def header(self):
+        """The value of a Server-Timing header."""
+        return ", ".join(
+            f'{name};dur={seconds * 1000:.1f};desc="{num_queries} queries"'
+            for name, seconds, num_queries in self.stages
+        )
+
+    def as_dict(self):
+        return [
+            {"stage": name, "ms": round(seconds * 1000, 1), "queries": num_queries}
+            for name, seconds, num_queries in self.stages
+        ]
+
+
+class StageMetrics:
+    """The latest timings of the stages of each view (thread safe)."""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, view_name, timings):
+        with self._lock:
+            for name, seconds, num_queries in timings.stages:
+                self._stages[(view_name, name)].append((seconds, num_queries))
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+
+    def summary(self):
+        """The count and the percentiles (in ms) of each stage, per view."""
+        with self._lock:
+            stages = {key: np.array(values) for key, values in self._stages.items()}
+        summary = defaultdict(dict)
+        for (view_name, name), values in sorted(stages.items()):
+            milliseconds = values[:, 0] * 1000
+            summary[view_name][name] = {
+                "count": len(values),
+                **{
+                    f"p{percentile}_ms": round(value, 1)
+                    for percentile, value in zip(
+                        PERCENTILES, np.percentile(milliseconds, PERCENTILES)
+                    )
+                },
+                "max_ms": round(milliseconds.max(), 1),
+                "mean_queries": round(values[:, 1].mean(), 1),
+            }
+        return dict(summary)
+
+
+METRICS = StageMetrics()
+
+
+@contextmanager
+def collect_timings():
+    """Collect the stages that run inside into the Timings this yields."""
+    timings = Timings()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Time a stage of the current request (see the module docstring)."""
+    timings = _timings.get()
+    if timings is None:
+        # nothing is collecting; don't pay for the query counting
+        yield
+        return
+
+    start = perf_counter()
+    queries = QueryAccounting()
+    try:
+        with queries:
+            yield
+    finally:
+        timings.add(name, perf_counter() - start, queries.queries())
+
+
+def log_timings(timings, **context):
+    """Log the stages as a line of JSON, along with the given context."""
+    logger.info(json.dumps({**context, "stages": timings.as_dict()}, default=str))
+
+
+class ServerTimingMiddleware:
+    """Time every request (as a "total" stage) and report its stages."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect_timings() as timings:
+            with stage("total"):
+                response = self.get_response(request)
+
+        response["Server-Timing"] = timings.header()
+        view_name = request.resolver_match.view_name if request.resolver_match else None
+        log_timings(
+            timings,
+            method=request.method,
+            path=request.path,
+            view=view_name,
+            status=response.status_code,
+        )
+        if view_name and view_name != "metrics":
+            METRICS.record(view_name, timings)
+        return response
+
+
+def metrics(request):
+    """The percentiles of the stages of each view (only for INTERNAL_IPS and staff)."""
+    if not (
+        request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS
+        or request.user.is_staff
+    ):
+        raise Http404
+    return JsonResponse(METRICS.summary())
@@ -1,6 +1,7 @@
 from django.urls import include, path
 
 from rfi import views
+from rfi_query import timing
 
 # router = routers.DefaultRouter()
 # router.register(r'rfi', views.MasterRfiCatalogViewSet)
@@ -11,5 +12,10 @@ urlpatterns = [
     # path('', include(router.urls)),
     # path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
     path('', views.landing_page, name="rfi_webpage"),
+    path('api/spectra/', views.SpectraView.as_view(), name="spectra"),
+    path('api/jobs/<int:pk>/', views.job_status, name="job_status"),
+    path('api/jobs/<int:pk>/spectra/', views.job_spectra, name="job_spectra"),
+    path('api/tiles/<str:receiver>/<str:start>/<str:end>/<int:level>/<int:index>/', views.tile, name="tile"),
+    path('metrics/', timing.metrics, name="metrics"),
     path('__debug__/', include('debug_toolbar.urls')),
 ]
@@ -1,6 +1,10 @@
+import re
+import threading
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
 from time import perf_counter
 
-from django.db import connection
+from django.db import connections
 
 
 class ModelCache:
@@ -72,27 +76,217 @@ class ModelCache:
         )
 
 
+def chunks(items, chunk_size):
+    """Split the sequence `items` into consecutive lists of at most `chunk_size` items."""
+    items = list(items)
+    return [items[start : start + chunk_size] for start in range(0, len(items), chunk_size)]
+
+
+# the first word of an SQL statement
+STATEMENT_TYPE_REGEX = re.compile(r"\s*\(*\s*(\w+)")
+
+
+class _QueryTotals(threading.local):
+    """The running totals of the queries of this thread, while anything is accounting."""
+
+    def __init__(self):
+        # number of open QueryAccounting spans, and the execute wrappers they installed
+        self.depth = 0
+        self.wrappers = None
+        # statement type -> [queries, rows, seconds]
+        self.totals = defaultdict(lambda: [0, 0, 0.0])
+
+
+_query_totals = _QueryTotals()
+
+
+def statement_type(sql):
+    match = STATEMENT_TYPE_REGEX.match(sql)
+    return match.group(1).upper() if match else "OTHER"
+
+
+def _account_query(execute, sql, params, many, context):
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        totals = _query_totals.totals[statement_type(sql)]
+        totals[0] += 1
+        # (-1 or None where the database doesn't know, e.g. SQLite SELECTs)
+        totals[1] += max(getattr(context["cursor"], "rowcount", None) or 0, 0)
+        totals[2] += perf_counter() - start
+
+
+class QueryAccounting:
+    """Count the queries run inside this context, and their rows and time, by statement type.
+
+    Unlike `connection.queries`, this works with DEBUG off and costs the same for
+    every query however long the process runs: the queries of all connections are
+    added to running totals (per thread) by an execute wrapper, and each span only
+    takes the difference of the totals at its start and end. So spans can be
+    nested freely; the wrapper is installed while the outermost one is open.
+
+    Rows are the row counts reported by the database driver (SQLite doesn't report
+    them for SELECTs), and time is the time spent executing the statements (not
+    fetching their results).
+    """
+
+    def __init__(self):
+        self._start = self._end = None
+
+    def __enter__(self):
+        if _query_totals.depth == 0:
+            _query_totals.wrappers = ExitStack()
+            for connection in connections.all():
+                _query_totals.wrappers.enter_context(
+                    connection.execute_wrapper(_account_query)
+                )
+        _query_totals.depth += 1
+        self._start = self._snapshot()
+        self._end = None
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self._end = self._snapshot()
+        _query_totals.depth -= 1
+        if _query_totals.depth == 0:
+            _query_totals.wrappers.close()
+            _query_totals.wrappers = None
+
+    @staticmethod
+    def is_open():
+        """True if a span is open in this thread (so its queries are being counted)."""
+        return _query_totals.depth > 0
+
+    def add_to_this_thread(self):
+        """Add the queries of this (closed) span to the totals of the current thread.
+
+        For spans of worker threads: the spans that are open in the thread that
+        waited for the workers then include their queries as well.
+        """
+        for statement, totals in self.by_statement.items():
+            running = _query_totals.totals[statement]
+            running[0] += totals["queries"]
+            running[1] += totals["rows"]
+            running[2] += totals["seconds"]
+
+    @staticmethod
+    def _snapshot():
+        return {statement: list(totals) for statement, totals in _query_totals.totals.items()}
+
+    @property
+    def by_statement(self):
+        """{statement type: {"queries": ..., "rows": ..., "seconds": ...}} (so far, while open)."""
+        end = self._snapshot() if self._end is None else self._end
+        by_statement = {}
+        for statement, totals in end.items():
+            start = self._start.get(statement, [0, 0, 0.0])
+            queries, rows, seconds = (total - initial for total, initial in zip(totals, start))
+            if queries:
+                by_statement[statement] = {"queries": queries, "rows": rows, "seconds": seconds}
+        return by_statement
+
+    def queries(self, statement=None):
+        """The number of queries (of the given statement type, e.g. "INSERT")."""
+        return self._sum("queries", statement)
+
+    def rows(self, statement=None):
+        return self._sum("rows", statement)
+
+    def seconds(self, statement=None):
+        return self._sum("seconds", statement)
+
+    def _sum(self, field, statement):
+        by_statement = self.by_statement
+        if statement is not None:
+            return by_statement.get(statement, {}).get(field, 0)
+        return sum(totals[field] for totals in by_statement.values())
+
+    def __str__(self):
+        return ", ".join(
+            f"{totals['queries']} {statement} ({totals['rows']} rows, {totals['seconds']:.2f}s)"
+            for statement, totals in sorted(self.by_statement.items())
+        ) or "no queries"
+
+
+class QueryCancelled(Exception):
+    """The queries were cancelled (see `QueryCanceller`)."""
+
+
+class QueryCanceller:
+    """Cancel the database queries that another thread is running.
+
+    The thread that runs the queries wraps them in `watch()`. Any other thread can
+    then `cancel()` them: the statement that is running on each connection of the
+    watching thread is interrupted (PostgreSQL cancels it on the server, SQLite
+    aborts it) and every later statement is refused before it is sent, so the
+    watched block raises QueryCancelled. Long stretches of Python code between the
+    queries can `check()` to stop early as well.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._lock = threading.Lock()
+        # the connections of the watching thread
+        self._connections = []
+
+    def _refuse(self, execute, sql, params, many, context):
+        self.check()
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def watch(self):
+        with ExitStack() as wrappers:
+            with self._lock:
+                self._connections = connections.all()
+            for connection in self._connections:
+                wrappers.enter_context(connection.execute_wrapper(self._refuse))
+            try:
+                yield self
+            except Exception as error:
+                # whatever the interrupted statement raised
+                if self.cancelled and not isinstance(error, QueryCancelled):
+                    raise QueryCancelled from error
+                raise
+            finally:
+                with self._lock:
+                    self._connections = []
+
+    def check(self):
+        if self.cancelled:
+            raise QueryCancelled
+
+    def cancel(self):
+        self.cancelled = True
+        # (under the lock, so the connections aren't closed by the watching thread meanwhile)
+        with self._lock:
+            for connection in self._connections:
+                # the DB-API connection is only opened by the first query; both of these
+                # are meant to be called from another thread
+                if connection.connection is None:
+                    continue
+                if connection.vendor == "postgresql":
+                    connection.connection.cancel()
+                elif connection.vendor == "sqlite":
+                    connection.connection.interrupt()
+
+
 class Benchmark:
     def __init__(self, description=None, logger=None):
         self._initial_time = perf_counter()
-        self._initial_queries = len(connection.queries)
-        self._initial_insert_queries = len(
-            [q for q in connection.queries if q["sql"].startswith("INSERT")]
-        )
         self._logger = logger if logger else print
         self.description = "Did stuff" if description is None else description
+        self.queries = QueryAccounting()
 
     def __enter__(self):
-        pass
+        self.queries.__enter__()
+        return self
 
     def __exit__(self, type, value, traceback):
-        _queries_end = len(connection.queries)
-        _insert_queries_end = len(
-            [q for q in connection.queries if q["sql"].startswith("INSERT")]
-        )
+        self.queries.__exit__(type, value, traceback)
         _end = perf_counter()
         self._logger(
             f"{self.description} in {_end - self._initial_time} seconds "
-            f"and {_queries_end - self._initial_queries} queries "
-            f"({_insert_queries_end - self._initial_insert_queries} inserts)"
+            f"and {self.queries.queries()} queries "
+            f"({self.queries.queries('INSERT')} inserts; {self.queries})"
         )